@@ -0,0 +1,98 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Search, SearchJob
+from .search import import_cli
+
+# Background search jobs. Each worker process runs jobs on a small thread pool;
+# the job state is in the database, so a job can be polled from any process.
+# A job is claimed with a conditional UPDATE, so it runs once even when
+# several processes pick it up.
+
+JOB_WORKERS = int(os.getenv("SEARCH_JOB_WORKERS", "2"))
+# Progress is written after this many more articles have been parsed
+PROGRESS_STEP = 50
+# Jobs still running after this long belonged to a process that died
+JOB_TIMEOUT = timedelta(hours=1)
+JOB_ERROR = "An internal error occurred while processing your request."
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # Started on first use in each process; jobs queued by a process that has
+    # since exited are picked up then
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS,
+                                           thread_name_prefix="search-job")
+            expire_stale_jobs()
+            for job_id in SearchJob.objects.filter(status=SearchJob.QUEUED).values_list(
+                    "id", flat=True):
+                _executor.submit(run_job, job_id)
+        return _executor
+
+
+def submit(job):
+    get_executor().submit(run_job, job.id)
+
+
+def expire_stale_jobs():
+    SearchJob.objects.filter(
+        status=SearchJob.RUNNING, started_at__lt=timezone.now() - JOB_TIMEOUT
+    ).update(status=SearchJob.FAILED, error="The search was interrupted.",
+             finished_at=timezone.now())
+
+
+def claim(job_id):
+    updated = SearchJob.objects.filter(id=job_id, status=SearchJob.QUEUED).update(
+        status=SearchJob.RUNNING, started_at=timezone.now()
+    )
+    return updated == 1
+
+
+def run_job(job_id):
+    try:
+        if claim(job_id):
+            execute(SearchJob.objects.select_related("user").get(id=job_id))
+    except Exception as e:
+        logging.error("Search job %s failed: %s", job_id, str(e))
+        SearchJob.objects.filter(id=job_id).update(
+            status=SearchJob.FAILED, error=JOB_ERROR, finished_at=timezone.now()
+        )
+    finally:
+        # Pool threads outlive the job, so they must not keep its connection
+        close_old_connections()
+
+
+def execute(job):
+    import_cli()
+    from analyzer import ArticleAnalyzer, EmailAnalyzer  # type: ignore
+    from services import emailsText, iterArticles, summaryText  # type: ignore
+
+    if job.mode == "overview":
+        analyzer, toText = ArticleAnalyzer(streaming=True), summaryText
+    else:  # emails
+        analyzer, toText = EmailAnalyzer(streaming=True), emailsText
+    articles = []
+    records = iterArticles(job.searchterm, job.sortby, job.user.email, job.searchnumber, analyzer)
+    for article in records:
+        articles.append(article)
+        if len(articles) % PROGRESS_STEP == 0:
+            SearchJob.objects.filter(id=job.id).update(progress=len(articles))
+
+    SearchJob.objects.filter(id=job.id).update(
+        status=SearchJob.DONE, progress=len(articles),
+        result=toText(SimpleNamespace(articles=articles)), finished_at=timezone.now(),
+    )
+    # Like a search through PubmedSearchView, it goes into the user's history
+    Search.objects.create(user=job.user, query=job.searchterm)
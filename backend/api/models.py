@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -9,3 +10,31 @@ class Search(models.Model):
 
     def __str__(self):
         return f"Search by {self.user.username} at {self.created_at}: {self.query}"
+
+
+class SearchJob(models.Model):
+    # A pubmed search run in the background (see jobs.py); the state lives in
+    # the database so any worker process can report it
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_jobs')
+    searchterm = models.CharField(max_length=255)
+    mode = models.CharField(max_length=16)
+    searchnumber = models.PositiveIntegerField()
+    sortby = models.CharField(max_length=16)
+    status = models.CharField(max_length=8, choices=STATUS_CHOICES, default=QUEUED)
+    # Articles parsed so far
+    progress = models.PositiveIntegerField(default=0)
+    result = models.TextField(blank=True, default="")
+    error = models.CharField(max_length=255, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Search job {self.id} by {self.user.username} ({self.status}): {self.searchterm}"
@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import sys
+
+# Search helpers shared by the views and the background job runner
+
+SEARCH_MODES = {"overview", "emails"}
+SEARCH_SORTS = {"relevance", "pub_date", "Author", "JournalName"}
+# esearch returns at most this many PMIDs for one query
+MAX_SEARCHNUMBER = 10000
+
+
+def import_cli():
+    # Dynamically add cli folder to python path so we can import modules from it
+    cli_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../cli'))
+    if cli_path not in sys.path:
+        sys.path.append(cli_path)
+
+
+def parse_search(data):
+    # Returns (search parameters, None) or (None, error message)
+    searchterm = data.get("searchterm")
+    mode = data.get("mode", "overview")
+    sortby = data.get("sortby", "relevance")
+    if not searchterm:
+        return None, "Missing search term"
+    try:
+        searchnumber = int(data.get("searchnumber", 10))
+    except (TypeError, ValueError):
+        return None, "Invalid search number"
+    if not 1 <= searchnumber <= MAX_SEARCHNUMBER:
+        return None, "Invalid search number"
+    if mode not in SEARCH_MODES:
+        return None, "Invalid mode"
+    if sortby not in SEARCH_SORTS:
+        return None, "Invalid sort option"
+    return {"searchterm": searchterm, "mode": mode, "searchnumber": searchnumber,
+            "sortby": sortby}, None
+
+
+def search_cache_key(search):
+    # Identical searches share a key whoever runs them. The term is normalized
+    # like the CLI's SearchCache does it, so spellings PubMed treats the same
+    # share a key while AND/OR/NOT stay operators. The hash keeps keys short
+    # and safe for every cache backend.
+    import_cli()
+    from cache import canonical_term  # type: ignore
+
+    normalized = [canonical_term(search["searchterm"]), search["mode"],
+                  search["searchnumber"], search["sortby"]]
+    digest = hashlib.sha256(json.dumps(normalized).encode()).hexdigest()
+    return f"pubmed-search:{digest}"
@@ -1,6 +1,6 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import Search
+from .models import Search, SearchJob
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,3 +29,10 @@ class SearchSerializer(serializers.ModelSerializer):
         model = Search
         fields = ['id', 'user', 'query', 'created_at']
         read_only_fields = ['id', 'created_at']
+
+class SearchJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SearchJob
+        fields = ['id', 'searchterm', 'mode', 'searchnumber', 'sortby', 'status', 'progress',
+                  'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
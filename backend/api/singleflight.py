@@ -0,0 +1,162 @@
+import asyncio
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Coalesces identical searches, so NCBI load grows with unique queries rather
+# than with requests. Within a worker, duplicates await the first request's
+# task. Across workers, the first to create the key's lock file runs the
+# search and the others poll the shared cache until its result appears. A
+# failed or timed out search leaves a short-lived marker so that the waiting
+# workers fail the same way instead of each retrying it.
+#
+# coalesce() returns (output, cache status): HIT when the result was cached,
+# MISS when this request ran the search, COALESCED when it waited for one.
+
+FLIGHT_TIMEOUT = float(os.getenv("SEARCH_FLIGHT_TIMEOUT", "300"))
+POLL_INTERVAL = 0.1
+# How long waiting workers can still see that a search failed
+FAILURE_TIMEOUT = 30
+# A lock is only taken for stale once its leader would have given up by any
+# measure: FLIGHT_TIMEOUT bounds the search, the margin the cache calls around it
+STALE_LOCK_AGE = FLIGHT_TIMEOUT + 60
+
+_flights = {}
+
+
+class SearchFailed(Exception):
+    pass
+
+
+async def coalesce(key, run):
+    # run() is awaited at most once per key across all workers at a time
+    output = await cache.aget(key)
+    if output is not None:
+        return output, "HIT"
+    # Under WSGI each request has its own event loop, and tasks cannot be
+    # shared between loops; the lock file still coalesces those requests
+    flight_key = (asyncio.get_running_loop(), key)
+    flight = _flights.get(flight_key)
+    coalesced = flight is not None
+    if flight is None:
+        flight = asyncio.ensure_future(fly(key, run))
+        _flights[flight_key] = flight
+        flight.add_done_callback(lambda done: land(flight_key, done))
+    # A request that times out leaves the search running for the others
+    output, status = await asyncio.wait_for(asyncio.shield(flight), FLIGHT_TIMEOUT)
+    return output, "COALESCED" if coalesced else status
+
+
+def land(flight_key, flight):
+    _flights.pop(flight_key, None)
+    # Every waiter may have timed out already; the error is theirs, not the loop's
+    if not flight.cancelled():
+        flight.exception()
+
+
+async def fly(key, run):
+    lock = lock_path(key)
+    deadline = time.monotonic() + FLIGHT_TIMEOUT
+    while True:
+        token = acquire(lock)
+        if token is not None:
+            try:
+                return await lead(key, run, token)
+            finally:
+                release(lock, token)
+        output = await follow(key, lock, deadline)
+        if output is not None:
+            return output, "COALESCED"
+        # The leader went away without a result; try to take over
+
+
+async def lead(key, run, token):
+    # Another worker may have finished just before the lock was free
+    output = await cache.aget(key)
+    if output is not None:
+        return output, "HIT"
+    try:
+        # Bounded like the waiters, so a stalled upstream cannot leave the
+        # flight (and every later request for the key) pending forever
+        output = await asyncio.wait_for(run(), FLIGHT_TIMEOUT)
+    except Exception as error:
+        timed_out = isinstance(error, asyncio.TimeoutError)
+        await cache.aset(failure_key(key), (token, timed_out), FAILURE_TIMEOUT)
+        raise
+    await cache.aset(key, output)
+    return output, "MISS"
+
+
+async def follow(key, lock, deadline):
+    # The leader's result, or None once its lock is gone without one
+    token = read_token(lock)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        output = await cache.aget(key)
+        if output is not None:
+            return output
+        leader_gone = not os.path.exists(lock)
+        failure = await cache.aget(failure_key(key))
+        if token is not None and failure is not None and failure[0] == token:
+            # The waiters fail the way the leader did
+            raise asyncio.TimeoutError() if failure[1] else SearchFailed(key)
+        if leader_gone:
+            return None
+    raise asyncio.TimeoutError()
+
+
+def failure_key(key):
+    return f"{key}:failed"
+
+
+def lock_path(key):
+    return os.path.join(settings.SEARCH_LOCK_DIR, key.replace(":", "-") + ".lock")
+
+
+def acquire(path):
+    # The lock file holds a token naming this attempt; it is written under a
+    # temporary name and linked into place, which fails if the lock exists
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    remove_stale_lock(path)
+    token = uuid.uuid4().hex
+    temporary = f"{path}.{token}"
+    with open(temporary, "w") as f:
+        f.write(token)
+    try:
+        os.link(temporary, path)
+    except FileExistsError:
+        return None
+    finally:
+        os.unlink(temporary)
+    return token
+
+
+def release(path, token):
+    # Only the lock this attempt acquired is removed; one that was taken for
+    # stale and acquired by another worker meanwhile is left to that worker
+    if read_token(path) != token:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_stale_lock(path):
+    # A lock this old belongs to a worker that died mid-search
+    try:
+        if time.time() - os.path.getmtime(path) > STALE_LOCK_AGE:
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_token(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
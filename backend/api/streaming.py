@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import threading
+
+from .search import import_cli
+
+# Server-Sent Events for one pubmed search. The search runs on a thread and
+# hands each parsed article to the event loop; every time the loop wakes up it
+# sends what has arrived since as one "result" event, so events follow the
+# efetch batches. Events:
+#   progress  {"parsed": articles so far, "requested": searchnumber}
+#   result    {"result": output text, "articles": [...]} (overview) or
+#             {"result": output text, "emails": [...]} (emails); joining the
+#             result texts gives the PubmedSearchView output
+#   done      {"count": articles, "search": the saved history entry}
+#   error     {"error": message}
+
+SEARCH_ERROR = "An internal error occurred while processing your request."
+_END = object()
+
+
+def event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+async def search_events(search, email, on_done):
+    # on_done(count) is awaited after a successful search and returns the data
+    # for the "done" event
+    import_cli()
+    from analyzer import ArticleAnalyzer, EmailAnalyzer  # type: ignore
+    from services import NO_ARTICLES, NO_EMAILS, iterArticles  # type: ignore
+
+    overview = search["mode"] == "overview"
+    analyzer = ArticleAnalyzer(streaming=True) if overview else EmailAnalyzer(streaming=True)
+    def records():
+        return iterArticles(search["searchterm"], search["sortby"], email,
+                            search["searchnumber"], analyzer)
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    producer = loop.run_in_executor(None, produce, records, loop, queue, stop)
+    progress = {"parsed": 0, "requested": search["searchnumber"]}
+    seen = set()
+    try:
+        yield event("progress", progress)
+        ended = False
+        while not ended:
+            items = [await queue.get()]
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            ended = items[-1] is _END
+            articles = [item for item in items if item is not _END]
+            if any(isinstance(item, Exception) for item in articles):
+                logging.error("PubmedSearch stream error: %s", str(articles[-1]))
+                yield event("error", {"error": SEARCH_ERROR})
+                return
+            if articles:
+                progress["parsed"] += len(articles)
+                data = result_data(articles, overview, seen)
+                if data is not None:
+                    yield event("result", data)
+                yield event("progress", progress)
+        if not progress["parsed"]:
+            yield event("result", {"result": NO_ARTICLES if overview else NO_EMAILS})
+        yield event("done", await on_done(progress["parsed"]))
+    finally:
+        # The client may disconnect mid-search; the thread then stops early
+        stop.set()
+        await producer
+
+
+def produce(search_records, loop, queue, stop):
+    # Runs on a thread: hands each record, then an error if any, then _END
+    records = None
+    try:
+        records = search_records()
+        for record in records:
+            if stop.is_set():
+                break
+            loop.call_soon_threadsafe(queue.put_nowait, record)
+    except Exception as e:
+        loop.call_soon_threadsafe(queue.put_nowait, e)
+    finally:
+        # Closing the generator cancels the fetches still queued
+        if records is not None:
+            records.close()
+        loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+
+def result_data(articles, overview, seen):
+    # The "result" event for a batch, or None when it adds no new emails
+    from format import articleDict, articleFormat  # type: ignore
+
+    if overview:
+        return {
+            "result": "".join(articleFormat(article) for article in articles),
+            "articles": [articleDict(article) for article in articles],
+        }
+    emails = list(dict.fromkeys(
+        email for article in articles for email in sorted(article.emails) if email not in seen
+    ))
+    if not emails:
+        return None
+    prefix = ", " if seen else ""
+    seen.update(emails)
+    return {"result": prefix + ", ".join(emails), "emails": emails}
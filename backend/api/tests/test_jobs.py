@@ -0,0 +1,142 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import jobs
+from api.models import Search, SearchJob
+from api.search import MAX_SEARCHNUMBER, import_cli, parse_search
+
+import_cli()
+from article import ArticleRecord  # type: ignore  # noqa: E402
+
+SEARCH = {"searchterm": "cancer", "mode": "emails", "searchnumber": 5, "sortby": "relevance"}
+
+
+def _record(pmid):
+    return ArticleRecord(f"Title {pmid}", "eng", "2024", {f"a{pmid}@lab.org"}, [], str(pmid))
+
+
+class ParseSearchTests(TestCase):
+    def test_searchnumber_bounds(self):
+        for number in (0, -1, MAX_SEARCHNUMBER + 1, "x"):
+            self.assertEqual(parse_search(dict(SEARCH, searchnumber=number)),
+                             (None, "Invalid search number"))
+        search, error = parse_search(dict(SEARCH, searchnumber=MAX_SEARCHNUMBER))
+        self.assertIsNone(error)
+        self.assertEqual(search["searchnumber"], MAX_SEARCHNUMBER)
+
+
+# Jobs run in the test's thread and transaction, so the connection the test
+# case holds open must not be closed after each one
+@patch("api.jobs.close_old_connections")
+class RunJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jane", "jane@lab.org")
+        self.job = SearchJob.objects.create(user=self.user, **SEARCH)
+
+    def status(self):
+        self.job.refresh_from_db()
+        return self.job.status
+
+    def test_job_is_claimed_once(self, _):
+        self.assertTrue(jobs.claim(self.job.id))
+        self.assertFalse(jobs.claim(self.job.id))
+        self.assertEqual(self.status(), SearchJob.RUNNING)
+
+    def test_progress_and_result(self, _):
+        progress = []
+
+        def records(*args):
+            for pmid in range(1, 6):
+                progress.append(SearchJob.objects.get(id=self.job.id).progress)
+                yield _record(pmid)
+
+        with patch("api.jobs.PROGRESS_STEP", 2), \
+                patch("services.iterArticles", side_effect=records) as iterArticles:
+            jobs.run_job(self.job.id)
+        self.assertEqual(iterArticles.call_args[0][:4], ("cancer", "relevance", "jane@lab.org", 5))
+        self.assertEqual(progress, [0, 0, 2, 2, 4])
+        self.assertEqual(self.status(), SearchJob.DONE)
+        self.assertEqual(self.job.progress, 5)
+        self.assertIn("a5@lab.org", self.job.result)
+        self.assertEqual(list(Search.objects.values_list("query", flat=True)), ["cancer"])
+
+    def test_failed_search(self, _):
+        with patch("services.iterArticles", side_effect=RuntimeError("efetch failed")), \
+                self.assertLogs(level="ERROR"):
+            jobs.run_job(self.job.id)
+        self.assertEqual(self.status(), SearchJob.FAILED)
+        self.assertEqual(self.job.error, jobs.JOB_ERROR)
+
+    def test_claimed_job_is_not_run_again(self, _):
+        jobs.claim(self.job.id)
+        with patch("services.iterArticles") as iterArticles:
+            jobs.run_job(self.job.id)
+        iterArticles.assert_not_called()
+
+    def test_expire_stale_jobs(self, _):
+        jobs.claim(self.job.id)
+        recent = SearchJob.objects.create(user=self.user, **SEARCH)
+        jobs.claim(recent.id)
+        SearchJob.objects.filter(id=self.job.id).update(
+            started_at=timezone.now() - jobs.JOB_TIMEOUT - timedelta(minutes=1)
+        )
+        jobs.expire_stale_jobs()
+        self.assertEqual(self.status(), SearchJob.FAILED)
+        self.assertEqual(SearchJob.objects.get(id=recent.id).status, SearchJob.RUNNING)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchJobApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jane", "jane@lab.org")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, **data):
+        with patch("api.jobs.submit") as submit:
+            response = self.client.post("/api/pubmed-search/jobs/", dict(SEARCH, **data),
+                                        format="json")
+        return response, submit
+
+    def test_create_queues_a_job(self):
+        response, submit = self.create()
+        self.assertEqual(response.status_code, 202)
+        job = SearchJob.objects.get(id=response.data["id"])
+        self.assertEqual((job.user, job.status), (self.user, SearchJob.QUEUED))
+        submit.assert_called_once_with(job)
+
+    def test_invalid_search_number(self):
+        response, submit = self.create(searchnumber=-1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {"error": "Invalid search number"})
+        submit.assert_not_called()
+
+    def test_result_follows_the_job(self):
+        response, _ = self.create()
+        url = f"/api/pubmed-search/jobs/{response.data['id']}/result/"
+        self.assertEqual(self.client.get(url).status_code, 202)
+
+        SearchJob.objects.filter(id=response.data["id"]).update(
+            status=SearchJob.DONE, result="a@lab.org"
+        )
+        done = self.client.get(url)
+        self.assertEqual((done.status_code, done.data["result"]), (200, "a@lab.org"))
+
+        SearchJob.objects.filter(id=response.data["id"]).update(
+            status=SearchJob.FAILED, error=jobs.JOB_ERROR
+        )
+        failed = self.client.get(url)
+        self.assertEqual((failed.status_code, failed.data["error"]), (500, jobs.JOB_ERROR))
+
+    def test_other_users_job_is_not_found(self):
+        response, _ = self.create()
+        other = User.objects.create_user("john", "john@lab.org")
+        self.client.force_authenticate(other)
+        job = f"/api/pubmed-search/jobs/{response.data['id']}/"
+        self.assertEqual(self.client.get(job).status_code, 404)
+        self.assertEqual(self.client.get(job + "result/").status_code, 404)
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import AsyncMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from api import singleflight
+from api.singleflight import (
+    SearchFailed, acquire, coalesce, failure_key, lock_path, read_token, release,
+)
+
+KEY = "pubmed-search:test"
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM)
+class CoalesceTests(SimpleTestCase):
+    def setUp(self):
+        locks = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, locks, ignore_errors=True)
+        self.enterContext(override_settings(SEARCH_LOCK_DIR=locks))
+        self.enterContext(patch.object(singleflight, "POLL_INTERVAL", 0.01))
+        cache.clear()
+        self.lock = lock_path(KEY)
+
+    def other_worker(self):
+        # The lock another worker holds while it runs the search
+        token = acquire(self.lock)
+        self.assertIsNotNone(token)
+        return token
+
+    async def test_duplicates_in_one_loop_run_once(self):
+        release_search = asyncio.Event()
+
+        async def run():
+            await release_search.wait()
+            return "output"
+
+        run = AsyncMock(side_effect=run)
+        first = asyncio.ensure_future(coalesce(KEY, run))
+        second = asyncio.ensure_future(coalesce(KEY, run))
+        await asyncio.sleep(0.05)
+        release_search.set()
+        self.assertEqual(await first, ("output", "MISS"))
+        self.assertEqual(await second, ("output", "COALESCED"))
+        run.assert_awaited_once()
+        self.assertEqual(await coalesce(KEY, run), ("output", "HIT"))
+        self.assertFalse(os.path.exists(self.lock))
+
+    async def test_follower_sees_the_other_workers_result(self):
+        self.other_worker()
+        run = AsyncMock()
+        follower = asyncio.ensure_future(coalesce(KEY, run))
+        await asyncio.sleep(0.05)
+        await cache.aset(KEY, "output")
+        self.assertEqual(await follower, ("output", "COALESCED"))
+        run.assert_not_awaited()
+
+    async def test_follower_fails_like_the_leader(self):
+        for timed_out, error in ((False, SearchFailed), (True, asyncio.TimeoutError)):
+            token = self.other_worker()
+            await cache.aset(failure_key(KEY), (token, timed_out))
+            with self.assertRaises(error):
+                await coalesce(KEY, AsyncMock())
+            release(self.lock, token)
+            await cache.adelete(failure_key(KEY))
+
+    async def test_follower_takes_over_from_a_vanished_leader(self):
+        token = self.other_worker()
+        run = AsyncMock(return_value="output")
+        follower = asyncio.ensure_future(coalesce(KEY, run))
+        await asyncio.sleep(0.05)
+        release(self.lock, token)
+        self.assertEqual(await follower, ("output", "MISS"))
+        run.assert_awaited_once()
+
+    async def test_stale_lock_is_taken_over(self):
+        token = self.other_worker()
+        old = time.time() - singleflight.STALE_LOCK_AGE - 1
+        os.utime(self.lock, (old, old))
+        run = AsyncMock(return_value="output")
+        self.assertEqual(await coalesce(KEY, run), ("output", "MISS"))
+        run.assert_awaited_once()
+        # The dead leader's release must not touch a lock it no longer owns
+        new_token = acquire(self.lock)
+        release(self.lock, token)
+        self.assertEqual(read_token(self.lock), new_token)
+
+    def test_lock_within_the_search_timeout_is_not_stale(self):
+        self.other_worker()
+        recent = time.time() - singleflight.FLIGHT_TIMEOUT - 1
+        os.utime(self.lock, (recent, recent))
+        self.assertIsNone(acquire(self.lock))
+
+    def test_release_needs_the_token(self):
+        token = self.other_worker()
+        release(self.lock, "someone else")
+        self.assertTrue(os.path.exists(self.lock))
+        release(self.lock, token)
+        self.assertFalse(os.path.exists(self.lock))
@@ -0,0 +1,98 @@
+import json
+import threading
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from api import streaming
+from api.search import import_cli
+from api.streaming import SEARCH_ERROR, search_events
+
+import_cli()
+from article import ArticleRecord  # type: ignore  # noqa: E402
+
+SEARCH = {"searchterm": "cancer", "mode": "emails", "searchnumber": 5, "sortby": "relevance"}
+
+
+def _record(pmid, email):
+    return ArticleRecord(f"Title {pmid}", "eng", "2024", {email}, [], str(pmid))
+
+
+def _parse(message):
+    name, data = message.split("\n")[:2]
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def _on_done(count):
+    return {"count": count}
+
+
+class SearchEventsTests(SimpleTestCase):
+    async def collect(self, events):
+        return [_parse(message) async for message in events]
+
+    async def test_event_order(self):
+        records = (record for record in [_record(1, "a@lab.org")])
+        with patch("services.iterArticles", return_value=records):
+            events = await self.collect(search_events(SEARCH, "jane@lab.org", _on_done))
+        self.assertEqual(events, [
+            ("progress", {"parsed": 0, "requested": 5}),
+            ("result", {"result": "a@lab.org", "emails": ["a@lab.org"]}),
+            ("progress", {"parsed": 1, "requested": 5}),
+            ("done", {"count": 1}),
+        ])
+
+    async def test_batch_without_new_emails(self):
+        gate = threading.Event()
+
+        def records(*args):
+            yield _record(1, "a@lab.org")
+            gate.wait(5)
+            yield _record(2, "a@lab.org")
+
+        events = search_events(SEARCH, "jane@lab.org", _on_done)
+        with patch("services.iterArticles", side_effect=records):
+            head = [_parse(await anext(events)) for _ in range(3)]
+            gate.set()
+            tail = await self.collect(events)
+        self.assertEqual([name for name, _ in head], ["progress", "result", "progress"])
+        self.assertEqual(tail, [("progress", {"parsed": 2, "requested": 5}),
+                                ("done", {"count": 2})])
+
+    async def test_producer_error(self):
+        done = []
+
+        async def on_done(count):
+            done.append(count)
+
+        with patch("services.iterArticles", side_effect=RuntimeError("efetch failed")), \
+                self.assertLogs(level="ERROR"):
+            events = await self.collect(search_events(SEARCH, "jane@lab.org", on_done))
+        self.assertEqual(events[-1], ("error", {"error": SEARCH_ERROR}))
+        self.assertNotIn("done", [name for name, _ in events])
+        self.assertEqual(done, [])
+
+    async def test_closing_early_stops_the_search(self):
+        closed, stops = threading.Event(), []
+        produce = streaming.produce
+
+        def records(*args):
+            try:
+                for pmid in range(1, 1000):
+                    yield _record(pmid, f"a{pmid}@lab.org")
+                    closed.wait(0.01)
+            finally:
+                closed.set()
+
+        def spy(search_records, loop, queue, stop):
+            stops.append(stop)
+            produce(search_records, loop, queue, stop)
+
+        events = search_events(SEARCH, "jane@lab.org", _on_done)
+        with patch("services.iterArticles", side_effect=records), \
+                patch("api.streaming.produce", side_effect=spy):
+            self.assertEqual(_parse(await anext(events))[0], "progress")
+            self.assertEqual(_parse(await anext(events))[0], "result")
+            await events.aclose()
+        self.assertTrue(stops[0].is_set())
+        self.assertTrue(closed.is_set())
@@ -0,0 +1,85 @@
+import asyncio
+import shutil
+import tempfile
+from urllib.parse import urlencode
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Search
+
+URL = "/api/pubmed-search/"
+SEARCH = {"searchterm": "cancer", "mode": "emails", "searchnumber": 5, "sortby": "relevance"}
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, CACHES=LOCMEM)
+class PubmedSearchViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("jane", "jane@lab.org")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        locks = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, locks, ignore_errors=True)
+        self.enterContext(override_settings(SEARCH_LOCK_DIR=locks))
+        cache.clear()
+
+    async def post(self, data=SEARCH, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        kwargs.setdefault("headers", self.auth)
+        return await self.async_client.post(URL, data, **kwargs)
+
+    async def test_missing_or_invalid_token(self):
+        for headers in ({}, {"Authorization": "Bearer not-a-token"}):
+            response = await self.post(headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+
+    async def test_malformed_json(self):
+        response = await self.post("{not json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid JSON"})
+
+    async def test_invalid_search(self):
+        response = await self.post(dict(SEARCH, mode="titles"))
+        self.assertEqual((response.status_code, response.json()),
+                         (400, {"error": "Invalid mode"}))
+
+    async def test_form_encoded_body(self):
+        with patch("api.views.run_search", return_value="a@lab.org") as run_search:
+            response = await self.post(
+                urlencode(SEARCH), content_type="application/x-www-form-urlencoded"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["result"], "a@lab.org")
+        run_search.assert_called_once_with(SEARCH, "jane@lab.org")
+        self.assertEqual(await Search.objects.filter(user=self.user).acount(), 1)
+
+    async def test_cache_status(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        calls = []
+
+        async def run_search(search, email):
+            calls.append(search)
+            started.set()
+            await release.wait()
+            return "a@lab.org"
+
+        with patch("api.views.run_search", side_effect=run_search):
+            first = asyncio.ensure_future(self.post())
+            await started.wait()
+            second = asyncio.ensure_future(self.post())
+            await asyncio.sleep(0.05)
+            release.set()
+            responses = [await first, await second, await self.post()]
+        self.assertEqual([r["X-Cache"] for r in responses], ["MISS", "COALESCED", "HIT"])
+        self.assertEqual({r.json()["result"] for r in responses}, {"a@lab.org"})
+        self.assertEqual(len(calls), 1)
+
+    async def test_failed_search(self):
+        with patch("api.views.run_search", side_effect=RuntimeError("efetch failed")), \
+                self.assertLogs(level="ERROR"):
+            response = await self.post()
+        self.assertEqual(response.status_code, 500)
@@ -5,4 +5,11 @@ urlpatterns = [
     path('health/', views.HealthCheckView.as_view(), name='health-check'),
     path('searches/', views.SearchListCreate.as_view(), name='search-list-create'),
     path('pubmed-search/', views.PubmedSearchView.as_view(), name='pubmed-search'),
+    path('pubmed-search/stream/', views.PubmedSearchStreamView.as_view(),
+         name='pubmed-search-stream'),
+    path('pubmed-search/jobs/', views.SearchJobCreate.as_view(), name='search-job-create'),
+    path('pubmed-search/jobs/<uuid:pk>/', views.SearchJobDetail.as_view(),
+         name='search-job-detail'),
+    path('pubmed-search/jobs/<uuid:pk>/result/', views.SearchJobResult.as_view(),
+         name='search-job-result'),
 ]
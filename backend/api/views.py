@@ -1,14 +1,24 @@
-import sys
-import os
+import asyncio
+import json
 import logging
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
-from .serializers import UserSerializer, SearchSerializer
-from .models import Search
+from . import jobs, singleflight
+from .serializers import UserSerializer, SearchSerializer, SearchJobSerializer
+from .models import Search, SearchJob
+from .search import import_cli, parse_search, search_cache_key
+from .streaming import search_events
 
 
 class HealthCheckView(APIView):
@@ -43,53 +53,160 @@ class SearchListCreate(generics.ListCreateAPIView):
         else:
             print(serializer.errors)
 
-class PubmedSearchView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        searchterm = request.data.get("searchterm")
-        mode = request.data.get("mode", "overview")
-        email = request.user.email
-        searchnumber = int(request.data.get("searchnumber", 10))
-        sortby = request.data.get("sortby", "relevance")
-
-        if not searchterm:
-            return Response({"error": "Missing search term"}, status=status.HTTP_400_BAD_REQUEST)
+AUTH_REQUIRED = {"detail": "Authentication credentials were not provided."}
+INTERNAL_ERROR = {"error": "An internal error occurred while processing your request."}
+SEARCH_TIMEOUT = {"error": "The search took too long; try a background job instead."}
 
 
-        allowed_modes = {"overview", "emails"}
-        allowed_sort = {"relevance", "pub_date", "Author", "JournalName"}
-        if mode not in allowed_modes:
-            return Response({"error": "Invalid mode"}, status=status.HTTP_400_BAD_REQUEST)
-        if sortby not in allowed_sort:
-            return Response({"error": "Invalid sort option"}, status=status.HTTP_400_BAD_REQUEST)
-
+def request_data(request):
+    # JSON bodies as DRF parses them, and form posts; None if the JSON is broken
+    if request.content_type == "application/json":
         try:
-            # Dynamically add cli folder to python path so we can import modules from it
-            cli_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../cli'))
-            if cli_path not in sys.path:
-                sys.path.append(cli_path)
-
-            # Import services dynamically or at top level (dynamic here to ensure path is set)
-            from services import getSummary, getEmails # type: ignore
-
-            if mode == "overview":
-                output = getSummary(searchterm, sortby, email, searchnumber)
-            else: # emails
-                output = getEmails(searchterm, sortby, email, searchnumber)
-
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+    return request.POST
+
+
+async def authenticate(request):
+    # The same JWT check DRF runs; it reads the user, so off the event loop
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def unauthorized():
+    response = JsonResponse(AUTH_REQUIRED, status=status.HTTP_401_UNAUTHORIZED)
+    response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PubmedSearchView(View):
+    # Async under ASGI (web/asgi.py): the search runs on the SearchSession's
+    # event loop and this worker's loop serves other requests meanwhile, so
+    # slow NCBI calls no longer tie up a whole worker. DRF views cannot be
+    # async, so authentication and validation are done here the same way.
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        user = await authenticate(request)
+        if user is None:
+            return unauthorized()
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+        search, error = parse_search(data)
+        if error:
+            return JsonResponse({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Results are shared between users and workers through the cache, and
+        # identical searches in flight are run once (see singleflight.py)
+        try:
+            output, cache_status = await singleflight.coalesce(
+                search_cache_key(search), lambda: run_search(search, user.email)
+            )
+        except asyncio.TimeoutError:
+            return JsonResponse(SEARCH_TIMEOUT, status=status.HTTP_504_GATEWAY_TIMEOUT)
         except Exception as e:
             logging.error("PubmedSearch execution error: %s", str(e))
-            return Response({"error": "An internal error occurred while processing your request."},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return JsonResponse(INTERNAL_ERROR, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Save the search to the database
-        search_obj = Search(user=request.user, query=searchterm)
-        search_obj.save()
+        search_obj = await Search.objects.acreate(user=user, query=search["searchterm"])
         serializer = SearchSerializer(search_obj)
 
-        return Response({
+        response = JsonResponse({
             "result": output,
             "search": serializer.data
         }, status=status.HTTP_200_OK)
+        response["X-Cache"] = cache_status
+        return response
+
+
+async def run_search(search, email):
+    import_cli()
+    from services import get_session # type: ignore
+
+    # One SearchSession per worker keeps connections and caches warm
+    session = get_session()
+    args = (search["searchterm"], search["sortby"], search["searchnumber"])
+    if search["mode"] == "overview":
+        return await session.summaryAsync(*args, email=email)
+    else: # emails
+        return await session.emailsAsync(*args, email=email)
+
 
+class SearchJobCreate(APIView):
+    # Queues a search and answers at once; the job's URL reports progress
+    # and the result URL returns the output when it is done
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        search, error = parse_search(request.data)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        job = SearchJob.objects.create(user=request.user, **search)
+        jobs.submit(job)
+        return Response(SearchJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class SearchJobDetail(generics.RetrieveAPIView):
+    serializer_class = SearchJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SearchJob.objects.filter(user=self.request.user)
+
+
+class SearchJobResult(generics.RetrieveAPIView):
+    # 200 with the output once done, 202 while queued or running
+    serializer_class = SearchJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return SearchJob.objects.filter(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        data = self.get_serializer(job).data
+        if job.status == SearchJob.DONE:
+            return Response(dict(data, result=job.result), status=status.HTTP_200_OK)
+        if job.status == SearchJob.FAILED:
+            return Response(dict(data, error=job.error),
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PubmedSearchStreamView(View):
+    # PubmedSearchView as Server-Sent Events: progress and each batch of
+    # results are pushed as soon as they are parsed (see streaming.py). Takes
+    # the same POST body and JWT, so clients read it with fetch() rather
+    # than EventSource.
+    http_method_names = ["post"]
+
+    async def post(self, request):
+        user = await authenticate(request)
+        if user is None:
+            return unauthorized()
+        data = request_data(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+        search, error = parse_search(data)
+        if error:
+            return JsonResponse({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        async def on_done(count):
+            search_obj = await Search.objects.acreate(user=user, query=search["searchterm"])
+            return {"count": count, "search": SearchSerializer(search_obj).data}
+
+        response = StreamingHttpResponse(
+            search_events(search, user.email, on_done), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Tells nginx to pass events on instead of buffering the response
+        response["X-Accel-Buffering"] = "no"
+        return response
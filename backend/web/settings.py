@@ -65,7 +65,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "api.middleware.AsyncWhiteNoiseMiddleware",
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -106,6 +106,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Pubmed search results are cached on disk so that every worker process
+# shares them; identical searches within the timeout skip NCBI altogether
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv("SEARCH_CACHE_DIR", BASE_DIR / '.cache' / 'search'),
+        'TIMEOUT': int(os.getenv("SEARCH_CACHE_TIMEOUT", "3600")),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000")),
+        },
+    }
+}
+
+# Lock files through which workers agree on who runs an in-flight search
+SEARCH_LOCK_DIR = os.getenv("SEARCH_LOCK_DIR", BASE_DIR / '.cache' / 'locks')
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -168,6 +188,8 @@ else:
     CORS_ALLOWED_ORIGINS = cors_allowed_origins_env.split(",")
 
 CORS_ALLOW_CREDENTIALS = True
+# Lets the frontend see whether a search was served from the cache
+CORS_EXPOSE_HEADERS = ["X-Cache"]
 
 # Production Security Settings
 CSRF_TRUSTED_ORIGINS = [
@@ -1,41 +1,180 @@
 import json
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from entrezpy.base.analyzer import EutilsAnalyzer
-from article import ArticleRecord, ArticleResult
-from parsing import parse_xml, extract_basics, extract_publish_date, extract_authors_and_emails
+from article import ArticleRecord, ArticleResult, LazyArticleRecord
+from researcher import Researcher
+from parsing import (
+    parse_xml,
+    iter_chunks,
+    iter_articles,
+    iter_email_records,
+    iter_article_slices,
+    iter_article_shards,
+    parse_shard,
+    get_extractor,
+    response_bytes,
+)
 
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_parse_pool(workers):
+    # One pool of parser processes per size and process, shared by every
+    # analyzer and batch. Workers are started by a fork server (or spawned),
+    # since the pool may first be needed on a fetch thread and forking a
+    # multithreaded process can deadlock.
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return pool
 
 
 class ArticleAnalyzer(EutilsAnalyzer):
-    def __init__(self):
+    # Whether the records are complete enough to go into a RecordCache
+    caches_records = True
+
+    def __init__(self, streaming=False, workers=None, columnar=False, lazy=False,
+                 shard_size=None):
         super().__init__()
+        # In streaming mode the efetch body is parsed while it is downloaded
+        self.streaming = streaming
+        # With workers set, articles are parsed in that many processes
+        self.workers = workers
+        # Columnar results are stored as ArticleColumns for Arrow/Parquet export
+        self.columnar = columnar
+        # Lazy records only extract the fields that are actually read
+        self.lazy = lazy
+        # Articles per worker shard; parsing.SHARD_SIZE when not set
+        self.shard_size = shard_size
+
+    def spawn(self, batch_size=None):
+        # Same settings and a fresh result, for independently fetched batches.
+        # Batches always collect record objects so they can be merged. A
+        # batch of known size is split so that every worker gets a shard.
+        shard_size = self.shard_size
+        if self.workers and batch_size:
+            shard_size = math.ceil(batch_size / self.workers)
+        return type(self)(streaming=self.streaming, workers=self.workers, lazy=self.lazy,
+                          shard_size=shard_size)
 
     def init_result(self, response, request):
         if self.result is None:
-            self.result = ArticleResult(response, request)
+            self.result = ArticleResult(response, request, columnar=self.columnar)
 
     def analyze_error(self, response, request):
+        self.report_error(request, response.getvalue())
+
+    def report_error(self, request, error):
         print(
             json.dumps(
                 {
                     __name__: {
                         "Response": {
                             "dump": request.dump(),
-                            "error": response.getvalue(),
+                            "error": error,
                         }
                     }
                 }
             )
         )
 
+    def parse(self, raw_response, request):
+        if not self.streaming or request.retmode != "xml":
+            return super().parse(raw_response, request)
+        self.init_result(raw_response, request)
+        if self.lazy:
+            self.add_lazy_records(request, iter_chunks(raw_response))
+        elif self.workers:
+            self.add_parallel_records(request, iter_chunks(raw_response))
+        else:
+            self.add_elements(request, iter_articles(iter_chunks(raw_response)))
+
+    def add_elements(self, request, elements):
+        for element in elements:
+            if element.tag == "ERROR":
+                self.hasErrorResponse = True
+                self.report_error(request, element.text)
+            else:
+                self.result.add_article_record(self.build_record(element))
+
+    def add_lazy_records(self, request, chunks):
+        # Keeps each article as its raw bytes; nothing is parsed until read
+        for kind, data in iter_article_slices(chunks):
+            if kind == "PubmedArticle":
+                self.result.add_article_record(LazyArticleRecord(data))
+            elif b"<ERROR" in data:
+                self.add_elements(request, iter_articles([data]))
+
+    def add_parallel_records(self, request, chunks):
+        # Shards are submitted while the payload is still being split, and
+        # results are collected in submission order to keep the article order
+        executor = get_parse_pool(self.workers)
+        futures = []
+        for kind, data in iter_article_shards(chunks, self.shard_size):
+            if kind == "shard":
+                futures.append(executor.submit(parse_shard, data))
+            elif b"<ERROR" in data:
+                self.add_elements(request, iter_articles([data]))
+        for future in futures:
+            for fields in future.result():
+                self.result.add_article_record(record_from_fields(fields))
 
     def analyze_result(self, response, request):
         self.init_result(response, request)
+        if self.workers and not self.lazy:
+            self.add_parallel_records(request, [response_bytes(response)])
+            return
         root = parse_xml(response)
 
         for article in root.xpath('//PubmedArticle'):
-            pmid, title, language = extract_basics(article)
-            publish_date = extract_publish_date(article)
-            emails, authors = extract_authors_and_emails(article)
-            record = ArticleRecord(title, language, publish_date, emails, authors, pmid)
-            self.result.add_article_record(record)
+            if self.lazy:
+                self.result.add_article_record(LazyArticleRecord(article))
+            else:
+                self.result.add_article_record(self.build_record(article))
+
+    def build_record(self, article):
+        extractor = get_extractor()
+        pmid, title, language = extractor.basics(article)
+        publish_date = extractor.publish_date(article)
+        emails, authors = extractor.authors_and_emails(article)
+        return ArticleRecord(title, language, publish_date, emails, authors, pmid)
+
+
+def record_from_fields(fields):
+    title, language, date, emails, people, pmid = fields
+    authors = [Researcher(*person) for person in people]
+    return ArticleRecord(title, language, date, emails, authors, pmid)
+
+
+class EmailAnalyzer(ArticleAnalyzer):
+    # Emails mode only needs PMIDs and affiliations, so it parses through an
+    # EmailTarget instead of building a tree and full ArticleRecords
+    caches_records = False
+
+    def parse(self, raw_response, request):
+        if not self.streaming or request.retmode != "xml":
+            return super().parse(raw_response, request)
+        self.init_result(raw_response, request)
+        self.add_email_records(request, iter_chunks(raw_response))
+
+    def analyze_result(self, response, request):
+        self.init_result(response, request)
+        self.add_email_records(request, [response_bytes(response)])
 
+    def add_email_records(self, request, chunks):
+        for tag, value in iter_email_records(chunks):
+            if tag == "ERROR":
+                self.hasErrorResponse = True
+                self.report_error(request, value)
+            else:
+                pmid, emails = value
+                self.result.add_article_record(ArticleRecord(None, None, None, emails, [], pmid))
@@ -1,31 +1,115 @@
+from lxml import etree
 from entrezpy.base.result import EutilsResult
+from researcher import intern_text
+from columns import ArticleColumns
+from parsing import get_extractor, get_parser
 
 
 class ArticleRecord:
     # Class to store a single article
+    __slots__ = ("title", "language", "date", "emails", "people", "pmid")
+
     def __init__(self, title, language, date, emails, people, pmid):
         self.title = title
-        self.language = language
-        self.date = date
+        self.language = intern_text(language)
+        self.date = intern_text(date)
         self.emails = emails
         self.people = people
         self.pmid = pmid
 
     def __repr__(self):
-       kvps = [f"{k}={v}" for k, v in vars(self).items()]
+       kvps = [f"{k}={getattr(self, k)}" for k in self.__slots__]
+       return f"{type(self).__name__}({', '.join(kvps)})"
+
+
+class lazy_field:
+    # Computes a LazyArticleRecord field on first read and keeps it in the
+    # record's "_<name>" slot
+    def __init__(self, compute):
+        self.compute = compute
+
+    def __set_name__(self, owner, name):
+        self.slot = "_" + name
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        try:
+            return getattr(record, self.slot)
+        except AttributeError:
+            value = self.compute(get_extractor(), record)
+            setattr(record, self.slot, value)
+            return value
+
+    def __set__(self, record, value):
+        setattr(record, self.slot, value)
+
+
+def _authors_and_emails(extractor, record):
+    # Emails and people come out of one pass over the authors; fill both
+    emails, people = extractor.authors_and_emails(record.element)
+    if not hasattr(record, "_emails"):
+        record._emails = emails
+    if not hasattr(record, "_people"):
+        record._people = people
+    return record._emails, record._people
+
+
+class LazyArticleRecord:
+    # ArticleRecord whose fields are extracted from its PubmedArticle on first
+    # access. The source is either the element itself or its raw bytes, which
+    # are only parsed once a field is read.
+    __slots__ = (
+        "source", "_element", "_title", "_language", "_date", "_emails", "_people", "_pmid",
+        "_abstract", "_mesh_terms", "_journal",
+    )
+    fields = ("title", "language", "date", "emails", "people", "pmid")
+
+    def __init__(self, source):
+        self.source = source
+
+    @property
+    def element(self):
+        try:
+            return self._element
+        except AttributeError:
+            source = self.source
+            if isinstance(source, bytes):
+                source = etree.fromstring(source, get_parser())
+            self._element = source
+            return source
+
+    pmid = lazy_field(lambda extractor, record: extractor.text(extractor.pmid, record.element))
+    title = lazy_field(lambda extractor, record: extractor.text(extractor.title, record.element))
+    language = lazy_field(
+        lambda extractor, record: intern_text(extractor.text(extractor.language, record.element))
+    )
+    date = lazy_field(lambda extractor, record: intern_text(extractor.publish_date(record.element)))
+    emails = lazy_field(lambda extractor, record: _authors_and_emails(extractor, record)[0])
+    people = lazy_field(lambda extractor, record: _authors_and_emails(extractor, record)[1])
+    abstract = lazy_field(lambda extractor, record: extractor.abstract(record.element))
+    mesh_terms = lazy_field(lambda extractor, record: extractor.mesh_terms(record.element))
+    journal = lazy_field(lambda extractor, record: extractor.journal(record.element))
+
+    def __repr__(self):
+       kvps = [f"{k}={getattr(self, k)}" for k in self.fields]
        return f"{type(self).__name__}({', '.join(kvps)})"
 
 
 class ArticleResult(EutilsResult):
-    def __init__(self, response, request):
+    def __init__(self, response, request, columnar=False):
         super().__init__(request.eutil, request.query_id, request.db)
         self.articles = []
+        # Columnar results keep records only as ArticleColumns, not as objects
+        self.columns = ArticleColumns() if columnar else None
 
     def size(self):
+        if self.columns is not None:
+            return len(self.columns)
         return len(self.articles)
 
     def isEmpty(self):
-        if not self.articles:
+        if not self.size():
             return True
         return False
 
@@ -45,4 +129,18 @@ class ArticleResult(EutilsResult):
             }
         }
     def add_article_record(self, article_record):
-        self.articles.append(article_record)
+        if self.columns is not None:
+            self.columns.append(article_record)
+        else:
+            self.articles.append(article_record)
+
+    def to_arrow(self):
+        if self.columns is not None:
+            return self.columns.to_arrow()
+        return ArticleColumns.from_records(self.articles).to_arrow()
+
+    def write_parquet(self, path):
+        columns = self.columns
+        if columns is None:
+            columns = ArticleColumns.from_records(self.articles)
+        columns.write_parquet(path)
@@ -0,0 +1,248 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from analyzer import record_from_fields
+from constants import CACHE_DIR
+
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "records.sqlite3")
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_SEARCH_TTL = 60 * 60
+DEFAULT_SEARCH_STALE_TTL = 24 * 60 * 60
+
+# SQLite caps the number of ? placeholders per statement
+_BATCH = 500
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_record_cache(path=DEFAULT_CACHE_PATH):
+    # One RecordCache per path and process, or None if path is unusable
+    return _get_shared(RecordCache, path)
+
+
+def get_search_cache(path=DEFAULT_CACHE_PATH):
+    # One SearchCache per path and process, or None if path is unusable
+    return _get_shared(SearchCache, path)
+
+
+def _get_shared(cache_class, path):
+    with _shared_lock:
+        if (cache_class, path) not in _shared:
+            _shared[(cache_class, path)] = open_or_none(cache_class, path)
+        return _shared[(cache_class, path)]
+
+
+def open_or_none(store_class, path):
+    # Searches still work without a writable cache directory, only uncached
+    try:
+        return store_class(path)
+    except (OSError, sqlite3.Error) as error:
+        warnings.warn(f"not caching in {path}: {error}", RuntimeWarning, stacklevel=3)
+        return None
+
+
+def serialize_record(record):
+    # Same field order as ArticleExtractor.record_fields, as compact JSON
+    people = [
+        (p.lastName, p.firstName, p.initials, p.affiliation, p.email) for p in record.people
+    ]
+    fields = (record.title, record.language, record.date, sorted(record.emails), people)
+    return json.dumps(fields, separators=(",", ":")).encode()
+
+
+def deserialize_record(pmid, data):
+    title, language, date, emails, people = json.loads(data)
+    return record_from_fields((title, language, date, set(emails), people, pmid))
+
+
+class SqliteCache:
+    # A connection is opened per call, so one cache can be shared by threads
+    # and processes. Subclasses create their tables in SCHEMA.
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as db:
+            for statement in self.SCHEMA:
+                db.execute(statement)
+
+    @contextmanager
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+
+class RecordCache(SqliteCache):
+    # PMID-keyed store of parsed ArticleRecords in a single SQLite file.
+    # Entries older than ttl seconds are stale; beyond max_entries the least
+    # recently used ones are evicted.
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS records ("
+        "pmid TEXT PRIMARY KEY, data BLOB NOT NULL,"
+        "fetched_at REAL NOT NULL, used_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS records_used_at ON records (used_at)",
+    )
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get_many(self, pmids):
+        # Returns {pmid: ArticleRecord} for the fresh entries among pmids
+        now = time.time()
+        found = {}
+        with self.connect() as db:
+            for batch in _batches(list(pmids)):
+                marks = ",".join("?" * len(batch))
+                rows = db.execute(
+                    f"SELECT pmid, data FROM records WHERE pmid IN ({marks}) AND fetched_at > ?",
+                    (*batch, now - self.ttl),
+                )
+                for pmid, data in rows:
+                    found[pmid] = deserialize_record(pmid, data)
+            for batch in _batches(list(found)):
+                marks = ",".join("?" * len(batch))
+                db.execute(f"UPDATE records SET used_at = ? WHERE pmid IN ({marks})", (now, *batch))
+        return found
+
+    def put_many(self, records):
+        now = time.time()
+        rows = [(r.pmid, serialize_record(r), now, now) for r in records if r.pmid]
+        if not rows:
+            return
+        with self.connect() as db:
+            db.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)", rows)
+            self.evict(db)
+
+    def evict(self, db):
+        (count,) = db.execute("SELECT COUNT(*) FROM records").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM records WHERE pmid IN "
+                "(SELECT pmid FROM records ORDER BY used_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def __len__(self):
+        with self.connect() as db:
+            return db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+
+_OPERATORS = {"AND", "OR", "NOT"}
+# An unmatched quote or bracket is kept as a token of its own, since PubMed
+# reads the query differently with it
+_TOKEN = re.compile(r'"[^"]*"|\[[^\]]*\]|[()]|[^\s()"\[]+|["\[]')
+
+
+def canonical_term(term):
+    # PubMed ignores case, spacing and spacing before field tags, but only
+    # upper-case AND/OR/NOT are operators, so those are kept as they are
+    tokens = []
+    for token in _TOKEN.findall(term or ""):
+        if token not in _OPERATORS:
+            token = " ".join(token.lower().split())
+        if token.startswith("[") and tokens and tokens[-1] not in _OPERATORS | {"("}:
+            tokens[-1] += token
+        else:
+            tokens.append(token)
+    return " ".join(tokens).replace("( ", "(").replace(" )", ")")
+
+
+def search_key(searchQuery):
+    return json.dumps(
+        [
+            searchQuery.get("db"),
+            canonical_term(searchQuery.get("term")),
+            searchQuery.get("sort"),
+            searchQuery.get("retmax"),
+        ],
+        separators=(",", ":"),
+    )
+
+
+class SearchCache(SqliteCache):
+    # esearch PMID lists keyed by the canonical query. Within ttl seconds an
+    # entry is fresh; for stale_ttl seconds after that it is still served, but
+    # the caller should refresh it (stale-while-revalidate).
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS searches ("
+        "key TEXT PRIMARY KEY, uids TEXT NOT NULL, fetched_at REAL NOT NULL)",
+    )
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_SEARCH_TTL,
+                 stale_ttl=DEFAULT_SEARCH_STALE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.counters = {"hits": 0, "stale_hits": 0, "misses": 0}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def get(self, searchQuery):
+        # Returns (uids, stale), or (None, False) on a miss
+        with self.connect() as db:
+            row = db.execute(
+                "SELECT uids, fetched_at FROM searches WHERE key = ?", (search_key(searchQuery),)
+            ).fetchone()
+        age = time.time() - row[1] if row else None
+        if age is None or age > self.ttl + self.stale_ttl:
+            self.count("misses")
+            return None, False
+        stale = age > self.ttl
+        self.count("stale_hits" if stale else "hits")
+        return json.loads(row[0]), stale
+
+    def put(self, searchQuery, uids):
+        with self.connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO searches VALUES (?, ?, ?)",
+                (search_key(searchQuery), json.dumps(list(uids)), time.time()),
+            )
+
+    def revalidate(self, searchQuery, search):
+        # Runs search(searchQuery) -> uids in the background, once per key
+        key = search_key(searchQuery)
+        with self.lock:
+            if key in self.refreshing:
+                return None
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                uids = search(searchQuery)
+                if uids is not None:
+                    self.put(searchQuery, uids)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+
+def _batches(items):
+    for start in range(0, len(items), _BATCH):
+        yield items[start:start + _BATCH]
@@ -1,10 +1,23 @@
-from constants import APPLICATION_OUTPUT_OPTIONS, PUBMED_SORT_OPTIONS
+from constants import APPLICATION_OUTPUT_OPTIONS, OUTPUT_FORMAT_OPTIONS, PUBMED_SORT_OPTIONS
 import argparse
 
+SOCKET_HELP = "Unix socket of the search daemon (default ~/.cache/scholarseek/daemon.sock)"
 
-def ParseArgs():
+
+def positive_int(value):
+    # argparse type for counts of processes and threads, so that 0 or a
+    # negative number is a usage error instead of a pool traceback
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, not {value}")
+    return number
+
+
+def ParseArgs(argv=None):
     parser = argparse.ArgumentParser(prog="PubMedSearch")
-    parser.add_argument("searchterm", help="Topic you want to search")
+    parser.add_argument(
+        "searchterm", nargs="?", help="Topic you want to search (optional with --input-file)"
+    )
     parser.add_argument(
         "-m",
         "--mode",
@@ -12,6 +25,13 @@ def ParseArgs():
         default="overview",
         help="Chooses the output type for the application",
     )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=OUTPUT_FORMAT_OPTIONS,
+        default="markdown",
+        help="Output format: markdown, JSON, newline-delimited JSON or CSV (one row per author)",
+    )
     parser.add_argument("-e", "--email", type=str, default="")
     parser.add_argument(
         "-n", "--searchnumber", type=int, default=10, help="Number of results you want"
@@ -23,4 +43,46 @@ def ParseArgs():
         default="relevance",
         help="Sort order for Pubmed Search",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=positive_int,
+        default=None,
+        help="Parse large result sets with this many processes (overview mode)",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=None,
+        help="Write stage timings and a cProfile report for this run to PATH",
+    )
+    parser.add_argument(
+        "-i",
+        "--input-file",
+        metavar="PATH",
+        default=None,
+        help="Run every search term in PATH (one per line) as one batch",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=positive_int,
+        default=None,
+        help="Number of batch searches to run at once",
+    )
+    parser.add_argument("--socket", metavar="PATH", default=None, help=SOCKET_HELP)
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Search in this process even when a daemon is running",
+    )
+    # A flag rather than a subcommand, so "serve" stays a valid search term
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run the search daemon on --socket instead of searching",
+    )
+    args = parser.parse_args(argv)
+    if not args.searchterm and not args.input_file and not args.serve:
+        parser.error("a search term or --input-file is required")
+    return args
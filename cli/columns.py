@@ -0,0 +1,180 @@
+from array import array
+from datetime import date
+
+# Columnar storage for ArticleRecords. Every column keeps its values in the
+# buffer layout Apache Arrow uses (validity bitmap, int32 offsets, UTF-8 data),
+# so to_arrow() wraps the buffers instead of copying them. pyarrow is only
+# needed for the export itself.
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+MONTHS = {
+    name: index
+    for index, name in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1
+    )
+}
+
+AUTHOR_FIELDS = ("lastName", "firstName", "initials", "affiliation", "email")
+
+
+def parse_pub_date(text):
+    # "2023-Jan-02", "2021-11" or "2023" as days since 1970-01-01 (Arrow date32).
+    # Missing months and days count as the first; anything else is None.
+    parts = (text or "").split("-")
+    try:
+        year = int(parts[0])
+        month = int(MONTHS.get(parts[1], parts[1])) if len(parts) > 1 else 1
+        day = int(parts[2]) if len(parts) > 2 else 1
+        return date(year, month, day).toordinal() - EPOCH_ORDINAL
+    except ValueError:
+        return None
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Arrow/Parquet export needs pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+class Column:
+    # Validity bitmap shared by all column types, one bit per value
+    def __init__(self):
+        self.length = 0
+        self.null_count = 0
+        self.validity = bytearray()
+
+    def __len__(self):
+        return self.length
+
+    def mark(self, valid):
+        index = self.length
+        if index % 8 == 0:
+            self.validity.append(0)
+        if valid:
+            self.validity[index >> 3] |= 1 << (index & 7)
+        else:
+            self.null_count += 1
+        self.length += 1
+
+    def validity_buffer(self, pa):
+        return pa.py_buffer(self.validity) if self.null_count else None
+
+
+class IntColumn(Column):
+    def __init__(self, typecode):
+        super().__init__()
+        self.values = array(typecode)
+
+    def append(self, value):
+        self.values.append(0 if value is None else value)
+        self.mark(value is not None)
+
+    def to_arrow(self, pa, arrow_type):
+        buffers = [self.validity_buffer(pa), pa.py_buffer(self.values)]
+        return pa.Array.from_buffers(arrow_type, self.length, buffers, self.null_count)
+
+
+class StringColumn(Column):
+    def __init__(self):
+        super().__init__()
+        self.offsets = array("i", [0])
+        self.data = bytearray()
+
+    def append(self, value):
+        if value is not None:
+            self.data += value.encode()
+        self.offsets.append(len(self.data))
+        self.mark(value is not None)
+
+    def to_arrow(self, pa):
+        buffers = [self.validity_buffer(pa), pa.py_buffer(self.offsets), pa.py_buffer(self.data)]
+        return pa.Array.from_buffers(pa.string(), self.length, buffers, self.null_count)
+
+
+class DictionaryColumn(Column):
+    # Few distinct values (languages): int32 codes into a small dictionary
+    def __init__(self):
+        super().__init__()
+        self.codes = array("i")
+        self.lookup = {}
+        self.dictionary = StringColumn()
+
+    def append(self, value):
+        code = 0
+        if value is not None:
+            code = self.lookup.get(value)
+            if code is None:
+                code = self.lookup[value] = len(self.dictionary)
+                self.dictionary.append(value)
+        self.codes.append(code)
+        self.mark(value is not None)
+
+    def to_arrow(self, pa):
+        buffers = [self.validity_buffer(pa), pa.py_buffer(self.codes)]
+        indices = pa.Array.from_buffers(pa.int32(), self.length, buffers, self.null_count)
+        return pa.DictionaryArray.from_arrays(indices, self.dictionary.to_arrow(pa))
+
+
+class ArticleColumns:
+    # One row per article. Emails and authors are stored flat, with int32
+    # offset arrays marking where each article's entries start.
+    def __init__(self):
+        self.pmid = IntColumn("q")
+        self.title = StringColumn()
+        self.language = DictionaryColumn()
+        self.date = IntColumn("i")
+        self.email_offsets = array("i", [0])
+        self.emails = StringColumn()
+        self.author_offsets = array("i", [0])
+        self.authors = {field: StringColumn() for field in AUTHOR_FIELDS}
+
+    @classmethod
+    def from_records(cls, records):
+        columns = cls()
+        for record in records:
+            columns.append(record)
+        return columns
+
+    def __len__(self):
+        return len(self.pmid)
+
+    def append(self, record):
+        # Arrow buffers are views, so append before exporting, not after
+        self.pmid.append(int(record.pmid) if record.pmid else None)
+        self.title.append(record.title)
+        self.language.append(record.language)
+        self.date.append(parse_pub_date(record.date))
+        for email in sorted(record.emails):
+            self.emails.append(email)
+        self.email_offsets.append(len(self.emails))
+        for person in record.people:
+            for field, column in self.authors.items():
+                column.append(getattr(person, field))
+        self.author_offsets.append(len(self.authors["lastName"]))
+
+    def to_arrow(self):
+        pa = require_pyarrow()
+        authors = pa.StructArray.from_arrays(
+            [column.to_arrow(pa) for column in self.authors.values()], names=AUTHOR_FIELDS
+        )
+        emails = self.emails.to_arrow(pa)
+        return pa.table({
+            "pmid": self.pmid.to_arrow(pa, pa.int64()),
+            "title": self.title.to_arrow(pa),
+            "language": self.language.to_arrow(pa),
+            "date": self.date.to_arrow(pa, pa.date32()),
+            "emails": pa.ListArray.from_arrays(_offsets(pa, self.email_offsets), emails),
+            "authors": pa.ListArray.from_arrays(_offsets(pa, self.author_offsets), authors),
+        })
+
+    def write_parquet(self, path):
+        require_pyarrow()
+        import pyarrow.parquet as pq
+        pq.write_table(self.to_arrow(), path)
+
+
+def _offsets(pa, offsets):
+    return pa.Array.from_buffers(pa.int32(), len(offsets), [None, pa.py_buffer(offsets)])
@@ -1,2 +1,10 @@
+import os
+
 PUBMED_SORT_OPTIONS = ["relevance", "pub_date", "Author", "JournalName"]
 APPLICATION_OUTPUT_OPTIONS = ["overview","emails"]
+OUTPUT_FORMAT_OPTIONS = ["markdown", "json", "ndjson", "csv"]
+# Record, search and rate-limit state; SCHOLARSEEK_CACHE_DIR overrides it, e.g.
+# for a service user without a home directory
+CACHE_DIR = os.environ.get("SCHOLARSEEK_CACHE_DIR") or os.path.join(
+    os.path.expanduser("~"), ".cache", "scholarseek"
+)
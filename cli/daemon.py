@@ -0,0 +1,132 @@
+import json
+import os
+import socket
+import socketserver
+from constants import CACHE_DIR
+
+# A long-running process (`main.py --serve`) that answers CLI searches over a
+# Unix socket. Searches run through one SearchSession, which keeps the
+# imports, parsers, record and search caches, the rate limiter and the
+# keep-alive connections to NCBI warm, so a CLI run only has to start Python
+# and connect.
+#
+# Protocol: the client sends one JSON request line (see main.buildRequest);
+# the daemon answers with one JSON line per output chunk, {"chunk": text},
+# then a final {"done": true} or {"error": text}, and closes the connection.
+# A stream that ends without either was cut short, and is an error too.
+
+DEFAULT_SOCKET_PATH = os.path.join(CACHE_DIR, "daemon.sock")
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def connect(path=None):
+    # Socket to the daemon listening at path, or None when there is none
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path or DEFAULT_SOCKET_PATH)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        return None
+    return sock
+
+
+def iterResponse(sock, request):
+    # Sends request and yields the output chunks as the daemon streams them
+    with sock, sock.makefile("rb") as lines:
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                break
+            if "error" in message:
+                raise DaemonError(message["error"])
+            if message.get("done"):
+                return
+            yield message["chunk"]
+    raise DaemonError("the daemon closed the connection before the search finished")
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        from services import iterRequest
+
+        line = self.rfile.readline()
+        if not line:
+            # Connected and hung up without a request, as remove_stale_socket does
+            return
+        try:
+            request = json.loads(line)
+            for chunk in iterRequest(request, session=self.server.session):
+                self.send({"chunk": chunk})
+            self.send({"done": True})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; closing the generator cancels its fetches
+            return
+        except Exception as error:
+            try:
+                self.send({"error": f"{type(error).__name__}: {error}"})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+
+
+class Daemon(socketserver.ThreadingUnixStreamServer):
+    # Each connection is served on its own thread, so a slow search does not
+    # hold up cached ones
+    daemon_threads = True
+
+    def __init__(self, path=None, session=None):
+        self.path = path or DEFAULT_SOCKET_PATH
+        # Without a SearchSession each request searches like a local CLI run
+        self.session = session
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        remove_stale_socket(self.path)
+        super().__init__(self.path, DaemonHandler)
+        # Only this user may send searches through the daemon
+        os.chmod(self.path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def remove_stale_socket(path):
+    # A socket file left behind by a daemon that died is removed; a live
+    # daemon on the same path is an error
+    if not os.path.exists(path):
+        return
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        raise DaemonError(f"a daemon is already listening on {path}")
+    os.unlink(path)
+
+
+def warm():
+    # The SearchSession, with everything a search needs loaded before the
+    # first request arrives
+    from services import get_session
+
+    return get_session()
+
+
+def serve(path=None):
+    session = warm()
+    with Daemon(path, session) as daemon:
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            session.close()
@@ -0,0 +1,241 @@
+import asyncio
+import gzip
+import json
+import ssl
+from urllib.parse import urlencode, urlsplit
+from ratelimit import get_rate_limiter
+
+# Native asyncio E-utilities client. Requests go over a small pool of
+# HTTP/1.1 keep-alive connections with gzip transfer encoding, so one event
+# loop can keep dozens of requests in flight without a thread per request.
+
+EUTILS_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+TOOL = "scholarseek"
+MAX_CONNECTIONS = 10
+# Seconds to open a connection, and to send a request and read its response
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+
+class EutilsError(RuntimeError):
+    def __init__(self, eutil, status, body=b""):
+        super().__init__(f"{eutil} failed with HTTP {status}")
+        self.status = status
+        self.body = body
+
+
+class ConnectionPool:
+    # Up to size keep-alive connections to one host. Connections belong to the
+    # event loop that opened them, so a new loop starts with an empty pool.
+    def __init__(self, url, size=MAX_CONNECTIONS, connectTimeout=CONNECT_TIMEOUT):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.size = size
+        self.connectTimeout = connectTimeout
+        self.idle = []
+        self.opened = 0
+        self.loop = None
+        self.slots = None
+
+    def bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self.loop = loop
+            self.idle = []
+            self.slots = asyncio.Semaphore(self.size)
+
+    async def acquire(self):
+        # Returns (reader, writer, reused)
+        self.bind()
+        await self.slots.acquire()
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.connectTimeout
+            )
+        except asyncio.TimeoutError:
+            self.slots.release()
+            raise TimeoutError(f"connecting to {self.host} timed out") from None
+        except BaseException:
+            self.slots.release()
+            raise
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, reader, writer, keepAlive):
+        if keepAlive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        self.slots.release()
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        for _, writer in idle:
+            writer.close()
+        for _, writer in idle:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+
+class AsyncEutils:
+    # esearch/esummary/elink return the decoded JSON, efetch the raw body.
+    # All requests share one ConnectionPool and the NCBI rate limit. A stalled
+    # server raises TimeoutError (an OSError) instead of holding its
+    # connection forever.
+    def __init__(self, email, apikey=None, tool=TOOL, url=EUTILS_URL,
+                 maxConnections=MAX_CONNECTIONS, rateLimiter=None,
+                 connectTimeout=CONNECT_TIMEOUT, readTimeout=READ_TIMEOUT):
+        self.email = email
+        self.apikey = apikey
+        self.tool = tool
+        self.path = urlsplit(url).path.rstrip("/")
+        self.pool = ConnectionPool(url, maxConnections, connectTimeout)
+        self.readTimeout = readTimeout
+        self.rateLimiter = rateLimiter or get_rate_limiter(apikey=apikey)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.pool.close()
+
+    async def esearch(self, params):
+        data = await self.requestJson("esearch", params)
+        return data["esearchresult"]
+
+    async def esummary(self, params):
+        data = await self.requestJson("esummary", params)
+        return data["result"]
+
+    async def elink(self, params):
+        return await self.requestJson("elink", params)
+
+    async def efetch(self, params):
+        return await self.request("efetch", params)
+
+    async def requestJson(self, eutil, params):
+        return json.loads(await self.request(eutil, dict(params, retmode="json")))
+
+    async def request(self, eutil, params):
+        # A SharedRateLimiter takes an SQLite write lock, so not on the loop
+        delay = await asyncio.to_thread(self.rateLimiter.reserve)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        body = self.encode(params)
+        path = f"{self.path}/{eutil}.fcgi"
+        reader, writer, reused = await self.pool.acquire()
+        try:
+            status, keepAlive, data = await self.timedExchange(eutil, reader, writer, path, body)
+        except TimeoutError:
+            # A timed out connection may still get the late response, so it
+            # is not reused, and a stalled server is not asked again
+            self.pool.release(reader, writer, False)
+            raise
+        except (OSError, asyncio.IncompleteReadError):
+            self.pool.release(reader, writer, False)
+            if not reused:
+                raise
+            # The server may drop idle keep-alive connections; retry once fresh
+            reader, writer, _ = await self.pool.acquire()
+            try:
+                status, keepAlive, data = await self.timedExchange(
+                    eutil, reader, writer, path, body
+                )
+            except BaseException:
+                self.pool.release(reader, writer, False)
+                raise
+        except BaseException:
+            self.pool.release(reader, writer, False)
+            raise
+        self.pool.release(reader, writer, keepAlive)
+        if status != 200:
+            raise EutilsError(eutil, status, data)
+        return data
+
+    def encode(self, params):
+        # entrezpy-style parameters: lists are comma-joined, True is "y"
+        query = {"tool": self.tool, "email": self.email}
+        if self.apikey:
+            query["api_key"] = self.apikey
+        for key, value in params.items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = "y" if value else "n"
+            elif isinstance(value, (list, tuple)):
+                value = ",".join(str(v) for v in value)
+            query[key] = value
+        return urlencode(query).encode()
+
+    async def timedExchange(self, eutil, reader, writer, path, body):
+        try:
+            return await asyncio.wait_for(
+                self.exchange(reader, writer, path, body), self.readTimeout
+            )
+        except asyncio.TimeoutError:
+            # Before Python 3.11 asyncio's TimeoutError is not the builtin one
+            raise TimeoutError(f"{eutil} timed out after {self.readTimeout}s") from None
+
+    async def exchange(self, reader, writer, path, body):
+        writer.write(
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.pool.host}\r\n"
+            "Connection: keep-alive\r\n"
+            "Accept-Encoding: gzip\r\n"
+            "Content-Type: application/x-www-form-urlencoded\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        return await read_response(reader)
+
+
+async def read_response(reader):
+    # Returns (status, keepAlive, body) for one HTTP/1.1 response
+    statusLine = await reader.readline()
+    if not statusLine:
+        raise asyncio.IncompleteReadError(b"", None)
+    version, status = statusLine.decode("latin-1").split(None, 2)[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    keepAlive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = await read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keepAlive = False
+    if headers.get("content-encoding", "").lower() == "gzip":
+        body = gzip.decompress(body)
+    return int(status), keepAlive, body
+
+
+async def read_chunked(reader):
+    chunks = []
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        if size == 0:
+            # Skip trailers up to the closing blank line
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
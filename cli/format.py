@@ -1,8 +1,19 @@
+import csv
+import io
+import json
+from columns import AUTHOR_FIELDS
+
+# orjson is optional; it encodes several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def overviewFormat(articles):
-    md=""
-    for article in articles:
-        md += f"""##  Article Overview
+    return "".join(articleFormat(article) for article in articles)
+
+def articleFormat(article):
+    parts = [f"""##  Article Overview
 
 **Title:** {article.title}  
 **URL:** https://pubmed.ncbi.nlm.nih.gov/{article.pmid}  
@@ -16,14 +27,139 @@ def overviewFormat(articles):
 
 | Author | Affiliation |
 |--------|-------------|
-"""
-        for a in article.people:
-            md += f"| {a.firstName} {a.lastName} | {a.affiliation} |\n"
-        if article.emails:
-            md += "\n**Emails:** "
-            md += ", ".join(article.emails)
-            md += "\n"
-    return md
+"""]
+    for a in article.people:
+        parts.append(f"| {a.firstName} {a.lastName} | {a.affiliation} |\n")
+    if article.emails:
+        parts.append(f"\n**Emails:** {', '.join(article.emails)}\n")
+    return "".join(parts)
 
 def emailFormat(emails):
     return ", ".join(emails)
+
+# Streaming formatters. Each takes an iterable of articles (or emails) and
+# yields the output in pieces, one article at a time, so nothing but the
+# current article is held and the pieces can go straight to a file.
+
+def articleDict(article):
+    return {
+        "pmid": article.pmid,
+        "title": article.title,
+        "language": article.language,
+        "date": article.date,
+        "emails": sorted(article.emails),
+        "authors": [
+            {field: getattr(person, field) for field in AUTHOR_FIELDS}
+            for person in article.people
+        ],
+    }
+
+def dumpJson(value):
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def markdownChunks(articles):
+    for article in articles:
+        yield articleFormat(article)
+
+def jsonChunks(articles, toJson=articleDict):
+    separator = "["
+    for article in articles:
+        yield separator + dumpJson(toJson(article))
+        separator = ","
+    yield "[]\n" if separator == "[" else "]\n"
+
+def ndjsonChunks(articles, toJson=articleDict):
+    for article in articles:
+        yield dumpJson(toJson(article)) + "\n"
+
+CSV_COLUMNS = ("pmid", "title", "date") + AUTHOR_FIELDS
+
+def csvChunks(articles):
+    return csvWrite(CSV_COLUMNS, (csvRows(article) for article in articles))
+
+def csvRows(article, prefix=()):
+    # One row per author; articles without authors get one row of their own
+    head = prefix + (article.pmid, article.title, article.date)
+    for person in article.people or [None]:
+        yield head + tuple(
+            getattr(person, field) if person else None for field in AUTHOR_FIELDS
+        )
+
+def csvWrite(header, groups):
+    # Yields the header and then each group of rows as one chunk
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(header)
+    for rows in groups:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def emailChunks(emails, outputFormat="markdown"):
+    if outputFormat == "markdown":
+        separator = ""
+        for email in emails:
+            yield separator + email
+            separator = ", "
+    elif outputFormat == "json":
+        yield from jsonChunks(emails, toJson=str)
+    elif outputFormat == "ndjson":
+        yield from ndjsonChunks(emails, toJson=str)
+    else:
+        yield "email\n"
+        for email in emails:
+            yield email + "\n"
+
+ARTICLE_FORMATTERS = {
+    "markdown": markdownChunks,
+    "json": jsonChunks,
+    "ndjson": ndjsonChunks,
+    "csv": csvChunks,
+}
+
+def articleChunks(articles, outputFormat="markdown"):
+    return ARTICLE_FORMATTERS[outputFormat](articles)
+
+def writeArticles(articles, out, outputFormat="markdown"):
+    for chunk in articleChunks(articles, outputFormat):
+        out.write(chunk)
+
+def writeEmails(emails, out, outputFormat="markdown"):
+    for chunk in emailChunks(emails, outputFormat):
+        out.write(chunk)
+
+
+def batchChunks(results, outputFormat="markdown", emails=False, empty=""):
+    # Output of a batch run: results are (query, articles) pairs, or
+    # (query, emails) pairs with emails=True, kept apart per query
+    if outputFormat == "markdown":
+        for query, items in results:
+            yield f"# Query: {query}\n\n"
+            found = False
+            for chunk in emailChunks(items) if emails else markdownChunks(items):
+                found = True
+                yield chunk
+            yield "\n\n" if found else empty + "\n\n"
+    elif outputFormat in ("json", "ndjson"):
+        key, toJson = ("emails", str) if emails else ("articles", articleDict)
+
+        def queryDict(result):
+            query, items = result
+            return {"query": query, key: [toJson(item) for item in items]}
+
+        formatter = jsonChunks if outputFormat == "json" else ndjsonChunks
+        yield from formatter(results, toJson=queryDict)
+    elif emails:
+        groups = (((query, email) for email in items) for query, items in results)
+        yield from csvWrite(("query", "email"), groups)
+    else:
+        groups = (
+            (row for article in items for row in csvRows(article, (query,)))
+            for query, items in results
+        )
+        yield from csvWrite(("query",) + CSV_COLUMNS, groups)
@@ -1,7 +1,10 @@
 from cli import ParseArgs
-from services import getEmails, getSummary
 import sys
 
+# Only argparse is imported up front, so --help and argument errors return
+# without loading lxml, entrezpy or the pipeline. When a daemon is running
+# (`main.py --serve`) the search runs there and the CLI only streams its output;
+# otherwise run() imports the services and searches in this process.
 
 
 def main():
@@ -11,14 +14,77 @@ def main():
         # sys.stdout may not support reconfigure (e.g., when redirected or on some Python versions)
         pass
     args = ParseArgs()
-    if args.mode == "overview":
-        summary = getSummary(args.searchterm, args.sortby, args.email, args.searchnumber)
-        print(summary)
-        return summary
-    else:  # emails mode
-        emails = getEmails(args.searchterm, args.sortby, args.email, args.searchnumber)
-        print(emails)
-        return emails
+    if args.serve:
+        from daemon import serve
+
+        serve(args.socket)
+        return
+    if args.profile:
+        from profiling import profiled
+
+        with profiled(args.profile) as timer:
+            run(args, timer)
+    else:
+        from profiling import NullTimer
+
+        run(args, NullTimer())
+
+
+def run(args, timer):
+    request = buildRequest(args)
+    chunks = None
+    # A profiled run is always local, since that is where the time goes
+    if not args.local and not args.profile:
+        from daemon import connect, iterResponse
+
+        sock = connect(args.socket)
+        if sock is not None:
+            chunks = iterResponse(sock, request)
+    if chunks is None:
+        from services import iterRequest
+
+        chunks = iterRequest(request)
+    timer.mark("import")
+    # Each chunk is shown as soon as it is parsed, instead of after the search
+    first = True
+    for chunk in chunks:
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+        if first:
+            timer.mark("first result")
+            first = False
+    # Markdown output ends like the print() it replaced; the other formats
+    # already end their last line
+    if args.format == "markdown":
+        sys.stdout.write("\n")
+    timer.mark("output")
+
+
+def buildRequest(args):
+    terms = None
+    if args.input_file:
+        terms = readTerms(args.input_file)
+        if args.searchterm:
+            terms.insert(0, args.searchterm)
+    return {
+        "mode": args.mode,
+        "searchterm": args.searchterm,
+        "terms": terms,
+        "sortby": args.sortby,
+        "email": args.email,
+        "searchnumber": args.searchnumber,
+        "workers": args.workers,
+        "jobs": args.jobs,
+        "format": args.format,
+    }
+
+
+def readTerms(path):
+    # One search term per line; blank lines and # comments are skipped
+    with open(path, encoding="utf-8") as lines:
+        return [
+            line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")
+        ]
 
 
 
@@ -29,4 +95,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -1,39 +1,369 @@
+from bisect import bisect_right
 from lxml import etree
 import re
+import threading
 from researcher import Researcher
 
+CHUNK_SIZE = 64 * 1024
+SHARD_SIZE = 250
+
+_local = threading.local()
+
+def get_parser():
+    # lxml parsers are not thread-safe, so each thread keeps its own
+    parser = getattr(_local, "parser", None)
+    if parser is None:
+        parser = _local.parser = etree.XMLParser(ns_clean=True, recover=True)
+    return parser
+
+def get_extractor():
+    extractor = getattr(_local, "extractor", None)
+    if extractor is None:
+        extractor = _local.extractor = ArticleExtractor()
+    return extractor
+
+def response_bytes(response):
+    # entrezpy hands analyze_result a decoded io.StringIO; the byte-level
+    # splitters and lxml want the encoded payload
+    value = response.getvalue()
+    return value.encode("utf-8") if isinstance(value, str) else value
+
 def parse_xml(response):
-    parser = etree.XMLParser(ns_clean=True, recover=True)
-    return etree.fromstring(response.getvalue(), parser)
+    return etree.fromstring(response_bytes(response), get_parser())
 
-def extract_basics(article):
-    return (
-        article.findtext('.//PMID'),
-        article.findtext('.//ArticleTitle'),
-        article.findtext('.//Language')
+def iter_chunks(stream, size=CHUNK_SIZE):
+    # Reads the raw HTTP body piecewise so parsing overlaps with the transfer
+    while True:
+        chunk = stream.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_articles(chunks):
+    # Yields every PubmedArticle (or ERROR) element as soon as it is closed.
+    # Elements are cleared once the caller is done with them, so memory stays
+    # bounded by a single article instead of the whole payload.
+    parser = etree.XMLPullParser(
+        events=("end",), tag=("PubmedArticle", "ERROR"), ns_clean=True, recover=True
     )
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from _closed_elements(parser)
+    parser.close()
+    yield from _closed_elements(parser)
+
+def _closed_elements(parser):
+    for _, element in parser.read_events():
+        yield element
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+            parent.remove(element)
+
+def iter_email_records(chunks):
+    # Emails-mode counterpart of iter_articles. Articles are cut out of the raw
+    # bytes and only their AuthorList is handed to an EmailTarget, so abstracts,
+    # MeSH and reference lists are never tokenized and no tree is built.
+    # Yields ("PubmedArticle", (pmid, emails)) per article and ("ERROR", text)
+    # per error element.
+    target = EmailTarget()
+    parser = etree.XMLParser(target=target, ns_clean=True, recover=True)
+    for kind, data in iter_article_slices(chunks):
+        if kind == "PubmedArticle":
+            yield kind, (_slice_pmid(data), _slice_emails(parser, data))
+        elif b"<ERROR" in data:
+            parser.feed(data)
+            yield from (("ERROR", text) for text in parser.close())
+
+def iter_article_slices(chunks):
+    # Splits a PubmedArticleSet on article boundaries with plain byte searches.
+    # Yields ("PubmedArticle", bytes) per article and ("other", bytes) for the
+    # rest of the document (only worth parsing if it holds an ERROR element).
+    buffer = bytearray()
+    other = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        pos = 0
+        while True:
+            start = _find_open_tag(buffer, b"<PubmedArticle", pos)
+            if start < 0:
+                break
+            end = buffer.find(b"</PubmedArticle>", start)
+            if end < 0:
+                break
+            end += len(b"</PubmedArticle>")
+            other += buffer[pos:start]
+            yield "PubmedArticle", bytes(buffer[start:end])
+            pos = end
+        del buffer[:pos]
+    other += buffer
+    if other:
+        yield "other", bytes(other)
+
+def iter_article_shards(chunks, size=None):
+    # Groups article slices into shards of `size` articles for worker processes.
+    # Non-article parts of the document are passed through as they come.
+    size = size or SHARD_SIZE
+    shard = []
+    for kind, data in iter_article_slices(chunks):
+        if kind != "PubmedArticle":
+            yield kind, data
+            continue
+        shard.append(data)
+        if len(shard) == size:
+            yield "shard", shard
+            shard = []
+    if shard:
+        yield "shard", shard
+
+def parse_shard(articles):
+    # Runs in a worker process. Returns plain tuples (see record_fields) since
+    # they pickle much more cheaply than ArticleRecords.
+    document = b"<PubmedArticleSet>" + b"".join(articles) + b"</PubmedArticleSet>"
+    root = etree.fromstring(document, get_parser())
+    extractor = get_extractor()
+    return [extractor.record_fields(article) for article in root]
+
+def _find_open_tag(data, tag, pos=0, end=None):
+    # bytes.find, but "<PubmedArticle" must not match "<PubmedArticleSet"
+    end = len(data) if end is None else end
+    while True:
+        pos = data.find(tag, pos, end)
+        if pos < 0 or pos + len(tag) >= len(data) or data[pos + len(tag)] in b"> \t\r\n/":
+            return pos
+        pos += len(tag)
+
+_PMID = re.compile(rb"<PMID(?:\s[^>]*)?>([^<]*)</PMID>")
+
+def _slice_pmid(data):
+    # MedlineCitation/PMID is the first PMID of a PubmedArticle
+    match = _PMID.search(data)
+    return match.group(1).decode() if match else None
+
+def _slice_emails(parser, data):
+    start = _find_open_tag(data, b"<AuthorList", 0)
+    if start < 0:
+        return set()
+    end = data.find(b"</AuthorList>", start)
+    if end < 0:
+        return set()
+    parser.feed(data[start:end + len(b"</AuthorList>")])
+    return parser.close()
+
+class EmailTarget:
+    # lxml parser target fed one AuthorList (or an error document) at a time.
+    # It only collects the first affiliation of each author and ERROR texts;
+    # close() returns the emails found, or the error texts.
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._depth = 0
+        self._text = []
+        self._collecting = False
+        self._capture = None
+        self._affiliation_seen = False
+        self._emails = set()
+        self._errors = []
+
+    def start(self, tag, attrib):
+        self._depth += 1
+        # Like Element.text, only the text before the first child counts
+        self._collecting = False
+        if tag == "Author" and self._depth == 2:
+            self._affiliation_seen = False
+        elif tag == "Affiliation" and not self._affiliation_seen and self._depth in (3, 4):
+            self._affiliation_seen = True
+            self._begin(tag)
+        elif tag == "ERROR":
+            self._begin(tag)
+
+    def _begin(self, tag):
+        self._capture = tag
+        self._text = []
+        self._collecting = True
+
+    def data(self, data):
+        if self._collecting:
+            self._text.append(data)
+
+    def end(self, tag):
+        self._depth -= 1
+        if tag != self._capture:
+            return
+        text = "".join(self._text)
+        self._capture = None
+        self._collecting = False
+        if tag == "ERROR":
+            self._errors.append(text)
+        else:
+            self._emails.update(extract_emails(text))
+
+    def close(self):
+        result = self._errors if self._errors else self._emails
+        self._reset()
+        return result
+
+class ArticleExtractor:
+    # Reads the fields of a PubmedArticle through precompiled XPath expressions
+    # anchored at their schema location, instead of scanning the whole subtree
+    # once per field.
+    def __init__(self):
+        self.pmid = etree.XPath("MedlineCitation/PMID")
+        self.title = etree.XPath("MedlineCitation/Article/ArticleTitle")
+        self.language = etree.XPath("MedlineCitation/Article/Language")
+        self.pub_date = etree.XPath("MedlineCitation/Article/Journal/JournalIssue/PubDate")
+        self.authors = etree.XPath("MedlineCitation/Article/AuthorList/Author")
+        self.affiliation = etree.XPath("AffiliationInfo/Affiliation | Affiliation")
+        self.abstract_texts = etree.XPath("MedlineCitation/Article/Abstract/AbstractText")
+        self.mesh = etree.XPath("MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName")
+        self.journal_title = etree.XPath("MedlineCitation/Article/Journal/Title")
+
+    def text(self, path, article):
+        # First match of one of the compiled paths above, e.g. text(self.title, article)
+        return _first_text(path(article))
+
+    def basics(self, article):
+        return (
+            _first_text(self.pmid(article)),
+            _first_text(self.title(article)),
+            _first_text(self.language(article)),
+        )
+
+    def publish_date(self, article):
+        pub = self.pub_date(article)
+        if not pub:
+            return ""
+        parts = _child_texts(pub[0])
+        return "-".join(filter(None, (parts.get(tag) for tag in ('Year', 'Month', 'Day'))))
+
+    def authors_and_emails(self, article):
+        # Every email of every affiliation counts for the article; each author
+        # keeps the first one of their own affiliation
+        nodes = self.authors(article)
+        # Co-authors often share an affiliation; they share one string, which
+        # lives no longer than the records holding it
+        shared = {}
+        affiliations = [
+            shared.setdefault(text, text)
+            for text in (_first_text(self.affiliation(auth)) or "" for auth in nodes)
+        ]
+        found = emails_by_text(affiliations)
+        authors = []
+        for auth, affiliation, emails in zip(nodes, affiliations, found):
+            fields = _child_texts(auth)
+            authors.append(Researcher(
+                fields.get('LastName') or "",
+                fields.get('ForeName') or "",
+                fields.get('Initials') or "",
+                affiliation,
+                emails[0] if emails else None,
+            ))
+        return {email for emails in found for email in emails}, authors
+
+    def abstract(self, article):
+        # Structured abstracts have several sections; inline markup is flattened
+        sections = ["".join(node.itertext()) for node in self.abstract_texts(article)]
+        return "\n".join(sections) if sections else None
+
+    def mesh_terms(self, article):
+        return [node.text or "" for node in self.mesh(article)]
+
+    def journal(self, article):
+        return _first_text(self.journal_title(article))
+
+    def record_fields(self, article):
+        # ArticleRecord arguments, with authors as Researcher argument tuples
+        pmid, title, language = self.basics(article)
+        emails, authors = self.authors_and_emails(article)
+        people = [
+            (a.lastName, a.firstName, a.initials, a.affiliation, a.email) for a in authors
+        ]
+        return title, language, self.publish_date(article), emails, people, pmid
+
+def _first_text(nodes):
+    # Same result as findtext(): None if missing, "" if the element is empty
+    if not nodes:
+        return None
+    return nodes[0].text or ""
+
+def _child_texts(element):
+    texts = {}
+    for child in element:
+        if child.tag not in texts:
+            texts[child.tag] = child.text
+    return texts
+
+def extract_basics(article):
+    return get_extractor().basics(article)
 
 def extract_publish_date(article):
-    pub = article.find('.//PubDate')
-    if pub is None:
-        return ""
-    parts = [pub.findtext(tag) for tag in ('Year', 'Month', 'Day')]
-    return "-".join(filter(None, parts))
+    return get_extractor().publish_date(article)
 
 def extract_authors_and_emails(article):
-    emails = set()
-    authors = []
-    for auth in article.findall('.//Author'):
-        last = auth.findtext('LastName') or ""
-        first = auth.findtext('ForeName') or ""
-        initials = auth.findtext('Initials') or ""
-        affiliation = auth.findtext('.//Affiliation') or ""
-        email = extract_email(affiliation)
-        if email:
-            emails.add(email)
-        authors.append(Researcher(last, first, initials, affiliation, email))
-    return emails, authors
+    return get_extractor().authors_and_emails(article)
 
 def extract_email(text):
-    match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', text or "")
-    return match.group(0) if match else None
+    # First email in text, lower-cased, or None
+    for _, email in scan_emails(text):
+        return email
+    return None
+
+def extract_emails(text):
+    # All distinct emails in text, lower-cased, in order of appearance
+    return list(dict.fromkeys(email for _, email in scan_emails(text)))
+
+def emails_by_text(texts):
+    # One scan over several texts (e.g. an article's affiliations); returns
+    # the list of emails found in each of them
+    starts = []
+    offset = 0
+    for text in texts:
+        starts.append(offset)
+        offset += len(text) + 1
+    found = [[] for _ in starts]
+    for pos, email in scan_emails("\n".join(texts)):
+        emails = found[bisect_right(starts, pos) - 1]
+        if email not in emails:
+            emails.append(email)
+    return found
+
+_EMAIL_CHARS = re.compile(r"[\w.-]+")
+_WORD = re.compile(r"\w+")
+
+def scan_emails(text):
+    # Yields (start, email) for the matches of [\w.-]+@[\w.-]+\.\w+, without
+    # running that pattern: it backtracks quadratically over long runs of word
+    # characters. Scanning starts at each "@" and each character is looked at
+    # a bounded number of times.
+    if not text:
+        return
+    at = text.find("@")
+    floor = 0
+    while at >= 0:
+        # Local part: the [\w.-] run right before "@", read backwards
+        local = _EMAIL_CHARS.match(text[at - 1:floor - 1 if floor else None:-1]) if at else None
+        domain = _EMAIL_CHARS.match(text, at + 1)
+        end = _domain_end(text, domain) if local and domain else None
+        if end is None:
+            floor = at + 1
+            at = text.find("@", at + 1)
+            continue
+        start = at - local.end()
+        yield start, text[start:end].lower()
+        floor = end
+        at = text.find("@", end)
+
+def _domain_end(text, domain):
+    # [\w.-]+\.\w+ within the run: the match ends after the word characters
+    # following the last dot that has any (and is not the first character)
+    start, end = domain.span()
+    dot = text.rfind(".", start + 1, end)
+    while dot > start:
+        word = _WORD.match(text, dot + 1, end)
+        if word:
+            return word.end()
+        dot = text.rfind(".", start + 1, dot)
+    return None
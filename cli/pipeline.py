@@ -1,13 +1,71 @@
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from entrezpy.conduit import Conduit
+from entrezpy.efetch.efetcher import Efetcher
+from entrezpy.efetch.efetch_parameter import EfetchParameter
+from entrezpy.efetch.efetch_request import EfetchRequest
+from ratelimit import get_rate_limiter
+
+FETCH_BATCH_SIZE = 250
+FETCH_CONCURRENCY = 3
+FETCH_RETRIES = 2
+# Seconds before the first retry of a failed batch; doubles with each retry
+FETCH_BACKOFF = 0.5
+FETCH_BACKOFF_MAX = 8
+# Above this many results esearch cannot return the PMIDs (NCBI caps retmax
+# at 10k), so the History server is used instead
+HISTORY_THRESHOLD = 10000
+# iterRecords fetches a small first batch so output can start right away
+STREAM_FIRST_BATCH = 20
+
+
+class WindowEfetcher(Efetcher):
+    # entrezpy's Efetcher always pages from the first record; this one fetches
+    # the single History server window [retstart, retstart + retmax)
+    def inquire(self, parameter, analyzer):
+        param = EfetchParameter(parameter)
+        self.monitor_start(param)
+        self.add_request(EfetchRequest(self.eutil, param, param.retstart, param.retmax), analyzer)
+        self.request_pool.drain()
+        self.monitor_stop()
+        if self.isGoodQuery():
+            return analyzer
+        return None
+
 
 class Pipeline:
-    def __init__(self,email):
+    def __init__(self,email, cache=None, searchCache=None, rateLimiter=None, client=None,
+                 conduit=None):
         self.fetchID= None
         self.searchID=None
-        self.conduit = Conduit(email)
+        self.email = email
+        # A SearchSession passes in the Conduit it keeps for all its searches
+        self.conduit = conduit or Conduit(email)
         self.pipeline = self.conduit.new_pipeline()
+        self.queued = False
+        # With a RecordCache, only PMIDs missing from it are efetched
+        self.cache = cache
+        # Fetches that need the esearch PMIDs first run in getResults
+        self.deferredFetch = None
+        # With a SearchCache, repeated esearch queries are answered locally
+        self.searchCache = searchCache
+        self.searchQuery = None
+        self.cachedUids = None
+        # Shared by every process on this machine unless one is passed in
+        self.rateLimiter = rateLimiter or get_rate_limiter()
+        # In History mode esearch only leaves a WebEnv/query_key on the server
+        self.useHistory = False
+        self.historyRetmax = None
+        # With an AsyncEutils client, getResults sends every request through
+        # it instead of entrezpy; the esearch is kept for it in clientSearch
+        self.client = client
+        self.clientSearch = None
 
-    def addSearch(self, searchTerm, sortBy, retmax, db="pubmed", rettype="uilist",):
+    def addSearch(self, searchTerm, sortBy, retmax, db="pubmed", rettype="uilist",
+                  useHistory=None):
         searchQuery = {
             "db": db,
             "term": searchTerm,
@@ -16,18 +74,437 @@ class Pipeline:
             "sort": sortBy
         }
 
+        if useHistory is None:
+            useHistory = int(retmax) > HISTORY_THRESHOLD
+        if useHistory:
+            # Without a rettype esearch returns no PMIDs, only the count
+            self.useHistory = True
+            self.historyRetmax = int(retmax)
+            searchQuery.update(rettype=None, retmax=0, usehistory=True)
+            self.queueSearch(searchQuery)
+            return
+
+        if self.searchCache is not None:
+            uids, stale = self.searchCache.get(searchQuery)
+            if uids is not None:
+                self.cachedUids = uids
+                if stale:
+                    self.searchCache.revalidate(searchQuery, self.runSearch)
+                return
+            self.searchQuery = searchQuery
+        self.queueSearch(searchQuery)
+
+    def addIds(self, uids):
+        # In place of addSearch: fetch these PMIDs as if an esearch had
+        # returned them (batch mode runs its esearches separately)
+        self.cachedUids = list(uids)
+
+    def queueSearch(self, searchQuery):
+        if self.client is not None:
+            self.clientSearch = searchQuery
+            return
         self.searchID = self.pipeline.add_search(searchQuery)
+        self.queued = True
 
-    def addFetch(self, analyzer=None, db="pubmed", retmode="xml"):
+    def runSearch(self, searchQuery):
+        # Standalone esearch used to refresh stale SearchCache entries, sent
+        # with this caller's email rather than the shared Conduit's
+        conduit = Conduit(self.email or self.conduit.email)
+        pipeline = conduit.new_pipeline()
+        searchID = pipeline.add_search(searchQuery)
+        self.rateLimiter.wait()
+        conduit.run(pipeline)
+        result = conduit.get_result(searchID)
+        return result.uids if result is not None else None
+
+    def addFetch(self, analyzer=None, db="pubmed", retmode="xml", batchSize=None):
         fetchQuery = {"db": db, "retmode": retmode}
-        self.fetchID = self.pipeline.add_fetch(
-                fetchQuery, dependency=self.searchID, analyzer=analyzer
-        )
+        if self.client is not None and analyzer is None:
+            raise ValueError("fetching through an AsyncEutils client needs an analyzer")
+        # Cached, batched, History and client fetches run in getResults
+        deferred = self.cache is not None or batchSize or self.useHistory or self.client
+        if analyzer is not None and deferred:
+            self.deferredFetch = (fetchQuery, analyzer, batchSize)
+            return
+        if self.cachedUids is not None:
+            if not self.cachedUids:
+                return
+            self.fetchID = self.pipeline.add_fetch(
+                    dict(fetchQuery, id=self.cachedUids), analyzer=analyzer
+            )
+        else:
+            self.fetchID = self.pipeline.add_fetch(
+                    fetchQuery, dependency=self.searchID, analyzer=analyzer
+            )
+        self.queued = True
 
     def getResults(self):
-        self.conduit.run(self.pipeline)
+        # Without a fetch the result is entrezpy's EsearchResult, or a plain
+        # namespace when the PMIDs came from the SearchCache or the client;
+        # callers may only rely on its .uids
+        if self.client is not None:
+            # asyncio is only imported for an AsyncEutils client, which already
+            # loaded it; the CLI never pays for it
+            import asyncio
+
+            return asyncio.run(self.runClient())
+        self.runQueued()
+        if self.deferredFetch:
+            return self.getDeferredResults(*self.deferredFetch)
         if self.fetchID:
             result = self.conduit.get_result(self.fetchID)
+        elif self.cachedUids is not None:
+            result = SimpleNamespace(uids=self.cachedUids)
         else:
             result = self.conduit.get_result(self.searchID)
         return result
+
+    def runQueued(self):
+        # A pipeline with nothing queued must not be run (entrezpy fails on it)
+        if self.queued or self.cachedUids is None:
+            self.rateLimiter.wait()
+            self.conduit.run(self.pipeline)
+        if self.searchQuery is not None:
+            search = self.conduit.get_result(self.searchID)
+            if search is not None:
+                self.searchCache.put(self.searchQuery, search.uids)
+
+    def iterRecords(self):
+        # Like getResults, but yields the ArticleRecords in search order as
+        # soon as their efetch batch is parsed, and keeps none of them
+        if self.client is not None or not self.deferredFetch:
+            result = self.getResults()
+            yield from getattr(result, "articles", None) or ()
+            return
+        self.runQueued()
+        fetchQuery, analyzer, batchSize = self.deferredFetch
+        if self.useHistory:
+            search = self.conduit.get_result(self.searchID)
+            if search is None or not search.count:
+                return
+            history = search.get_link_parameter()
+            windows = self.historyWindows(
+                fetchQuery, history["WebEnv"], history["query_key"], search.count,
+                batchSize, STREAM_FIRST_BATCH,
+            )
+            for records in self.iterFetched(windows, analyzer, WindowEfetcher):
+                self.storeRecords(analyzer, records)
+                yield from records
+            return
+
+        uids = self.searchUids()
+        records, missing = self.cachedRecords(uids)
+        batches = self.idBatches(missing, fetchQuery, batchSize, STREAM_FIRST_BATCH)
+        fetched = zip(batches, self.iterFetched(batches, analyzer, Efetcher))
+        requested = set()
+        for uid in uids:
+            if uid not in records and uid not in requested:
+                # Missing PMIDs are batched in search order, so the next
+                # batch is the one holding this uid
+                batch, batchRecords = next(fetched)
+                requested.update(batch["id"])
+                self.storeRecords(analyzer, batchRecords)
+                records.update((record.pmid, record) for record in batchRecords)
+            if uid in records:
+                yield records.pop(uid)
+
+    def searchUids(self):
+        if self.cachedUids is not None:
+            return self.cachedUids
+        search = self.conduit.get_result(self.searchID)
+        return search.uids if search is not None else []
+
+    def getDeferredResults(self, fetchQuery, analyzer, batchSize):
+        if self.useHistory:
+            return self.getHistoryResults(fetchQuery, analyzer, batchSize)
+        uids = self.searchUids()
+        if not uids:
+            return None
+        records, missing = self.cachedRecords(uids)
+        if missing:
+            fetched = self.fetchConcurrently(
+                self.idBatches(missing, fetchQuery, batchSize), analyzer, Efetcher
+            )
+            self.storeRecords(analyzer, fetched)
+            records.update((record.pmid, record) for record in fetched)
+
+        found = [records[uid] for uid in uids if uid in records]
+        return self.assembleResult(fetchQuery, analyzer, found)
+
+    def cachedRecords(self, uids):
+        # Returns ({pmid: record} from the RecordCache, PMIDs still to fetch)
+        records = self.cache.get_many(uids) if self.cache is not None else {}
+        return records, [uid for uid in uids if uid not in records]
+
+    def storeRecords(self, analyzer, records):
+        # Emails-only records lack titles, dates and authors
+        if self.cache is not None and getattr(analyzer, "caches_records", False):
+            self.cache.put_many(records)
+
+    def assembleResult(self, fetchQuery, analyzer, records):
+        # The caller's analyzer assembles the result, so columnar still applies
+        request = SimpleNamespace(eutil="efetch", query_id=self.searchID, db=fetchQuery["db"])
+        analyzer.init_result(None, request)
+        for record in records:
+            analyzer.result.add_article_record(record)
+        return analyzer.get_result()
+
+    def getHistoryResults(self, fetchQuery, analyzer, batchSize=None):
+        # Pages efetch through retstart/retmax windows of the stored result
+        search = self.conduit.get_result(self.searchID)
+        if search is None or not search.count:
+            return None
+        history = search.get_link_parameter()
+        windows = self.historyWindows(
+            fetchQuery, history["WebEnv"], history["query_key"], search.count, batchSize
+        )
+        records = self.fetchConcurrently(windows, analyzer, WindowEfetcher)
+        self.storeRecords(analyzer, records)
+        return self.assembleResult(fetchQuery, analyzer, records)
+
+    def idBatches(self, uids, fetchQuery, batchSize=None, firstSize=None):
+        return [
+            dict(fetchQuery, id=uids[start:end])
+            for start, end in _bounds(len(uids), batchSize, firstSize)
+        ]
+
+    def historyWindows(self, fetchQuery, webEnv, queryKey, count, batchSize=None,
+                       firstSize=None):
+        total = min(count, self.historyRetmax)
+        return [
+            dict(fetchQuery, WebEnv=webEnv, query_key=queryKey,
+                 retstart=start, retmax=end - start)
+            for start, end in _bounds(total, batchSize, firstSize)
+        ]
+
+    def fetchConcurrently(self, queries, analyzer, fetcherClass):
+        # Records of all queries, in query order
+        return [
+            record
+            for records in self.iterFetched(queries, analyzer, fetcherClass)
+            for record in records
+        ]
+
+    def iterFetched(self, queries, analyzer, fetcherClass):
+        # Runs the efetch queries on FETCH_CONCURRENCY threads, within the NCBI
+        # rate limit, and yields each query's records in query order
+        if len(queries) == 1:
+            yield self.fetchBatch(queries[0], analyzer, fetcherClass)
+            return
+        executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY)
+        try:
+            futures = [
+                executor.submit(self.fetchBatch, query, analyzer, fetcherClass)
+                for query in queries
+            ]
+            for future in futures:
+                yield future.result()
+        finally:
+            # A consumer that stops early should not wait for the rest
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def fetchBatch(self, fetchQuery, analyzer, fetcherClass=Efetcher):
+        # A failed batch is retried on its own with a fresh analyzer. entrezpy
+        # does not say why a request failed (it already retried it), so every
+        # failure is retried, after a backoff.
+        for attempt in range(FETCH_RETRIES + 1):
+            if attempt:
+                time.sleep(_backoff(attempt))
+            batchAnalyzer = analyzer.spawn(_batch_size(fetchQuery))
+            self.rateLimiter.wait()
+            fetcher = fetcherClass(
+                self.conduit.tool, self.email or self.conduit.email, self.conduit.apikey
+            )
+            if fetcher.inquire(fetchQuery, batchAnalyzer) is not None:
+                result = batchAnalyzer.get_result()
+                return result.articles if result is not None else []
+        raise RuntimeError(f"efetch failed for {_batch_size(fetchQuery)} PMIDs "
+                           f"after {FETCH_RETRIES + 1} tries")
+
+    async def runClient(self):
+        # getResults for callers without an event loop; the pooled
+        # connections belong to this loop, so they are closed with it
+        try:
+            return await self.getResultsAsync()
+        finally:
+            await self.client.close()
+
+    async def getResultsAsync(self):
+        # Same results as getResults, with every request sent through the
+        # client. Batches are all in flight at once, bounded only by the
+        # client's connection pool and rate limit. The SQLite caches and the
+        # parsing block, so they run on threads and the loop stays free for
+        # the other searches sharing it.
+        import asyncio
+
+        search, uids = await self.searchAsync()
+        if not self.deferredFetch:
+            return SimpleNamespace(uids=uids)
+        fetchQuery, analyzer, batchSize = self.deferredFetch
+
+        if self.useHistory:
+            count = int(search.get("count", 0))
+            if not count:
+                return None
+            windows = self.historyWindows(
+                fetchQuery, search["webenv"], search["querykey"], count, batchSize
+            )
+            records = await self.fetchAsync(windows, analyzer)
+            await asyncio.to_thread(self.storeRecords, analyzer, records)
+            return self.assembleResult(fetchQuery, analyzer, records)
+
+        if not uids:
+            return None
+        records, missing = await asyncio.to_thread(self.cachedRecords, uids)
+        if missing:
+            batches = self.idBatches(missing, fetchQuery, batchSize)
+            fetched = await self.fetchAsync(batches, analyzer)
+            await asyncio.to_thread(self.storeRecords, analyzer, fetched)
+            records.update((record.pmid, record) for record in fetched)
+        found = [records[uid] for uid in uids if uid in records]
+        return self.assembleResult(fetchQuery, analyzer, found)
+
+    async def iterRecordsAsync(self):
+        # iterRecords for the client: yields lists of ArticleRecords in search
+        # order, each as soon as the efetch batch it waits for is parsed. As in
+        # getResultsAsync, every batch is in flight at once.
+        from contextlib import aclosing
+
+        search, uids = await self.searchAsync()
+        if not self.deferredFetch:
+            return
+        fetchQuery, analyzer, batchSize = self.deferredFetch
+        if self.useHistory:
+            count = int(search.get("count", 0))
+            if not count:
+                return
+            windows = self.historyWindows(
+                fetchQuery, search["webenv"], search["querykey"], count, batchSize,
+                STREAM_FIRST_BATCH,
+            )
+            batches = self.iterWindowsAsync(windows, analyzer)
+        else:
+            batches = self.iterIdBatchesAsync(uids, fetchQuery, analyzer, batchSize)
+        # Closing this generator closes the one fetching, which cancels its batches
+        async with aclosing(batches):
+            async for records in batches:
+                yield records
+
+    async def iterWindowsAsync(self, windows, analyzer):
+        import asyncio
+
+        tasks = [asyncio.ensure_future(self.fetchBatchAsync(w, analyzer)) for w in windows]
+        try:
+            for task in tasks:
+                records = await task
+                await asyncio.to_thread(self.storeRecords, analyzer, records)
+                yield records
+        finally:
+            # A consumer that stops early should not wait for the rest
+            for task in tasks:
+                task.cancel()
+
+    async def iterIdBatchesAsync(self, uids, fetchQuery, analyzer, batchSize=None):
+        import asyncio
+
+        if not uids:
+            return
+        records, missing = await asyncio.to_thread(self.cachedRecords, uids)
+        batches = self.idBatches(missing, fetchQuery, batchSize, STREAM_FIRST_BATCH)
+        tasks = [asyncio.ensure_future(self.fetchBatchAsync(b, analyzer)) for b in batches]
+        try:
+            fetched = zip(batches, tasks)
+            requested = set()
+            found = []
+            for uid in uids:
+                if uid not in records and uid not in requested:
+                    # What is ready goes out before waiting for the next batch
+                    if found:
+                        yield found
+                        found = []
+                    batch, task = next(fetched)
+                    requested.update(batch["id"])
+                    batchRecords = await task
+                    await asyncio.to_thread(self.storeRecords, analyzer, batchRecords)
+                    records.update((record.pmid, record) for record in batchRecords)
+                if uid in records:
+                    found.append(records.pop(uid))
+            if found:
+                yield found
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def searchAsync(self):
+        # Returns (esearch result or None when the SearchCache had it, PMIDs)
+        import asyncio
+
+        if self.cachedUids is not None:
+            return None, self.cachedUids
+        search = await self.client.esearch(self.clientQuery(self.clientSearch))
+        if self.searchQuery is not None:
+            await asyncio.to_thread(
+                self.searchCache.put, self.searchQuery, search.get("idlist", [])
+            )
+        return search, search.get("idlist", [])
+
+    def clientQuery(self, query):
+        # A shared client sends each search with its own user's email
+        return dict(query, email=self.email) if self.email else query
+
+    async def fetchAsync(self, queries, analyzer):
+        import asyncio
+
+        results = await asyncio.gather(
+            *(self.fetchBatchAsync(query, analyzer) for query in queries)
+        )
+        return [record for records in results for record in records]
+
+    async def fetchBatchAsync(self, fetchQuery, analyzer):
+        # Like fetchBatch: a failed batch is retried with a fresh analyzer
+        import asyncio
+        from eutils import EutilsError
+
+        param = EfetchParameter(fetchQuery)
+        request = EfetchRequest("efetch", param, param.retstart, param.retmax)
+        for attempt in range(FETCH_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(_backoff(attempt))
+            try:
+                body = await self.client.efetch(self.clientQuery(fetchQuery))
+            except (OSError, asyncio.IncompleteReadError, EutilsError) as error:
+                if not _transient(error):
+                    raise
+                continue
+            batchAnalyzer = analyzer.spawn(_batch_size(fetchQuery))
+            await asyncio.to_thread(batchAnalyzer.parse, io.BytesIO(body), request)
+            result = batchAnalyzer.get_result()
+            return result.articles if result is not None else []
+        raise RuntimeError(f"efetch failed for {_batch_size(fetchQuery)} PMIDs "
+                           f"after {FETCH_RETRIES + 1} tries")
+
+
+def _backoff(attempt):
+    # Exponential, with full jitter so that batches failing together (after a
+    # 429, say) do not all come back at once
+    return random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF * 2 ** (attempt - 1)))
+
+
+def _transient(error):
+    # Connection errors, timeouts, 429 and 5xx may pass on a retry; any other
+    # HTTP status (a malformed query, say) fails the same way again
+    status = getattr(error, "status", None)
+    return status is None or status == 429 or status >= 500
+
+
+def _bounds(total, batchSize=None, firstSize=None):
+    # (start, end) of each batch; the first may be smaller than the rest
+    batchSize = batchSize or FETCH_BATCH_SIZE
+    start, size = 0, min(firstSize or batchSize, batchSize)
+    while start < total:
+        yield start, min(start + size, total)
+        start, size = start + size, batchSize
+
+
+def _batch_size(fetchQuery):
+    return len(fetchQuery["id"]) if "id" in fetchQuery else fetchQuery["retmax"]
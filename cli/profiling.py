@@ -0,0 +1,57 @@
+import time
+from contextlib import contextmanager
+
+# Stage timings and a cProfile report for one CLI run (--profile PATH).
+# cProfile and pstats are only imported when a run is actually profiled.
+
+REPORT_LIMIT = 40
+
+
+class StageTimer:
+    # Wall time of consecutive stages; mark(name) ends the current one
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.stages.append((name, now - self.last))
+        self.last = now
+
+    def total(self):
+        return self.last - self.start
+
+
+class NullTimer:
+    # Stands in for StageTimer when the run is not profiled
+    def mark(self, name):
+        pass
+
+
+@contextmanager
+def profiled(path, limit=REPORT_LIMIT):
+    # Profiles the block and writes the stage timings and the functions with
+    # the highest cumulative time to path
+    import cProfile
+    import pstats
+
+    timer = StageTimer()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield timer
+    finally:
+        profiler.disable()
+        with open(path, "w", encoding="utf-8") as report:
+            write_stages(timer, report)
+            report.write("\n")
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats("cumulative").print_stats(limit)
+
+
+def write_stages(timer, out):
+    width = max([len(name) for name, _ in timer.stages] + [len("total")])
+    out.write("Stage timings (seconds)\n")
+    for name, seconds in timer.stages:
+        out.write(f"  {name:<{width}}  {seconds:.4f}\n")
+    out.write(f"  {'total':<{width}}  {timer.total():.4f}\n")
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+from functools import partial
+from cache import CACHE_DIR, SqliteCache, open_or_none
+
+# NCBI allows 3 E-utilities requests per second, or 10 with an API key
+NCBI_RATE = 3
+NCBI_RATE_WITH_KEY = 10
+
+DEFAULT_RATE_LIMIT_PATH = os.path.join(CACHE_DIR, "ratelimit.sqlite3")
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def ncbi_rate(apikey=None):
+    return NCBI_RATE_WITH_KEY if apikey or os.environ.get("NCBI_API_KEY") else NCBI_RATE
+
+
+def get_rate_limiter(path=None, apikey=None):
+    # One SharedRateLimiter per path and API key in this process; all
+    # processes using the same file share its budget. Without a usable file
+    # the budget is only shared within this process.
+    apikey = apikey or os.environ.get("NCBI_API_KEY")
+    path = path or DEFAULT_RATE_LIMIT_PATH
+    with _shared_lock:
+        limiter = _shared.get((path, apikey))
+        if limiter is None:
+            limiter = open_or_none(partial(SharedRateLimiter, apikey=apikey), path)
+            if limiter is None:
+                limiter = RateLimiter(apikey=apikey)
+            _shared[(path, apikey)] = limiter
+        return limiter
+
+
+class RateLimiter:
+    # Spaces request starts at least 1/rate seconds apart across all threads
+    def __init__(self, rate=None, apikey=None):
+        self.interval = 1 / (rate or ncbi_rate(apikey))
+        self.next_start = 0.0
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "waited": 0.0, "max_wait": 0.0}
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def reserve(self):
+        # Claims the next start slot; returns how many seconds to wait for it,
+        # so asyncio callers can sleep without blocking their event loop
+        delay = max(self.claim(), 0.0)
+        with self.lock:
+            self.counters["requests"] += 1
+            self.counters["waited"] += delay
+            self.counters["max_wait"] = max(self.counters["max_wait"], delay)
+        return delay
+
+    def claim(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        return start - now
+
+    def stats(self):
+        # Requests let through and the time they spent queued, in seconds
+        with self.lock:
+            return dict(self.counters)
+
+
+class SharedRateLimiter(RateLimiter):
+    # Token bucket kept in SQLite, so every process using the same file (all
+    # gunicorn workers, CLI runs) shares one NCBI budget. Tokens refill at the
+    # rate up to burst; a request that finds none takes the bucket into debt
+    # and waits until its token would have arrived.
+    def __init__(self, path=None, rate=None, apikey=None, burst=1):
+        super().__init__(rate, apikey)
+        self.rate = 1 / self.interval
+        self.burst = burst
+        self.store = BucketStore(path or DEFAULT_RATE_LIMIT_PATH)
+        # NCBI counts requests per API key, or per client address without one
+        self.bucket = hashlib.sha256(apikey.encode()).hexdigest()[:16] if apikey else "anonymous"
+
+    def claim(self):
+        return self.store.take(self.bucket, self.rate, self.burst)
+
+
+class BucketStore(SqliteCache):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS buckets ("
+        "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)",
+    )
+
+    def take(self, name, rate, burst):
+        # Takes one token and returns the seconds until it is due. BEGIN
+        # IMMEDIATE holds the write lock from the read to the update.
+        with self.connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = db.execute(
+                "SELECT tokens, updated FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(now - updated, 0.0) * rate) - 1
+            db.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens, now)
+            )
+        return -tokens / rate if tokens < 0 else 0.0
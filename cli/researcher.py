@@ -1,13 +1,25 @@
 #Update affiliation in methods
+import sys
+
+
+def intern_text(value):
+    # Languages, dates and initials take few distinct values across thousands
+    # of records, so equal strings share one object. Affiliations are not
+    # interned: interned strings can outlive the records (they are immortal
+    # on CPython 3.12+), and a daemon or web worker parses without end.
+    return sys.intern(value) if type(value) is str else value
+
 
 class Researcher():
+    __slots__ = ("firstName", "lastName", "initials", "affiliation", "email")
+
     def __init__(self, lastName="", firstName="", initials="", affiliation="", email=""):
         self.firstName = firstName
         self.lastName = lastName
-        self.initials = initials
+        self.initials = intern_text(initials)
         self.affiliation = affiliation
         self.email = email
 
     def __repr__(self):
-        kvps = [f"{k}={v}" for k, v in vars(self).items()]
+        kvps = [f"{k}={getattr(self, k)}" for k in self.__slots__]
         return f"{type(self).__name__}({', '.join(kvps)})"
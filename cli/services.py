@@ -1,27 +1,277 @@
-from analyzer import ArticleAnalyzer
-from format import emailFormat, overviewFormat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from entrezpy.conduit import Conduit
+from analyzer import ArticleAnalyzer, EmailAnalyzer
+from format import articleChunks, batchChunks, emailChunks, emailFormat, overviewFormat
 from pipeline import Pipeline
+from cache import get_record_cache, get_search_cache
+from ratelimit import get_rate_limiter
 
-def getSummary(search, sortBy, email, retmax):
-    pipeline = Pipeline(email)
+NO_ARTICLES = "No articles found for your search."
+NO_EMAILS = "No articles found — no emails to display."
+# Concurrent esearches in batch mode; the shared rate limit still applies
+BATCH_JOBS = 4
+
+
+def getSummary(search, sortBy, email, retmax, workers=None):
+    pipeline = Pipeline(email, cache=get_record_cache(), searchCache=get_search_cache())
     pipeline.addSearch(search, retmax=retmax, sortBy=sortBy)
-    analyzer = ArticleAnalyzer()
+    analyzer = ArticleAnalyzer(streaming=True, workers=workers)
     pipeline.addFetch(analyzer=analyzer)
-    results = pipeline.getResults()
-    if not results or not results.articles:
-        return "No articles found for your search."
-    return overviewFormat(results.articles)
+    return summaryText(pipeline.getResults())
 
 
 def getEmails(search, sortBy, email, retmax):
-    pipeline = Pipeline(email)
+    pipeline = Pipeline(email, cache=get_record_cache(), searchCache=get_search_cache())
+    pipeline.addSearch(search, retmax=retmax, sortBy=sortBy)
+    analyzer = EmailAnalyzer(streaming=True)
+    pipeline.addFetch(analyzer=analyzer)
+    return emailsText(pipeline.getResults())
+
+
+def iterArticles(search, sortBy, email, retmax, analyzer, session=None):
+    # The parsed ArticleRecords in search order, as each efetch batch arrives
+    pipeline = newPipeline(email, session)
     pipeline.addSearch(search, retmax=retmax, sortBy=sortBy)
-    analyzer = ArticleAnalyzer()
     pipeline.addFetch(analyzer=analyzer)
-    results = pipeline.getResults()
+    return iterPipeline(pipeline, session)
+
+
+def newPipeline(email, session=None):
+    # With a SearchSession (the daemon's), the search shares its warm caches
+    # and keep-alive connections
+    if session is not None:
+        return session.pipeline(email)
+    return Pipeline(email, cache=get_record_cache(), searchCache=get_search_cache())
+
+
+def iterPipeline(pipeline, session=None):
+    return session.iterRecords(pipeline) if session is not None else pipeline.iterRecords()
+
+
+def iterSummary(search, sortBy, email, retmax, workers=None, outputFormat="markdown",
+                session=None):
+    # getSummary, one formatted article at a time as soon as it is parsed
+    analyzer = ArticleAnalyzer(streaming=True, workers=workers)
+    articles = iterArticles(search, sortBy, email, retmax, analyzer, session)
+    first = next(articles, None)
+    if first is None and outputFormat == "markdown":
+        yield NO_ARTICLES
+        return
+    found = [] if first is None else [first]
+    yield from articleChunks(chain(found, articles), outputFormat)
+
+
+def iterEmails(search, sortBy, email, retmax, outputFormat="markdown", session=None):
+    # getEmails, yielding each new email as soon as its article is parsed
+    analyzer = EmailAnalyzer(streaming=True)
+    articles = iterArticles(search, sortBy, email, retmax, analyzer, session)
+    first = next(articles, None)
+    if first is None and outputFormat == "markdown":
+        yield NO_EMAILS
+        return
+    found = [] if first is None else [first]
+    yield from emailChunks(distinctEmails(chain(found, articles)), outputFormat)
+
+
+def iterRequest(request, session=None):
+    # Output chunks for one CLI request (main.buildRequest), run here or in
+    # the daemon, which passes its SearchSession
+    search = (request["sortby"], request["email"], request["searchnumber"])
+    outputFormat = request.get("format", "markdown")
+    if request.get("terms"):
+        return iterBatch(
+            request["terms"], *search, mode=request["mode"], jobs=request.get("jobs"),
+            workers=request.get("workers"), outputFormat=outputFormat, session=session,
+        )
+    if request["mode"] == "overview":
+        return iterSummary(
+            request["searchterm"], *search,
+            workers=request.get("workers"), outputFormat=outputFormat, session=session,
+        )
+    return iterEmails(request["searchterm"], *search, outputFormat=outputFormat, session=session)
+
+
+def iterBatch(terms, sortBy, email, retmax, mode="overview", jobs=None, workers=None,
+              outputFormat="markdown", session=None):
+    # Runs the esearch of every term concurrently, then fetches and parses
+    # each PMID of their union once. Output is still grouped by term.
+    terms = list(terms)
+    with ThreadPoolExecutor(max_workers=BATCH_JOBS if jobs is None else jobs) as executor:
+        uidLists = list(executor.map(
+            lambda term: searchUids(term, sortBy, email, retmax, session), terms
+        ))
+    uids = list(dict.fromkeys(uid for uidList in uidLists for uid in uidList))
+
+    if mode == "overview":
+        analyzer, empty = ArticleAnalyzer(streaming=True, workers=workers), NO_ARTICLES
+    else:
+        analyzer, empty = EmailAnalyzer(streaming=True), NO_EMAILS
+    records = {}
+    if uids:
+        pipeline = newPipeline(email, session)
+        pipeline.addIds(uids)
+        pipeline.addFetch(analyzer=analyzer)
+        records = {record.pmid: record for record in iterPipeline(pipeline, session)}
+
+    results = []
+    for term, uidList in zip(terms, uidLists):
+        articles = [records[uid] for uid in uidList if uid in records]
+        results.append((term, articles if mode == "overview" else distinctEmails(articles)))
+    yield from batchChunks(results, outputFormat, emails=mode != "overview", empty=empty)
+
+
+def searchUids(term, sortBy, email, retmax, session=None):
+    # esearch only; batch mode needs the PMIDs themselves, so no History server
+    if session is not None:
+        pipeline = session.pipeline(email)
+    else:
+        pipeline = Pipeline(email, searchCache=get_search_cache())
+    pipeline.addSearch(term, retmax=retmax, sortBy=sortBy, useHistory=False)
+    result = session.results(pipeline) if session is not None else pipeline.getResults()
+    return list(result.uids) if result is not None else []
+
+
+def distinctEmails(articles):
+    seen = set()
+    for article in articles:
+        for email in article.emails - seen:
+            seen.add(email)
+            yield email
+
+
+def summaryText(results):
     if not results or not results.articles:
-        return "No articles found — no emails to display."
+        return NO_ARTICLES
+    return overviewFormat(results.articles)
+
+
+def emailsText(results):
+    if not results or not results.articles:
+        return NO_EMAILS
     emails = set()
     for article in results.articles:
         emails.update(article.emails)
     return emailFormat(emails)
+
+
+class SearchSession:
+    # Long-lived state for many searches: one Conduit, the caches, the shared
+    # rate limiter and an AsyncEutils client whose keep-alive connections stay
+    # open between searches. The client runs on the session's own event loop
+    # thread, so any number of threads can call summary/emails at once.
+    def __init__(self, email="", cache=None, searchCache=None, rateLimiter=None, url=None):
+        # asyncio and the client are only loaded by the web app, not the CLI
+        import asyncio
+        from eutils import EUTILS_URL, AsyncEutils
+
+        # RecordCache defines __len__, so an empty one is falsy
+        self.cache = get_record_cache() if cache is None else cache
+        self.searchCache = get_search_cache() if searchCache is None else searchCache
+        self.rateLimiter = rateLimiter or get_rate_limiter()
+        self.conduit = Conduit(email)
+        self.client = AsyncEutils(email, url=url or EUTILS_URL, rateLimiter=self.rateLimiter)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def search(self, term, sortBy, retmax, analyzer, email=""):
+        return self.submit(term, sortBy, retmax, analyzer, email).result()
+
+    async def searchAsync(self, term, sortBy, retmax, analyzer, email=""):
+        # For callers on another event loop (the ASGI view): the search runs on
+        # the session's loop and this one is free until the result is ready
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(term, sortBy, retmax, analyzer, email))
+
+    def submit(self, term, sortBy, retmax, analyzer, email=""):
+        # Starts the search on the session's loop and returns its future
+        import asyncio
+
+        coroutine = self.runSearch(term, sortBy, retmax, analyzer, email)
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    async def runSearch(self, term, sortBy, retmax, analyzer, email):
+        import asyncio
+
+        pipeline = self.pipeline(email)
+        # addSearch looks the query up in the SearchCache (SQLite), which
+        # must not hold up the loop or the caller's
+        await asyncio.to_thread(pipeline.addSearch, term, retmax=retmax, sortBy=sortBy)
+        pipeline.addFetch(analyzer=analyzer)
+        return await pipeline.getResultsAsync()
+
+    def pipeline(self, email=""):
+        # A Pipeline on the session's caches and client; run it with results
+        # or iterRecords, since getResults would close the shared client
+        return Pipeline(
+            email, cache=self.cache, searchCache=self.searchCache,
+            rateLimiter=self.rateLimiter, client=self.client, conduit=self.conduit,
+        )
+
+    def results(self, pipeline):
+        # pipeline.getResults, run on the session's loop
+        import asyncio
+
+        return asyncio.run_coroutine_threadsafe(pipeline.getResultsAsync(), self.loop).result()
+
+    def iterRecords(self, pipeline):
+        # pipeline.iterRecords, with the fetches on the session's loop and the
+        # records yielded on the calling thread as each batch is parsed
+        import asyncio
+
+        batches = pipeline.iterRecordsAsync()
+        try:
+            while True:
+                step = asyncio.run_coroutine_threadsafe(nextBatch(batches), self.loop)
+                records = step.result()
+                if records is None:
+                    return
+                yield from records
+        finally:
+            # Stopping early cancels the batches still being fetched
+            asyncio.run_coroutine_threadsafe(batches.aclose(), self.loop).result()
+
+    def summary(self, term, sortBy, retmax, email="", workers=None):
+        analyzer = ArticleAnalyzer(streaming=True, workers=workers)
+        return summaryText(self.search(term, sortBy, retmax, analyzer, email))
+
+    def emails(self, term, sortBy, retmax, email=""):
+        return emailsText(self.search(term, sortBy, retmax, EmailAnalyzer(streaming=True), email))
+
+    async def summaryAsync(self, term, sortBy, retmax, email="", workers=None):
+        analyzer = ArticleAnalyzer(streaming=True, workers=workers)
+        return summaryText(await self.searchAsync(term, sortBy, retmax, analyzer, email))
+
+    async def emailsAsync(self, term, sortBy, retmax, email=""):
+        analyzer = EmailAnalyzer(streaming=True)
+        return emailsText(await self.searchAsync(term, sortBy, retmax, analyzer, email))
+
+    def close(self):
+        import asyncio
+
+        asyncio.run_coroutine_threadsafe(self.client.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+async def nextBatch(batches):
+    # anext() is not a coroutine on every Python version, so it cannot be
+    # handed to run_coroutine_threadsafe directly
+    return await anext(batches, None)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    # Created on first use, so each gunicorn worker gets its own after the fork
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = SearchSession()
+        return _session
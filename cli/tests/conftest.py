@@ -0,0 +1,195 @@
+import os
+
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+    # Timing assertions flake on shared CI runners, so benchmarks only run on
+    # request: SCHOLARSEEK_BENCHMARK=1 pytest -m benchmark
+    if os.environ.get("SCHOLARSEEK_BENCHMARK") == "1":
+        return
+    skip = pytest.mark.skip(reason="benchmark; set SCHOLARSEEK_BENCHMARK=1 to run")
+    for item in items:
+        if item.get_closest_marker("benchmark"):
+            item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def rate_limit_file(tmp_path, monkeypatch):
+    """Keeps each test's shared NCBI rate limiter in its own file."""
+    monkeypatch.setattr("ratelimit.DEFAULT_RATE_LIMIT_PATH", str(tmp_path / "ratelimit.sqlite3"))
+
+
+@pytest.fixture(autouse=True)
+def no_fetch_backoff(monkeypatch):
+    """Retries failed efetch batches without sleeping first."""
+    monkeypatch.setattr("pipeline.FETCH_BACKOFF", 0)
+
+
+def _author(article_id, index):
+    affiliation = f"Department {index}, University of Somewhere, City, Country."
+    if index % 3 == 0:
+        affiliation += f" author{index}.{article_id}@uni.edu"
+    return (
+        '<Author ValidYN="Y">'
+        f"<LastName>Last{index}</LastName>"
+        f"<ForeName>First{index}</ForeName>"
+        "<Initials>F</Initials>"
+        f"<AffiliationInfo><Affiliation>{affiliation}</Affiliation></AffiliationInfo>"
+        "</Author>"
+    )
+
+
+def _pub_date(article_id):
+    if article_id % 5 == 0:
+        return "<PubDate><MedlineDate>1998 Dec-1999 Jan</MedlineDate></PubDate>"
+    if article_id % 2:
+        return "<PubDate><Year>2023</Year><Month>Jan</Month><Day>02</Day></PubDate>"
+    return "<PubDate><Year>2021</Year><Month>11</Month></PubDate>"
+
+
+def make_article(article_id, authors=8):
+    """Builds one realistic PubmedArticle, including the bulky parts we skip."""
+    author_list = "".join(_author(article_id, i) for i in range(authors))
+    mesh = "".join(
+        f'<MeshHeading><DescriptorName UI="D{k}">Term {k}</DescriptorName></MeshHeading>'
+        for k in range(12)
+    )
+    references = "".join(
+        f"<Reference><Citation>Ref {k} et al. Journal 2020;{k}:1-10.</Citation>"
+        f'<ArticleIdList><ArticleId IdType="pubmed">{k}</ArticleId></ArticleIdList></Reference>'
+        for k in range(30)
+    )
+    return (
+        '<PubmedArticle><MedlineCitation Status="MEDLINE" Owner="NLM">'
+        f'<PMID Version="1">{article_id}</PMID>'
+        "<DateCompleted><Year>2020</Year><Month>01</Month><Day>01</Day></DateCompleted>"
+        '<Article PubModel="Print"><Journal><ISSN>1234-5678</ISSN>'
+        f'<JournalIssue CitedMedium="Internet"><Volume>1</Volume>{_pub_date(article_id)}'
+        "</JournalIssue><Title>Journal of Things</Title></Journal>"
+        f"<ArticleTitle>Title {article_id}</ArticleTitle>"
+        f"<Abstract><AbstractText>{'Lorem ipsum dolor sit amet. ' * 40}</AbstractText></Abstract>"
+        f'<AuthorList CompleteYN="Y">{author_list}</AuthorList>'
+        "<Language>eng</Language></Article>"
+        f"<MeshHeadingList>{mesh}</MeshHeadingList></MedlineCitation>"
+        f"<PubmedData><ReferenceList>{references}</ReferenceList></PubmedData>"
+        "</PubmedArticle>"
+    )
+
+
+@pytest.fixture
+def pubmed_payload():
+    """Factory for efetch-like PubmedArticleSet payloads of a given size."""
+    def build(count, authors=8):
+        articles = "".join(make_article(i + 1, authors) for i in range(count))
+        return f'<?xml version="1.0" ?><PubmedArticleSet>{articles}</PubmedArticleSet>'.encode()
+    return build
+
+
+class EutilsStub:
+    """Local E-utilities server: records requests and serves stub payloads."""
+
+    def __init__(self):
+        import threading
+
+        self.requests = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures = {}
+        self.failure_status = 500
+        self.delay = 0
+        self.gzip = True
+        self.chunked = False
+        self.drop_after_response = False
+        self.lock = threading.Lock()
+        self.uids = [str(i) for i in range(1, 11)]
+
+    def respond(self, eutil, params):
+        # Returns (status, body) for one request
+        import json
+
+        if self.failures.get(eutil):
+            self.failures[eutil] -= 1
+            return self.failure_status, b"busy"
+        if eutil == "esearch":
+            if params.get("usehistory") == "y" and params.get("retmax") == "0":
+                result = {"count": str(len(self.uids)), "retmax": "0", "idlist": [],
+                          "webenv": "NCID_stub", "querykey": "1"}
+            else:
+                retmax = int(params.get("retmax", 20))
+                result = {"count": str(len(self.uids)), "idlist": self.uids[:retmax]}
+            return 200, json.dumps({"esearchresult": result}).encode()
+        if eutil == "efetch":
+            if "id" in params:
+                ids = params["id"].split(",")
+            else:
+                start = int(params["retstart"])
+                ids = self.uids[start:start + int(params["retmax"])]
+            articles = "".join(make_article(int(pmid), authors=2) for pmid in ids)
+            return 200, f"<PubmedArticleSet>{articles}</PubmedArticleSet>".encode()
+        return 200, json.dumps({"result": {"uids": params.get("id", "").split(",")}}).encode()
+
+
+@pytest.fixture
+def eutils_stub():
+    """Starts an EutilsStub on localhost; yields (stub, base url)."""
+    import gzip
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qsl
+
+    stub = EutilsStub()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stub.lock:
+                stub.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            params = dict(parse_qsl(body.decode()))
+            eutil = self.path.rsplit("/", 1)[-1].split(".")[0]
+            with stub.lock:
+                stub.requests.append((eutil, params, dict(self.headers)))
+                stub.in_flight += 1
+                stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+            time.sleep(stub.delay)
+            status, payload = stub.respond(eutil, params)
+            with stub.lock:
+                stub.in_flight -= 1
+            self.send_response(status)
+            if stub.gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip.compress(payload)
+                self.send_header("Content-Encoding", "gzip")
+            if stub.chunked:
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for start in range(0, len(payload), 1000):
+                    piece = payload[start:start + 1000]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(piece), piece))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            if stub.drop_after_response:
+                self.close_connection = True
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 64
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield stub, f"http://127.0.0.1:{server.server_address[1]}/entrez/eutils/"
+    server.shutdown()
+    server.server_close()
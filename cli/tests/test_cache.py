@@ -0,0 +1,313 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from analyzer import ArticleAnalyzer, EmailAnalyzer
+from article import ArticleRecord
+from cache import (
+    RecordCache,
+    SearchCache,
+    canonical_term,
+    deserialize_record,
+    get_record_cache,
+    get_search_cache,
+    search_key,
+    serialize_record,
+)
+from pipeline import Pipeline
+from researcher import Researcher
+
+
+def _record(pmid, email="a@x.org"):
+    people = [Researcher("Doe", "Jane", "J", f"Lab, {email}", email), Researcher("Roe")]
+    return ArticleRecord(f"Title {pmid}", "eng", "2023-Jan-02", {email}, people, pmid)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return RecordCache(str(tmp_path / "records.sqlite3"))
+
+
+class TestRecordCache:
+    """Test the PMID-keyed SQLite record cache."""
+
+    def test_serialize_round_trip(self):
+        """Test a record survives serialization unchanged."""
+        record = _record("1")
+        assert repr(deserialize_record("1", serialize_record(record))) == repr(record)
+
+    def test_get_many_returns_fresh_hits(self, cache):
+        """Test stored records are returned and unknown PMIDs are skipped."""
+        cache.put_many([_record("1"), _record("2")])
+        found = cache.get_many(["1", "2", "3"])
+        assert sorted(found) == ["1", "2"]
+        assert repr(found["1"]) == repr(_record("1"))
+
+    def test_stale_entries_are_misses(self, tmp_path):
+        """Test entries older than the TTL are not returned."""
+        cache = RecordCache(str(tmp_path / "records.sqlite3"), ttl=60)
+        with patch("cache.time.time", return_value=time.time() - 120):
+            cache.put_many([_record("1")])
+        cache.put_many([_record("2")])
+        assert sorted(cache.get_many(["1", "2"])) == ["2"]
+
+    def test_lru_eviction(self, tmp_path):
+        """Test the least recently used entries go once the cache is full."""
+        cache = RecordCache(str(tmp_path / "records.sqlite3"), max_entries=2)
+        now = time.time()
+        with patch("cache.time.time", return_value=now - 30):
+            cache.put_many([_record("1"), _record("2")])
+        with patch("cache.time.time", return_value=now - 20):
+            cache.get_many(["1"])
+        cache.put_many([_record("3")])
+        assert len(cache) == 2
+        assert sorted(cache.get_many(["1", "2", "3"])) == ["1", "3"]
+
+    def test_many_pmids(self, cache):
+        """Test lookups larger than SQLite's placeholder limit."""
+        cache.put_many([_record(str(i)) for i in range(1200)])
+        assert len(cache.get_many([str(i) for i in range(1500)])) == 1200
+
+    def test_shared_instance(self, tmp_path):
+        """Test one cache instance is shared per path."""
+        path = str(tmp_path / "shared.sqlite3")
+        assert get_record_cache(path) is get_record_cache(path)
+
+    def test_unwritable_path_disables_caching(self, tmp_path):
+        """Test a cache directory that cannot be created means no cache, not an error."""
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        path = str(blocker / "records.sqlite3")
+        with pytest.warns(RuntimeWarning, match="not caching"):
+            assert get_record_cache(path) is None
+            assert get_search_cache(path) is None
+
+
+def _search(term, sort="relevance", retmax=10):
+    return {"db": "pubmed", "term": term, "retmax": retmax, "rettype": "uilist", "sort": sort}
+
+
+class TestSearchCache:
+    """Test the esearch result-list cache."""
+
+    @pytest.fixture
+    def searches(self, tmp_path):
+        return SearchCache(str(tmp_path / "records.sqlite3"), ttl=60, stale_ttl=60)
+
+    @pytest.mark.parametrize("term,expected", [
+        ("Cancer  AND   therapy", "cancer AND therapy"),
+        ("cancer and Therapy", "cancer and therapy"),
+        ('( Diabetes [MeSH Terms] OR "Heart  Failure")', '(diabetes[mesh terms] OR "heart failure")'),
+    ])
+    def test_canonical_term(self, term, expected):
+        """Test case, spacing and field-tag spacing are normalized."""
+        assert canonical_term(term) == expected
+
+    @pytest.mark.parametrize("term,other", [('"x', "x"), ("x [mesh", "x mesh"), ('x"', "x")])
+    def test_stray_quote_or_bracket_changes_the_key(self, term, other):
+        """Test an unmatched quote or bracket is not dropped from the term."""
+        assert canonical_term(term) != canonical_term(other)
+        assert search_key(_search(term)) != search_key(_search(other))
+
+    def test_equivalent_queries_share_an_entry(self, searches):
+        """Test canonically equal queries hit the same entry."""
+        searches.put(_search("Cancer AND therapy"), ["1", "2"])
+        assert searches.get(_search("cancer  AND Therapy")) == (["1", "2"], False)
+        assert searches.get(_search("cancer and therapy")) == (None, False)
+        assert searches.get(_search("cancer AND therapy", sort="pub_date")) == (None, False)
+        assert searches.get(_search("cancer AND therapy", retmax=20)) == (None, False)
+        assert searches.stats() == {"hits": 1, "stale_hits": 0, "misses": 3}
+
+    def test_stale_and_expired(self, searches):
+        """Test entries are stale after the TTL and gone after the stale window."""
+        now = time.time()
+        with patch("cache.time.time", return_value=now - 90):
+            searches.put(_search("stale"), ["1"])
+        with patch("cache.time.time", return_value=now - 150):
+            searches.put(_search("expired"), ["2"])
+        assert searches.get(_search("stale")) == (["1"], True)
+        assert searches.get(_search("expired")) == (None, False)
+        assert searches.stats() == {"hits": 0, "stale_hits": 1, "misses": 1}
+
+    def test_revalidate_refreshes_once(self, searches):
+        """Test a stale entry is refreshed in the background, once per key."""
+        import threading
+
+        release = threading.Event()
+
+        def search(query):
+            release.wait(5)
+            return ["9"]
+
+        thread = searches.revalidate(_search("cancer"), search)
+        assert searches.revalidate(_search("Cancer"), search) is None
+        release.set()
+        thread.join(5)
+        assert searches.get(_search("cancer")) == (["9"], False)
+
+    def test_shared_instance(self, tmp_path):
+        """Test record and search caches are shared separately per path."""
+        path = str(tmp_path / "shared.sqlite3")
+        assert get_search_cache(path) is get_search_cache(path)
+        assert get_search_cache(path) is not get_record_cache(path)
+
+
+class TestCachedPipeline:
+    """Test the pipeline only fetches PMIDs missing from the cache."""
+
+    @pytest.fixture
+    def conduit(self):
+        with patch("pipeline.Conduit") as mock_conduit:
+            conduit = mock_conduit.return_value
+
+            def new_pipeline():
+                pipeline = MagicMock()
+                pipeline.add_search.return_value = "search"
+                pipeline.add_fetch.return_value = "fetch"
+                return pipeline
+
+            conduit.new_pipeline.side_effect = new_pipeline
+            yield conduit
+
+    def _run(self, conduit, cache, uids, fetched, analyzer):
+        # Returns the result and the PMID batches that were efetched
+        conduit.get_result.side_effect = {"search": MagicMock(uids=uids)}.get
+        batches = []
+
+        def inquire(parameter, batch_analyzer):
+            batches.append(parameter["id"])
+            batch_analyzer.init_result(None, MagicMock())
+            for record in fetched:
+                if record.pmid in parameter["id"]:
+                    batch_analyzer.result.add_article_record(record)
+            return batch_analyzer
+
+        with patch("pipeline.Efetcher") as efetcher:
+            efetcher.return_value.inquire.side_effect = inquire
+            pipeline = Pipeline("test@example.com", cache=cache)
+            pipeline.addSearch("cancer", "relevance", 10)
+            pipeline.addFetch(analyzer=analyzer)
+            return pipeline.getResults(), batches
+
+    def test_fetches_only_missing(self, conduit, cache):
+        """Test cached PMIDs are not fetched again and order follows esearch."""
+        cache.put_many([_record("2")])
+        analyzer = ArticleAnalyzer()
+        result, batches = self._run(conduit, cache, ["1", "2", "3"], [_record("3"), _record("1")], analyzer)
+
+        assert batches == [["1", "3"]]
+        assert [a.pmid for a in result.articles] == ["1", "2", "3"]
+        assert sorted(cache.get_many(["1", "2", "3"])) == ["1", "2", "3"]
+
+    def test_fully_cached_skips_efetch(self, conduit, cache):
+        """Test a repeated query is served without any efetch."""
+        cache.put_many([_record("1"), _record("2")])
+        result, batches = self._run(conduit, cache, ["2", "1"], [], ArticleAnalyzer())
+        assert batches == []
+        assert [a.pmid for a in result.articles] == ["2", "1"]
+
+    def test_email_records_are_not_cached(self, conduit, cache):
+        """Test emails-only records are used but never stored."""
+        partial = ArticleRecord(None, None, None, {"a@x.org"}, [], "1")
+        result, _ = self._run(conduit, cache, ["1"], [partial], EmailAnalyzer())
+        assert result.articles == [partial]
+        assert len(cache) == 0
+
+    def test_columnar_results(self, conduit, cache):
+        """Test cached and fetched records are merged into columns."""
+        cache.put_many([_record("2")])
+        result, _ = self._run(conduit, cache, ["1", "2"], [_record("1")], ArticleAnalyzer(columnar=True))
+        assert list(result.columns.pmid.values) == [1, 2]
+
+    def test_empty_search(self, conduit, cache):
+        """Test an empty esearch gives no result, as without a cache."""
+        result, batches = self._run(conduit, cache, [], [], ArticleAnalyzer())
+        assert result is None
+        assert batches == []
+
+    def test_add_ids_skips_esearch(self, conduit, cache):
+        """Test PMIDs from addIds are fetched without an esearch."""
+        cache.put_many([_record("2")])
+        conduit.get_result.side_effect = AssertionError("no esearch expected")
+        fetched = []
+
+        def inquire(parameter, batch_analyzer):
+            fetched.append(parameter["id"])
+            batch_analyzer.init_result(None, MagicMock())
+            batch_analyzer.result.add_article_record(_record("1"))
+            return batch_analyzer
+
+        with patch("pipeline.Efetcher") as efetcher:
+            efetcher.return_value.inquire.side_effect = inquire
+            pipeline = Pipeline("test@example.com", cache=cache)
+            pipeline.addIds(["1", "2"])
+            pipeline.addFetch(analyzer=ArticleAnalyzer())
+            records = list(pipeline.iterRecords())
+
+        conduit.run.assert_not_called()
+        assert fetched == [["1"]]
+        assert [r.pmid for r in records] == ["1", "2"]
+
+    def test_search_cache_skips_esearch(self, conduit, tmp_path):
+        """Test a cached esearch is not sent and its PMIDs are fetched by id."""
+        searches = SearchCache(str(tmp_path / "records.sqlite3"))
+        searches.put(_search("cancer"), ["4", "5"])
+        conduit.get_result.side_effect = {"fetch": "fetched"}.get
+
+        pipeline = Pipeline("test@example.com", searchCache=searches)
+        pipeline.addSearch("Cancer", "relevance", 10)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+
+        assert pipeline.getResults() == "fetched"
+        pipeline.pipeline.add_search.assert_not_called()
+        params = pipeline.pipeline.add_fetch.call_args
+        assert params[0][0]["id"] == ["4", "5"]
+        assert params[1].get("dependency") is None
+
+    def test_search_cache_stores_misses(self, conduit, tmp_path):
+        """Test a sent esearch is stored for the next identical query."""
+        searches = SearchCache(str(tmp_path / "records.sqlite3"))
+        conduit.get_result.side_effect = {"search": MagicMock(uids=["7"]), "fetch": "fetched"}.get
+
+        pipeline = Pipeline("test@example.com", searchCache=searches)
+        pipeline.addSearch("cancer", "relevance", 10)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        pipeline.getResults()
+
+        assert searches.get(_search("cancer")) == (["7"], False)
+
+    def test_search_only_results_have_uids(self, conduit, tmp_path):
+        """Test a search without a fetch gives .uids from esearch and from the cache."""
+        searches = SearchCache(str(tmp_path / "records.sqlite3"))
+        conduit.get_result.side_effect = {"search": MagicMock(spec=["uids"], uids=["7"])}.get
+
+        for _ in range(2):
+            pipeline = Pipeline("test@example.com", searchCache=searches)
+            pipeline.addSearch("cancer", "relevance", 10)
+            assert list(pipeline.getResults().uids) == ["7"]
+        assert conduit.run.call_count == 1
+
+    def test_stale_search_is_revalidated(self, conduit, tmp_path):
+        """Test a stale esearch is served and refreshed in the background."""
+        searches = SearchCache(str(tmp_path / "records.sqlite3"), ttl=0)
+        searches.put(_search("cancer"), ["1"])
+        with patch.object(searches, "revalidate") as revalidate:
+            pipeline = Pipeline("test@example.com", searchCache=searches)
+            pipeline.addSearch("cancer", "relevance", 10)
+        assert pipeline.cachedUids == ["1"]
+        revalidate.assert_called_once_with(_search("cancer"), pipeline.runSearch)
+
+    def test_both_caches_without_network(self, conduit, cache, tmp_path):
+        """Test a repeated query with both caches warm sends nothing."""
+        searches = SearchCache(str(tmp_path / "records.sqlite3"))
+        searches.put(_search("cancer"), ["1"])
+        cache.put_many([_record("1")])
+
+        pipeline = Pipeline("test@example.com", cache=cache, searchCache=searches)
+        pipeline.addSearch("cancer", "relevance", 10)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        result = pipeline.getResults()
+
+        conduit.run.assert_not_called()
+        assert [a.pmid for a in result.articles] == ["1"]
@@ -15,6 +15,11 @@ class TestParseArgs:
             assert args.email == ''
             assert args.searchnumber == 10
             assert args.sortby == 'relevance'
+            assert args.workers is None
+            assert args.format == 'markdown'
+            assert args.profile is None
+            assert args.socket is None
+            assert args.local is False
 
     def test_parse_args_all_arguments(self):
         """Test ParseArgs with all arguments specified."""
@@ -140,6 +145,44 @@ class TestParseArgs:
             assert args.email == ''
             assert isinstance(args.email, str)
 
+    def test_parse_args_workers(self):
+        """Test the worker process count flag."""
+        with patch('sys.argv', ['script', 'test', '--workers', '8']):
+            assert ParseArgs().workers == 8
+        with patch('sys.argv', ['script', 'test', '-w', '2']):
+            assert ParseArgs().workers == 2
+
+    def test_parse_args_format(self):
+        """Test the output format flag and its choices."""
+        with patch('sys.argv', ['script', 'test', '--format', 'ndjson']):
+            assert ParseArgs().format == 'ndjson'
+        with patch('sys.argv', ['script', 'test', '-f', 'csv']):
+            assert ParseArgs().format == 'csv'
+        with patch('sys.argv', ['script', 'test', '-f', 'xml']):
+            with pytest.raises(SystemExit):
+                ParseArgs()
+
+    def test_parse_args_batch(self):
+        """Test batch mode flags, which make the search term optional."""
+        with patch('sys.argv', ['script', '--input-file', 'queries.txt', '-j', '8']):
+            args = ParseArgs()
+            assert args.searchterm is None
+            assert args.input_file == 'queries.txt'
+            assert args.jobs == 8
+        with patch('sys.argv', ['script', 'test']):
+            args = ParseArgs()
+            assert args.input_file is None
+            assert args.jobs is None
+
+    @pytest.mark.parametrize("flag", ["--workers", "--jobs"])
+    @pytest.mark.parametrize("value", ["0", "-2", "x"])
+    def test_parse_args_counts_must_be_positive(self, flag, value):
+        """Test --workers and --jobs reject anything but a positive count."""
+        with patch('sys.argv', ['script', 'test', flag, value]):
+            with pytest.raises(SystemExit) as exc_info:
+                ParseArgs()
+            assert exc_info.value.code == 2
+
     def test_parse_args_help_message(self):
         """Test ParseArgs help functionality."""
         with patch('sys.argv', ['script', '--help']):
@@ -0,0 +1,132 @@
+import datetime
+import io
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+from analyzer import ArticleAnalyzer
+from article import ArticleRecord, ArticleResult
+from columns import ArticleColumns, parse_pub_date
+from researcher import Researcher
+
+
+def _records():
+    return [
+        ArticleRecord(
+            "First", "eng", "2023-Jan-02", {"b@x.org", "a@x.org"},
+            [Researcher("Doe", "Jane", "J", "Lab", "a@x.org"), Researcher("Roe", "Rick", "R", "", None)],
+            "11",
+        ),
+        ArticleRecord("Second", None, "", set(), [], "12"),
+        ArticleRecord("Third", "eng", "2021-11", set(), [Researcher("Poe")], "13"),
+    ]
+
+
+@pytest.fixture
+def columns():
+    return ArticleColumns.from_records(_records())
+
+
+class TestParsePubDate:
+    """Test publication dates as days since the epoch."""
+
+    @pytest.mark.parametrize("text,expected", [
+        ("2023-Jan-02", datetime.date(2023, 1, 2)),
+        ("2021-11", datetime.date(2021, 11, 1)),
+        ("1998", datetime.date(1998, 1, 1)),
+    ])
+    def test_parsed(self, text, expected):
+        """Test the date forms publish_date produces."""
+        assert parse_pub_date(text) == (expected - datetime.date(1970, 1, 1)).days
+
+    @pytest.mark.parametrize("text", ["", None, "Spring", "2020-Spring"])
+    def test_unparseable(self, text):
+        """Test missing or free-form dates become None."""
+        assert parse_pub_date(text) is None
+
+
+class TestArticleColumns:
+    """Test the columnar ArticleResult backing."""
+
+    def test_columnar_result_keeps_no_objects(self):
+        """Test columnar results store records only as columns."""
+        result = ArticleResult(None, MagicMock(), columnar=True)
+        assert result.isEmpty() is True
+        for record in _records():
+            result.add_article_record(record)
+        assert result.articles == []
+        assert result.size() == 3
+        assert result.isEmpty() is False
+
+    def test_layout(self, columns):
+        """Test values, codes and offsets are laid out as Arrow expects."""
+        assert list(columns.pmid.values) == [11, 12, 13]
+        assert list(columns.language.codes) == [0, 0, 0]
+        assert columns.language.null_count == 1
+        assert list(columns.email_offsets) == [0, 2, 2, 2]
+        assert list(columns.author_offsets) == [0, 2, 2, 3]
+        assert columns.authors["email"].null_count == 1
+
+    def test_analyzer_columnar(self):
+        """Test the analyzer fills columns when asked to."""
+        payload = (
+            b"<PubmedArticleSet><PubmedArticle><MedlineCitation><PMID>5</PMID>"
+            b"<Article><ArticleTitle>T</ArticleTitle></Article></MedlineCitation>"
+            b"</PubmedArticle></PubmedArticleSet>"
+        )
+        request = MagicMock()
+        request.retmode = "xml"
+        analyzer = ArticleAnalyzer(streaming=True, columnar=True)
+        analyzer.parse(io.BytesIO(payload), request)
+        assert analyzer.result.size() == 1
+        assert list(analyzer.result.columns.pmid.values) == [5]
+
+    def test_to_arrow(self, columns):
+        """Test the Arrow table holds the same data as the records."""
+        pytest.importorskip("pyarrow")
+        table = columns.to_arrow()
+        assert table.column("pmid").to_pylist() == [11, 12, 13]
+        assert table.column("title").to_pylist() == ["First", "Second", "Third"]
+        assert table.column("language").to_pylist() == ["eng", None, "eng"]
+        assert table.column("date").to_pylist() == [
+            datetime.date(2023, 1, 2), None, datetime.date(2021, 11, 1)
+        ]
+        assert table.column("emails").to_pylist() == [["a@x.org", "b@x.org"], [], []]
+        authors = table.column("authors").to_pylist()
+        assert [len(a) for a in authors] == [2, 0, 1]
+        assert authors[0][1] == {
+            "lastName": "Roe", "firstName": "Rick", "initials": "R", "affiliation": "", "email": None
+        }
+
+    def test_to_arrow_is_zero_copy(self, columns):
+        """Test Arrow wraps the column buffers instead of copying them."""
+        pytest.importorskip("pyarrow")
+        import pyarrow as pa
+
+        table = columns.to_arrow()
+        values = table.column("pmid").chunk(0).buffers()[1]
+        assert values.address == pa.py_buffer(columns.pmid.values).address
+
+    def test_result_exports_plain_results(self):
+        """Test non-columnar results can still be exported."""
+        pytest.importorskip("pyarrow")
+        result = ArticleResult(None, MagicMock())
+        for record in _records():
+            result.add_article_record(record)
+        assert result.to_arrow().num_rows == 3
+
+    def test_write_parquet(self, columns, tmp_path):
+        """Test Parquet output reads back to the same table."""
+        pytest.importorskip("pyarrow")
+        import pyarrow.parquet as pq
+
+        path = tmp_path / "articles.parquet"
+        columns.write_parquet(path)
+        assert pq.read_table(path).column("pmid").to_pylist() == [11, 12, 13]
+
+    def test_missing_pyarrow(self, columns, monkeypatch):
+        """Test a clear ImportError when pyarrow is not installed."""
+        monkeypatch.setitem(sys.modules, "pyarrow", None)
+        with pytest.raises(ImportError, match="pip install pyarrow"):
+            columns.to_arrow()
@@ -1,4 +1,7 @@
-from constants import PUBMED_SORT_OPTIONS, APPLICATION_OUTPUT_OPTIONS
+import importlib
+
+import constants
+from constants import PUBMED_SORT_OPTIONS, APPLICATION_OUTPUT_OPTIONS, OUTPUT_FORMAT_OPTIONS
 
 
 def test_pubmed_sort_options():
@@ -19,6 +22,11 @@ def test_application_output_options():
     assert "emails" in APPLICATION_OUTPUT_OPTIONS
 
 
+def test_output_format_options():
+    """Test that OUTPUT_FORMAT_OPTIONS contains expected values."""
+    assert OUTPUT_FORMAT_OPTIONS == ["markdown", "json", "ndjson", "csv"]
+
+
 def test_constants_are_lists():
     """Test that constants are proper list types."""
     assert isinstance(PUBMED_SORT_OPTIONS, list)
@@ -29,3 +37,15 @@ def test_constants_are_not_empty():
     """Test that constants are not empty."""
     assert len(PUBMED_SORT_OPTIONS) > 0
     assert len(APPLICATION_OUTPUT_OPTIONS) > 0
+
+
+def test_cache_dir_override(monkeypatch):
+    """Test SCHOLARSEEK_CACHE_DIR moves the cache directory."""
+    default = constants.CACHE_DIR
+    monkeypatch.setenv("SCHOLARSEEK_CACHE_DIR", "/srv/cache")
+    try:
+        assert importlib.reload(constants).CACHE_DIR == "/srv/cache"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(constants)
+    assert constants.CACHE_DIR == default
@@ -0,0 +1,270 @@
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from article import ArticleRecord
+from cache import RecordCache, SearchCache
+from cli import ParseArgs
+from daemon import Daemon, DaemonError, connect, iterResponse
+from main import main
+from ratelimit import RateLimiter
+from researcher import Researcher
+from services import SearchSession
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _request(searchterm="cancer", **overrides):
+    request = {
+        "mode": "overview", "searchterm": searchterm, "terms": None, "sortby": "relevance",
+        "email": "", "searchnumber": 10, "workers": None, "jobs": None, "format": "markdown",
+    }
+    request.update(overrides)
+    return request
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about 100 bytes, so not under tmp_path
+    directory = tempfile.mkdtemp(prefix="ss")
+    yield os.path.join(directory, "daemon.sock")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def _running(server):
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05})
+    thread.start()
+    try:
+        yield server.path
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def daemon(socket_path):
+    with _running(Daemon(socket_path)) as path:
+        yield path
+
+
+@pytest.fixture
+def session(eutils_stub, tmp_path):
+    # A SearchSession on the stub server, whose caches already hold a search
+    # for "cancer" and its one article
+    records = RecordCache(str(tmp_path / "records.sqlite3"))
+    searches = SearchCache(str(tmp_path / "records.sqlite3"))
+    query = {"db": "pubmed", "term": "cancer", "retmax": 10, "rettype": "uilist",
+             "sort": "relevance"}
+    searches.put(query, ["1"])
+    people = [Researcher("Doe", "Jane", "J", "Lab", "a@x.org")]
+    records.put_many([ArticleRecord("Title", "eng", "2023", {"a@x.org"}, people, "1")])
+    session = SearchSession(
+        cache=records, searchCache=searches, rateLimiter=RateLimiter(rate=1000),
+        url=eutils_stub[1],
+    )
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def session_daemon(socket_path, session):
+    with _running(Daemon(socket_path, session)) as path:
+        yield path
+
+
+def _ask(path, request):
+    return list(iterResponse(connect(path), request))
+
+
+class TestDaemon:
+    """Test the search daemon and its socket protocol."""
+
+    def test_streams_chunks(self, daemon):
+        """Test the request reaches the services and the chunks come back in order."""
+        with patch("services.iterRequest", return_value=iter(["one\n", "two"])) as iterRequest:
+            assert _ask(daemon, _request()) == ["one\n", "two"]
+        iterRequest.assert_called_once_with(_request(), session=None)
+
+    def test_errors_are_raised_in_the_client(self, daemon):
+        """Test a failed search surfaces as a DaemonError."""
+        with patch("services.iterRequest", side_effect=ValueError("bad query")):
+            with pytest.raises(DaemonError, match="ValueError: bad query"):
+                _ask(daemon, _request())
+        # The daemon keeps serving after a failed request
+        with patch("services.iterRequest", return_value=iter(["ok"])):
+            assert _ask(daemon, _request()) == ["ok"]
+
+    def test_bad_request_line_gets_an_error(self, daemon):
+        """Test a request line that is not JSON is answered with an error."""
+        with connect(daemon) as sock, sock.makefile("rb") as lines:
+            sock.sendall(b"not json\n")
+            message = json.loads(lines.readline())
+        assert message["error"].startswith("JSONDecodeError")
+
+    def test_truncated_stream_is_an_error(self, socket_path):
+        """Test a response that ends without its done marker raises DaemonError."""
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen(1)
+
+        def reply():
+            conn, _ = server.accept()
+            with conn:
+                conn.makefile("rb").readline()
+                conn.sendall(json.dumps({"chunk": "one"}).encode() + b"\n{\"chu")
+
+        thread = threading.Thread(target=reply)
+        thread.start()
+        chunks = []
+        with pytest.raises(DaemonError, match="before the search finished"):
+            for chunk in iterResponse(connect(socket_path), _request()):
+                chunks.append(chunk)
+        thread.join()
+        server.close()
+        assert chunks == ["one"]
+
+    def test_no_daemon(self, socket_path):
+        """Test connect returns None when nothing is listening."""
+        assert connect(socket_path) is None
+
+    def test_socket_is_private_and_removed(self, socket_path):
+        """Test only the owner can connect and the socket goes with the daemon."""
+        server = Daemon(socket_path)
+        assert os.stat(socket_path).st_mode & 0o777 == 0o600
+        server.server_close()
+        assert not os.path.exists(socket_path)
+
+    def test_stale_socket_is_replaced(self, socket_path):
+        """Test a socket file left by a dead daemon does not block a new one."""
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_path)
+        stale.close()
+        Daemon(socket_path).server_close()
+
+    def test_one_daemon_per_socket(self, daemon):
+        """Test a second daemon on a live socket is refused."""
+        with pytest.raises(DaemonError, match="already listening"):
+            Daemon(daemon)
+
+    def test_cached_query(self, session_daemon, eutils_stub):
+        """Test a repeated query is answered from the session's warm caches."""
+        _ask(session_daemon, _request())
+        chunks = _ask(session_daemon, _request(format="ndjson"))
+        assert '"pmid":"1"' in "".join(chunks)
+        assert eutils_stub[0].requests == []
+
+    def test_searches_share_the_session(self, session_daemon, eutils_stub):
+        """Test searches go through the session and reuse its connections."""
+        for term in ("diabetes", "asthma"):
+            chunks = _ask(session_daemon, _request(term, searchnumber=2, format="ndjson"))
+            assert '"pmid":"2"' in "".join(chunks)
+        assert eutils_stub[0].connections == 1
+
+    def test_batch_through_the_session(self, session_daemon, eutils_stub):
+        """Test batch requests run their esearches and fetches in the session."""
+        request = _request(terms=["diabetes", "asthma"], searchnumber=2, format="ndjson")
+        lines = [json.loads(line) for line in "".join(_ask(session_daemon, request)).splitlines()]
+        assert [(line["query"], len(line["articles"])) for line in lines] == [
+            ("diabetes", 2), ("asthma", 2)
+        ]
+        assert {eutil for eutil, _, _ in eutils_stub[0].requests} == {"esearch", "efetch"}
+
+    @pytest.mark.benchmark
+    def test_cached_query_is_fast(self, session_daemon):
+        """Benchmark: a repeated query with warm caches is answered in well under 100ms."""
+        _ask(session_daemon, _request())
+        start = time.perf_counter()
+        chunks = _ask(session_daemon, _request(format="ndjson"))
+        elapsed = time.perf_counter() - start
+        assert '"pmid":"1"' in "".join(chunks)
+        assert elapsed < 0.1
+
+
+class TestClient:
+    """Test main as a thin client of the daemon."""
+
+    def _args(self, socket_path, local=False):
+        return MagicMock(
+            mode="emails", searchterm="cancer", input_file=None, sortby="relevance",
+            email="", searchnumber=10, workers=None, jobs=None, format="markdown",
+            profile=None, socket=socket_path, local=local, serve=False,
+        )
+
+    @patch("main.ParseArgs")
+    def test_uses_running_daemon(self, mock_parse_args, daemon, capsys):
+        """Test the search runs in the daemon when one is listening."""
+        mock_parse_args.return_value = self._args(daemon)
+        with patch("services.iterRequest", return_value=iter(["a@x.org"])), \
+                patch("services.iterEmails") as iterEmails:
+            main()
+        iterEmails.assert_not_called()
+        assert capsys.readouterr().out == "a@x.org\n"
+
+    @patch("services.iterEmails", return_value=iter(["local@x.org"]))
+    @patch("main.ParseArgs")
+    def test_falls_back_to_local(self, mock_parse_args, iterEmails, socket_path, capsys):
+        """Test the CLI searches itself when no daemon is running."""
+        mock_parse_args.return_value = self._args(socket_path)
+        main()
+        assert capsys.readouterr().out == "local@x.org\n"
+
+    @patch("services.iterEmails", return_value=iter(["local@x.org"]))
+    @patch("main.ParseArgs")
+    def test_local_flag(self, mock_parse_args, iterEmails, daemon, capsys):
+        """Test --local searches in the CLI process despite a running daemon."""
+        mock_parse_args.return_value = self._args(daemon, local=True)
+        main()
+        assert capsys.readouterr().out == "local@x.org\n"
+
+    def test_client_imports_no_search_stack(self, daemon):
+        """Test a CLI run through the daemon never imports the services."""
+        script = (
+            "import sys\n"
+            f"sys.argv = ['main', 'cancer', '--socket', {daemon!r}]\n"
+            "import main\n"
+            "main.main()\n"
+            "heavy = ('lxml', 'entrezpy', 'services')\n"
+            "print(sorted(name for name in heavy if name in sys.modules))\n"
+        )
+        with patch("services.iterRequest", return_value=iter(["from the daemon"])):
+            result = subprocess.run(
+                [sys.executable, "-c", script], cwd=CLI_DIR, capture_output=True, text=True,
+                check=True,
+            )
+        assert result.stdout == "from the daemon\n[]\n"
+
+    def test_serve_args(self):
+        """Test --serve needs no search term and takes the socket option."""
+        args = ParseArgs(["--serve", "--socket", "/tmp/x.sock"])
+        assert args.serve and args.socket == "/tmp/x.sock"
+        assert ParseArgs(["--serve"]).socket is None
+
+    @patch("daemon.serve")
+    def test_serve_flag_starts_the_daemon(self, serve):
+        """Test main.py --serve runs the daemon on the given socket."""
+        with patch("sys.argv", ["main", "--serve", "--socket", "/tmp/x.sock"]):
+            main()
+        serve.assert_called_once_with("/tmp/x.sock")
+
+    @patch("daemon.serve")
+    @patch("services.iterRequest", return_value=iter(["local@x.org"]))
+    def test_serve_is_a_search_term(self, iterRequest, serve, socket_path, capsys):
+        """Test a search for the word "serve" is a search, not the daemon."""
+        with patch("sys.argv", ["main", "serve", "--socket", socket_path]):
+            main()
+        serve.assert_not_called()
+        assert iterRequest.call_args.args[0]["searchterm"] == "serve"
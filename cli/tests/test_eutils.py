@@ -0,0 +1,286 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from analyzer import ArticleAnalyzer, EmailAnalyzer
+from eutils import AsyncEutils, EutilsError
+from pipeline import Pipeline
+from ratelimit import RateLimiter
+
+
+def _client(url, **kwargs):
+    return AsyncEutils("test@example.com", url=url, rateLimiter=RateLimiter(rate=1000), **kwargs)
+
+
+def _run(url, body, **kwargs):
+    async def main():
+        async with _client(url, **kwargs) as client:
+            return await body(client)
+    return asyncio.run(main())
+
+
+class TestAsyncEutils:
+    """Test the asyncio E-utilities client against a local stub server."""
+
+    def test_esearch(self, eutils_stub):
+        """Test esearch returns the decoded esearchresult."""
+        stub, url = eutils_stub
+        result = _run(url, lambda client: client.esearch({"db": "pubmed", "term": "cancer", "retmax": 3}))
+        assert result["idlist"] == ["1", "2", "3"]
+        eutil, params, headers = stub.requests[0]
+        assert eutil == "esearch"
+        assert params["retmode"] == "json"
+        assert params["tool"] == "scholarseek" and params["email"] == "test@example.com"
+        assert "gzip" in headers["Accept-Encoding"]
+
+    def test_parameter_encoding(self, eutils_stub):
+        """Test lists are comma-joined, True is y and None is left out."""
+        stub, url = eutils_stub
+        _run(url, lambda client: client.efetch(
+            {"db": "pubmed", "id": ["4", "5"], "usehistory": True, "rettype": None}
+        ), apikey="key")
+        params = stub.requests[0][1]
+        assert params["id"] == "4,5"
+        assert params["usehistory"] == "y"
+        assert params["api_key"] == "key"
+        assert "rettype" not in params
+
+    @pytest.mark.parametrize("gzip,chunked", [(True, False), (False, False), (True, True)])
+    def test_body_encodings(self, eutils_stub, gzip, chunked):
+        """Test plain, gzip and chunked bodies decode to the same payload."""
+        stub, url = eutils_stub
+        stub.gzip, stub.chunked = gzip, chunked
+        body = _run(url, lambda client: client.efetch({"db": "pubmed", "id": ["1", "2"]}))
+        assert body.startswith(b"<PubmedArticleSet>") and body.count(b"<PubmedArticle>") == 2
+
+    def test_keep_alive(self, eutils_stub):
+        """Test sequential requests reuse one connection."""
+        stub, url = eutils_stub
+
+        async def body(client):
+            for _ in range(5):
+                await client.esummary({"db": "pubmed", "id": ["1"]})
+            return client.pool.opened
+
+        assert _run(url, body) == 1
+        assert stub.connections == 1
+
+    def test_many_requests_in_flight(self, eutils_stub):
+        """Test concurrent requests overlap on pooled connections."""
+        stub, url = eutils_stub
+        stub.delay = 0.2
+
+        async def body(client):
+            await asyncio.gather(
+                *(client.efetch({"db": "pubmed", "id": [str(i)]}) for i in range(1, 21))
+            )
+
+        start = time.monotonic()
+        _run(url, body, maxConnections=20)
+        assert time.monotonic() - start < 2
+        assert stub.max_in_flight >= 10
+        assert stub.connections <= 20
+
+    def test_pool_bounds_connections(self, eutils_stub):
+        """Test no more than maxConnections requests run at once."""
+        stub, url = eutils_stub
+        stub.delay = 0.05
+
+        async def body(client):
+            await asyncio.gather(*(client.esummary({"id": [str(i)]}) for i in range(12)))
+
+        _run(url, body, maxConnections=3)
+        assert stub.max_in_flight <= 3
+        assert stub.connections <= 3
+
+    def test_http_error(self, eutils_stub):
+        """Test non-200 responses raise EutilsError with the status."""
+        stub, url = eutils_stub
+        stub.failures["efetch"] = 1
+        with pytest.raises(EutilsError) as error:
+            _run(url, lambda client: client.efetch({"db": "pubmed", "id": ["1"]}))
+        assert error.value.status == 500
+
+    def test_dropped_keep_alive_is_retried(self, eutils_stub):
+        """Test a keep-alive connection closed by the server is replaced."""
+        stub, url = eutils_stub
+        stub.drop_after_response = True
+
+        async def body(client):
+            first = await client.esummary({"id": ["1"]})
+            await asyncio.sleep(0.05)
+            second = await client.esummary({"id": ["2"]})
+            return first, second
+
+        first, second = _run(url, body)
+        assert first["uids"] == ["1"] and second["uids"] == ["2"]
+
+    def test_stalled_server_times_out(self, eutils_stub):
+        """Test a server that stops responding raises TimeoutError and loses its connection."""
+        stub, url = eutils_stub
+        stub.delay = 1
+
+        async def body(client):
+            with pytest.raises(TimeoutError, match="efetch timed out"):
+                await client.efetch({"db": "pubmed", "id": ["1"]})
+            stub.delay = 0
+            # The stalled connection is discarded, not handed to the next request
+            return await client.esummary({"id": ["2"]})
+
+        second = _run(url, body, readTimeout=0.2)
+        assert second["uids"] == ["2"]
+        assert len(stub.requests) == 2
+        assert stub.connections == 2
+        # The stalled handler must not outlive the test
+        while stub.in_flight:
+            time.sleep(0.05)
+
+    def test_connect_timeout(self, eutils_stub, monkeypatch):
+        """Test a connection that cannot be opened in time raises TimeoutError."""
+        _, url = eutils_stub
+
+        async def never_connects(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        monkeypatch.setattr(asyncio, "open_connection", never_connects)
+
+        async def body(client):
+            with pytest.raises(TimeoutError, match="connecting"):
+                await client.esummary({"id": ["1"]})
+            monkeypatch.undo()
+            # The only pool slot was given back
+            return await asyncio.wait_for(client.esummary({"id": ["2"]}), 5)
+
+        assert _run(url, body, connectTimeout=0.1, maxConnections=1)["uids"] == ["2"]
+
+
+class TestClientPipeline:
+    """Test Pipeline sending its requests through an AsyncEutils client."""
+
+    def _pipeline(self, url, **kwargs):
+        return Pipeline("test@example.com", rateLimiter=RateLimiter(rate=1000),
+                        client=_client(url), **kwargs)
+
+    def test_search_and_fetch(self, eutils_stub):
+        """Test esearch and batched efetch results come back in PMID order."""
+        stub, url = eutils_stub
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 10)
+        pipeline.addFetch(analyzer=ArticleAnalyzer(streaming=True), batchSize=3)
+        result = pipeline.getResults()
+
+        assert [a.pmid for a in result.articles] == [str(i) for i in range(1, 11)]
+        assert [eutil for eutil, _, _ in stub.requests].count("efetch") == 4
+        assert result.articles[0].title == "Title 1"
+
+    def test_emails_only(self, eutils_stub):
+        """Test the emails-only analyzer works over the client too."""
+        _, url = eutils_stub
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 4)
+        pipeline.addFetch(analyzer=EmailAnalyzer(streaming=True))
+        result = pipeline.getResults()
+        assert [a.pmid for a in result.articles] == ["1", "2", "3", "4"]
+        assert result.articles[3].emails == {"author0.4@uni.edu"}
+
+    def test_history_windows(self, eutils_stub):
+        """Test History mode pages efetch through retstart windows."""
+        stub, url = eutils_stub
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 7, useHistory=True)
+        pipeline.addFetch(analyzer=ArticleAnalyzer(), batchSize=3)
+        result = pipeline.getResults()
+
+        assert [a.pmid for a in result.articles] == [str(i) for i in range(1, 8)]
+        fetches = sorted(
+            (int(p["retstart"]), int(p["retmax"])) for eutil, p, _ in stub.requests if eutil == "efetch"
+        )
+        assert fetches == [(0, 3), (3, 3), (6, 1)]
+        assert all(p["WebEnv"] == "NCID_stub" for eutil, p, _ in stub.requests if eutil == "efetch")
+
+    def test_failed_batch_is_retried(self, eutils_stub):
+        """Test an HTTP error is retried as in the threaded fetch."""
+        stub, url = eutils_stub
+        stub.failures["efetch"] = 1
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 2)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        assert [a.pmid for a in pipeline.getResults().articles] == ["1", "2"]
+
+    def test_client_error_is_not_retried(self, eutils_stub):
+        """Test a 4xx other than 429 fails the fetch at once."""
+        stub, url = eutils_stub
+        stub.failures["efetch"] = 1
+        stub.failure_status = 400
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 2)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        with pytest.raises(EutilsError, match="HTTP 400"):
+            pipeline.getResults()
+        assert [eutil for eutil, _, _ in stub.requests].count("efetch") == 1
+
+    def test_throttled_batch_backs_off(self, eutils_stub, monkeypatch):
+        """Test a 429 is retried after the backoff delay."""
+        stub, url = eutils_stub
+        stub.failures["efetch"] = 2
+        stub.failure_status = 429
+        monkeypatch.setattr("pipeline.FETCH_BACKOFF", 0.01)
+        import pipeline as module
+
+        backoff, delays = module._backoff, []
+
+        def record(attempt):
+            delays.append(backoff(attempt))
+            return delays[-1]
+
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 2)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        with patch("pipeline.random.uniform", side_effect=lambda low, high: high), \
+                patch("pipeline._backoff", side_effect=record):
+            assert [a.pmid for a in pipeline.getResults().articles] == ["1", "2"]
+        assert delays == [0.01, 0.02]
+
+    def test_search_only(self, eutils_stub):
+        """Test a search without a fetch gives its PMIDs as .uids."""
+        _, url = eutils_stub
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 3)
+        assert list(pipeline.getResults().uids) == ["1", "2", "3"]
+
+    def test_empty_search(self, eutils_stub):
+        """Test an empty esearch gives no result."""
+        stub, url = eutils_stub
+        stub.uids = []
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("nothing", "relevance", 10)
+        pipeline.addFetch(analyzer=ArticleAnalyzer())
+        assert pipeline.getResults() is None
+
+    def test_record_cache(self, eutils_stub, tmp_path):
+        """Test cached PMIDs are not fetched through the client."""
+        from cache import RecordCache
+
+        stub, url = eutils_stub
+        cache = RecordCache(str(tmp_path / "records.sqlite3"))
+        first = self._pipeline(url, cache=cache)
+        first.addSearch("cancer", "relevance", 3)
+        first.addFetch(analyzer=ArticleAnalyzer())
+        first.getResults()
+
+        stub.requests.clear()
+        second = self._pipeline(url, cache=cache)
+        second.addSearch("cancer", "relevance", 3)
+        second.addFetch(analyzer=ArticleAnalyzer())
+        assert [a.pmid for a in second.getResults().articles] == ["1", "2", "3"]
+        assert [eutil for eutil, _, _ in stub.requests] == ["esearch"]
+
+    def test_fetch_needs_analyzer(self, eutils_stub):
+        """Test client fetches refuse to run without an analyzer."""
+        _, url = eutils_stub
+        pipeline = self._pipeline(url)
+        pipeline.addSearch("cancer", "relevance", 3)
+        with pytest.raises(ValueError):
+            pipeline.addFetch()
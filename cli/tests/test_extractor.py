@@ -0,0 +1,240 @@
+import os
+import re
+import threading
+import time
+
+import pytest
+from lxml import etree
+
+from parsing import ArticleExtractor, get_extractor, get_parser, iter_email_records, parse_shard
+
+
+def _legacy_fields(article):
+    """The descendant-search extraction that ArticleExtractor replaced."""
+    basics = (
+        article.findtext('.//PMID'),
+        article.findtext('.//ArticleTitle'),
+        article.findtext('.//Language'),
+    )
+    pub = article.find('.//PubDate')
+    date = ""
+    if pub is not None:
+        date = "-".join(filter(None, [pub.findtext(t) for t in ('Year', 'Month', 'Day')]))
+    emails = set()
+    authors = []
+    for auth in article.findall('.//Author'):
+        affiliation = auth.findtext('.//Affiliation') or ""
+        match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', affiliation)
+        email = match.group(0) if match else None
+        if email:
+            emails.add(email)
+        authors.append((
+            auth.findtext('LastName') or "",
+            auth.findtext('ForeName') or "",
+            auth.findtext('Initials') or "",
+            affiliation,
+            email,
+        ))
+    return basics, date, emails, authors
+
+
+def _compiled_fields(extractor, article):
+    emails, authors = extractor.authors_and_emails(article)
+    return (
+        extractor.basics(article),
+        extractor.publish_date(article),
+        emails,
+        [(a.lastName, a.firstName, a.initials, a.affiliation, a.email) for a in authors],
+    )
+
+
+@pytest.fixture
+def articles(pubmed_payload):
+    root = etree.fromstring(pubmed_payload(300), get_parser())
+    return root.xpath('//PubmedArticle')
+
+
+class TestArticleExtractor:
+    """Test the compiled ArticleExtractor."""
+
+    def test_matches_legacy_extraction(self, articles):
+        """Test the extractor produces exactly the same fields."""
+        extractor = ArticleExtractor()
+        for article in articles:
+            assert _compiled_fields(extractor, article) == _legacy_fields(article)
+
+    def test_old_style_affiliation(self):
+        """Test affiliations placed directly under Author are still found."""
+        article = etree.fromstring(b"""
+        <PubmedArticle><MedlineCitation><Article><AuthorList>
+          <Author><LastName>Doe</LastName><Affiliation>Lab, doe@lab.org</Affiliation></Author>
+        </AuthorList></Article></MedlineCitation></PubmedArticle>
+        """)
+        emails, authors = ArticleExtractor().authors_and_emails(article)
+        assert emails == {"doe@lab.org"}
+        assert authors[0].affiliation == "Lab, doe@lab.org"
+
+    def test_coauthors_share_affiliation(self):
+        """Test authors of one article with the same affiliation share one string."""
+        article = etree.fromstring(b"""
+        <PubmedArticle><MedlineCitation><Article><AuthorList>
+          <Author><LastName>Doe</LastName><Affiliation>Lab</Affiliation></Author>
+          <Author><LastName>Roe</LastName><Affiliation>Lab</Affiliation></Author>
+        </AuthorList></Article></MedlineCitation></PubmedArticle>
+        """)
+        _, authors = ArticleExtractor().authors_and_emails(article)
+        assert authors[0].affiliation is authors[1].affiliation
+
+    def test_empty_fields_match_findtext(self):
+        """Test empty elements give "" and missing elements give None."""
+        article = etree.fromstring(
+            b"<PubmedArticle><MedlineCitation><PMID>1</PMID>"
+            b"<Article><ArticleTitle/></Article></MedlineCitation></PubmedArticle>"
+        )
+        assert ArticleExtractor().basics(article) == ("1", "", None)
+
+    def test_optional_fields(self, articles):
+        """Test abstract, MeSH terms and journal are read from their schema location."""
+        extractor = ArticleExtractor()
+        article = articles[0]
+        assert extractor.abstract(article).startswith("Lorem ipsum")
+        assert extractor.mesh_terms(article) == [f"Term {k}" for k in range(12)]
+        assert extractor.journal(article) == "Journal of Things"
+
+    def test_per_thread_instances(self):
+        """Test parsers and extractors are cached per thread."""
+        assert get_parser() is get_parser()
+        assert get_extractor() is get_extractor()
+
+        other = {}
+
+        def collect():
+            other["parser"] = get_parser()
+            other["extractor"] = get_extractor()
+
+        thread = threading.Thread(target=collect)
+        thread.start()
+        thread.join()
+        assert other["parser"] is not get_parser()
+        assert other["extractor"] is not get_extractor()
+
+    @pytest.mark.benchmark
+    def test_benchmark_faster_than_descendant_search(self, articles):
+        """Benchmark: the compiled extractor beats per-field descendant scans."""
+        extractor = ArticleExtractor()
+
+        def best_of(runs, func):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                for article in articles:
+                    func(article)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        legacy = best_of(5, _legacy_fields)
+        compiled = best_of(5, lambda article: _compiled_fields(extractor, article))
+        print(f"legacy {legacy:.4f}s, compiled {compiled:.4f}s, speedup {legacy / compiled:.2f}x")
+        assert compiled * 1.2 < legacy
+
+
+class TestEmailTarget:
+    """Test the emails-only target parser."""
+
+    def test_matches_extractor(self, pubmed_payload, articles):
+        """Test PMIDs and emails match what the full extractor finds."""
+        extractor = ArticleExtractor()
+        expected = [
+            (extractor.basics(article)[0], extractor.authors_and_emails(article)[0])
+            for article in articles
+        ]
+        payload = pubmed_payload(300)
+        chunks = [payload[i:i + 4096] for i in range(0, len(payload), 4096)]
+        assert [value for _, value in iter_email_records(chunks)] == expected
+
+    def test_ignores_non_author_affiliations(self):
+        """Test only the first author affiliation and the citation PMID count."""
+        payload = b"""<PubmedArticleSet><PubmedArticle><MedlineCitation>
+          <PMID>7</PMID><Article><AuthorList><Author>
+            <AffiliationInfo><Affiliation>Lab <i>A</i> a@lab.org</Affiliation></AffiliationInfo>
+            <AffiliationInfo><Affiliation>b@lab.org</Affiliation></AffiliationInfo>
+          </Author><Author><Affiliation>c@lab.org</Affiliation></Author></AuthorList></Article>
+          <CommentsCorrectionsList><CommentsCorrections><PMID>8</PMID></CommentsCorrections>
+          </CommentsCorrectionsList></MedlineCitation>
+          <PubmedData><Affiliation>d@lab.org</Affiliation></PubmedData>
+        </PubmedArticle></PubmedArticleSet>"""
+        assert list(iter_email_records([payload])) == [("PubmedArticle", ("7", {"c@lab.org"}))]
+
+    def test_error_elements(self):
+        """Test ERROR elements are reported instead of articles."""
+        events = list(iter_email_records([b"<eFetchResult><ERROR>Bad ID</ERROR></eFetchResult>"]))
+        assert events == [("ERROR", "Bad ID")]
+
+    @pytest.mark.benchmark
+    def test_benchmark_faster_than_full_parse(self, pubmed_payload):
+        """Benchmark: the target parser beats tree parsing plus full extraction."""
+        payload = pubmed_payload(300)
+        extractor = ArticleExtractor()
+
+        def full():
+            root = etree.fromstring(payload, get_parser())
+            for article in root.xpath('//PubmedArticle'):
+                extractor.basics(article)
+                extractor.publish_date(article)
+                extractor.authors_and_emails(article)
+
+        def emails_only():
+            for _ in iter_email_records([payload]):
+                pass
+
+        def best_of(runs, func):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        tree = best_of(5, full)
+        target = best_of(5, emails_only)
+        print(f"full {tree:.4f}s, emails only {target:.4f}s, speedup {tree / target:.2f}x")
+        assert target * 1.3 < tree
+
+
+class TestParallelParse:
+    """Test parsing article shards in worker processes."""
+
+    def test_shard_fields_match_extractor(self, pubmed_payload, articles):
+        """Test a shard parses to the same fields as the in-process extractor."""
+        from parsing import iter_article_shards
+
+        extractor = ArticleExtractor()
+        shards = [
+            data for kind, data in iter_article_shards([pubmed_payload(300)], size=64)
+            if kind == "shard"
+        ]
+        fields = [record for shard in shards for record in parse_shard(shard)]
+        assert fields == [extractor.record_fields(article) for article in articles]
+
+    @pytest.mark.benchmark
+    @pytest.mark.skipif((os.cpu_count() or 1) < 4, reason="needs at least 4 cores")
+    def test_benchmark_scales_with_cores(self, pubmed_payload):
+        """Benchmark: 4 worker processes parse a large payload well over 2x faster."""
+        from concurrent.futures import ProcessPoolExecutor
+        from parsing import iter_article_shards
+
+        shards = [
+            data for kind, data in iter_article_shards([pubmed_payload(4000)]) if kind == "shard"
+        ]
+        start = time.perf_counter()
+        for shard in shards:
+            parse_shard(shard)
+        serial = time.perf_counter() - start
+
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(parse_shard, shards[:4]))  # warm up the workers
+            start = time.perf_counter()
+            list(executor.map(parse_shard, shards))
+            parallel = time.perf_counter() - start
+        print(f"serial {serial:.4f}s, 4 workers {parallel:.4f}s, speedup {serial / parallel:.2f}x")
+        assert parallel * 2 < serial
@@ -1,10 +1,40 @@
-from unittest.mock import MagicMock
-from format import overviewFormat, emailFormat
+import csv
+import io
+import json
+import os
+import time
+import tracemalloc
+from contextlib import nullcontext
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from article import ArticleRecord
+from format import (
+    articleFormat,
+    batchChunks,
+    emailChunks,
+    emailFormat,
+    overviewFormat,
+    writeArticles,
+    writeEmails,
+)
+from researcher import Researcher
 
 
 class TestOverviewFormat:
     """Test the overviewFormat function."""
 
+    def test_overview_format_joins_articles(self):
+        """Test overviewFormat is the articleFormat chunks back to back."""
+        articles = []
+        for pmid in ("1", "2"):
+            article = MagicMock(title=f"T{pmid}", pmid=pmid, language="eng", date="2023")
+            article.emails = set()
+            article.people = []
+            articles.append(article)
+        assert overviewFormat(articles) == articleFormat(articles[0]) + articleFormat(articles[1])
+
     def test_overview_format_empty_list(self):
         """Test overviewFormat with empty article list."""
         result = overviewFormat([])
@@ -149,3 +179,139 @@ class TestEmailFormat:
         assert "test1@example.com" in result
         assert "test2@example.com" in result
         assert "," in result
+
+
+def _records(count):
+    for i in range(count):
+        people = [
+            Researcher("Doe", "Jane", "J", f"Lab {i}, jane{i}@x.org", f"jane{i}@x.org"),
+            Researcher("Roe", "Rick", "R", 'Dept "A", Uni', None),
+        ]
+        yield ArticleRecord(f"Title {i}", "eng", "2023-Jan-02", {f"jane{i}@x.org"}, people, str(i))
+
+
+class TestWriters:
+    """Test the streaming writers for each output format."""
+
+    def _write(self, articles, outputFormat):
+        out = io.StringIO()
+        writeArticles(articles, out, outputFormat)
+        return out.getvalue()
+
+    def test_markdown_matches_overview(self):
+        """Test markdown output is the overviewFormat text."""
+        assert self._write(_records(3), "markdown") == overviewFormat(list(_records(3)))
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_json(self, fast):
+        """Test JSON output with and without the optional fast encoder."""
+        if fast:
+            pytest.importorskip("orjson")
+        with nullcontext() if fast else patch("format.orjson", None):
+            data = json.loads(self._write(_records(2), "json"))
+        assert [a["pmid"] for a in data] == ["0", "1"]
+        assert data[0]["emails"] == ["jane0@x.org"]
+        assert data[0]["authors"][1] == {
+            "lastName": "Roe", "firstName": "Rick", "initials": "R",
+            "affiliation": 'Dept "A", Uni', "email": None,
+        }
+        assert json.loads(self._write([], "json")) == []
+
+    def test_ndjson(self):
+        """Test one JSON document per line."""
+        lines = self._write(_records(3), "ndjson").splitlines()
+        assert [json.loads(line)["title"] for line in lines] == ["Title 0", "Title 1", "Title 2"]
+
+    def test_csv_has_a_row_per_author(self):
+        """Test CSV rows are per author, quoted, with a row for authorless articles."""
+        articles = list(_records(2)) + [ArticleRecord("Bare", None, None, set(), [], "9")]
+        rows = list(csv.DictReader(io.StringIO(self._write(articles, "csv"))))
+        assert [(r["pmid"], r["lastName"]) for r in rows] == [
+            ("0", "Doe"), ("0", "Roe"), ("1", "Doe"), ("1", "Roe"), ("9", ""),
+        ]
+        assert rows[1]["affiliation"] == 'Dept "A", Uni'
+        assert rows[0]["email"] == "jane0@x.org"
+        assert self._write([], "csv").splitlines() == [
+            "pmid,title,date,lastName,firstName,initials,affiliation,email"
+        ]
+
+    @pytest.mark.parametrize("outputFormat,expected", [
+        ("markdown", "a@x.org, b@x.org"),
+        ("json", '["a@x.org","b@x.org"]\n'),
+        ("ndjson", '"a@x.org"\n"b@x.org"\n'),
+        ("csv", "email\na@x.org\nb@x.org\n"),
+    ])
+    def test_emails(self, outputFormat, expected):
+        """Test email lists in each format."""
+        out = io.StringIO()
+        writeEmails(["a@x.org", "b@x.org"], out, outputFormat)
+        assert out.getvalue() == expected
+        assert "".join(emailChunks(["a@x.org", "b@x.org"], outputFormat)) == expected
+
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize("outputFormat", ["markdown", "json", "ndjson", "csv"])
+    def test_ten_thousand_articles(self, outputFormat):
+        """Benchmark: 10k articles are formatted quickly."""
+        articles = list(_records(10_000))
+        start = time.perf_counter()
+        self._write(articles, outputFormat)
+        assert time.perf_counter() - start < 2
+
+    @pytest.mark.parametrize("outputFormat", ["markdown", "json", "ndjson", "csv"])
+    def test_constant_memory(self, outputFormat):
+        """Test streaming to a file holds no more than one article at a time."""
+        def peak(count):
+            with open(os.devnull, "w") as out:
+                tracemalloc.start()
+                writeArticles(_records(count), out, outputFormat)
+                size = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            return size
+
+        # The first run of a format can allocate one-off caches inside the
+        # traced window; the second run of two never does
+        assert min(peak(5_000), peak(5_000)) < peak(500) + 64 * 1024
+
+
+class TestBatchChunks:
+    """Test batch output stays grouped per query."""
+
+    def _results(self):
+        articles = list(_records(2))
+        return [("cancer", articles), ("tumor", articles[1:]), ("rare", [])]
+
+    def test_markdown(self):
+        """Test a heading per query and the empty text for queries without results."""
+        text = "".join(batchChunks(self._results(), empty="Nothing."))
+        assert text.startswith("# Query: cancer\n\n##  Article Overview")
+        assert text.count("##  Article Overview") == 3
+        assert text.endswith("# Query: rare\n\nNothing.\n\n")
+
+    def test_json(self):
+        """Test one object per query holding its articles."""
+        data = json.loads("".join(batchChunks(self._results(), "json")))
+        assert [(d["query"], len(d["articles"])) for d in data] == [
+            ("cancer", 2), ("tumor", 1), ("rare", 0)
+        ]
+        assert data[1]["articles"][0]["pmid"] == "1"
+
+    def test_csv(self):
+        """Test CSV rows carry their query."""
+        text = "".join(batchChunks(self._results(), "csv"))
+        rows = list(csv.DictReader(io.StringIO(text)))
+        assert [(r["query"], r["pmid"]) for r in rows] == [
+            ("cancer", "0"), ("cancer", "0"), ("cancer", "1"), ("cancer", "1"),
+            ("tumor", "1"), ("tumor", "1"),
+        ]
+
+    def test_emails(self):
+        """Test email lists per query in CSV and NDJSON."""
+        results = [("cancer", ["a@x.org", "b@x.org"]), ("rare", [])]
+        assert "".join(batchChunks(results, "csv", emails=True)) == (
+            "query,email\ncancer,a@x.org\ncancer,b@x.org\n"
+        )
+        lines = "".join(batchChunks(results, "ndjson", emails=True)).splitlines()
+        assert [json.loads(line) for line in lines] == [
+            {"query": "cancer", "emails": ["a@x.org", "b@x.org"]},
+            {"query": "rare", "emails": []},
+        ]
@@ -1,17 +1,31 @@
+import os
+import subprocess
+import sys
+import pytest
 from unittest.mock import patch, MagicMock
 from main import main
 
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Microseconds `import main` may take; loading the services costs over 100ms
+IMPORT_BUDGET = 75_000
+
 
 class TestMain:
     """Test the main function."""
 
-    @patch('main.getSummary')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_overview_mode(self, mock_parse_args, mock_get_summary):
+    def test_main_overview_mode(self, mock_parse_args, mock_get_summary, capsys):
         """Test main function in overview mode."""
         # Setup mock arguments
         mock_args = MagicMock()
         mock_args.mode = "overview"
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
+        mock_args.workers = None
         mock_args.searchterm = "cancer"
         mock_args.sortby = "relevance"
         mock_args.email = "test@example.com"
@@ -20,27 +34,33 @@ class TestMain:
 
         # Setup mock summary response
         expected_summary = "## Article Overview\n**Title:** Test Article..."
-        mock_get_summary.return_value = expected_summary
+        mock_get_summary.return_value = [expected_summary]
 
         # Call main function
-        result = main()
+        main()
 
         # Verify calls
         mock_parse_args.assert_called_once()
         mock_get_summary.assert_called_once_with(
-            "cancer", "relevance", "test@example.com", 10
+            "cancer", "relevance", "test@example.com", 10, workers=None,
+            outputFormat="markdown", session=None
         )
 
-        # Verify return value
-        assert result == expected_summary
+        # Verify printed output
+        assert capsys.readouterr().out == expected_summary + "\n"
 
-    @patch('main.getEmails')
+    @patch('services.iterEmails')
     @patch('main.ParseArgs')
-    def test_main_emails_mode(self, mock_parse_args, mock_get_emails):
+    def test_main_emails_mode(self, mock_parse_args, mock_get_emails, capsys):
         """Test main function in emails mode."""
         # Setup mock arguments
         mock_args = MagicMock()
         mock_args.mode = "emails"
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
         mock_args.searchterm = "diabetes"
         mock_args.sortby = "pub_date"
         mock_args.email = "researcher@university.edu"
@@ -49,117 +69,146 @@ class TestMain:
 
         # Setup mock emails response
         expected_emails = "author1@example.com, author2@example.com"
-        mock_get_emails.return_value = expected_emails
+        mock_get_emails.return_value = [expected_emails]
 
         # Call main function
-        result = main()
+        main()
 
         # Verify calls
         mock_parse_args.assert_called_once()
         mock_get_emails.assert_called_once_with(
-            "diabetes", "pub_date", "researcher@university.edu", 25
+            "diabetes", "pub_date", "researcher@university.edu", 25,
+            outputFormat="markdown", session=None
         )
 
-        # Verify return value
-        assert result == expected_emails
+        # Verify printed output
+        assert capsys.readouterr().out == expected_emails + "\n"
 
-    @patch('main.getSummary')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_default_overview_mode(self, mock_parse_args, mock_get_summary):
+    def test_main_default_overview_mode(self, mock_parse_args, mock_get_summary, capsys):
         """Test main function defaults to overview mode when not specified."""
         # Setup mock arguments (mode defaults to "overview")
         mock_args = MagicMock()
         mock_args.mode = "overview"  # This is the default
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
         mock_args.searchterm = "heart disease"
         mock_args.sortby = "relevance"
         mock_args.email = ""
         mock_args.searchnumber = 10
         mock_parse_args.return_value = mock_args
 
-        mock_get_summary.return_value = "summary result"
+        mock_get_summary.return_value = ["summary result"]
 
         # Call main function
-        result = main()
+        main()
 
         # Verify getSummary is called (not getEmails)
         mock_get_summary.assert_called_once()
-        assert result == "summary result"
+        assert capsys.readouterr().out == "summary result" + "\n"
 
-    @patch('builtins.print')
-    @patch('main.getSummary')
+    @patch('main.sys.stdout')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_prints_output_overview(self, mock_parse_args, mock_get_summary, mock_print):
-        """Test that main function prints the output for overview mode."""
+    def test_main_prints_output_overview(self, mock_parse_args, mock_get_summary, mock_stdout):
+        """Test that main writes and flushes each overview chunk as it arrives."""
         # Setup mocks
         mock_args = MagicMock()
         mock_args.mode = "overview"
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
+        mock_args.workers = None
         mock_args.searchterm = "test"
         mock_args.sortby = "relevance"
         mock_args.email = "test@example.com"
         mock_args.searchnumber = 5
         mock_parse_args.return_value = mock_args
 
-        expected_output = "Test summary output"
-        mock_get_summary.return_value = expected_output
+        written = []
+
+        def chunks():
+            for chunk in ["first article", "second article"]:
+                yield chunk
+                # The previous chunk is already out before the next is parsed
+                written.append(mock_stdout.flush.call_count)
+
+        mock_get_summary.return_value = chunks()
 
         # Call main function
-        result = main()
+        main()
 
-        # Verify print was called with the output
-        mock_print.assert_called_once_with(expected_output)
-        assert result == expected_output
+        # Verify each chunk was written and flushed on its own
+        assert written == [1, 2]
+        assert [c.args[0] for c in mock_stdout.write.call_args_list] == [
+            "first article", "second article", "\n"
+        ]
 
-    @patch('builtins.print')
-    @patch('main.getEmails')
+    @patch('services.iterEmails')
     @patch('main.ParseArgs')
-    def test_main_prints_output_emails(self, mock_parse_args, mock_get_emails, mock_print):
+    def test_main_prints_output_emails(self, mock_parse_args, mock_get_emails, capsys):
         """Test that main function prints the output for emails mode."""
         # Setup mocks
         mock_args = MagicMock()
         mock_args.mode = "emails"
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
         mock_args.searchterm = "test"
         mock_args.sortby = "relevance"
         mock_args.email = "test@example.com"
         mock_args.searchnumber = 5
         mock_parse_args.return_value = mock_args
 
-        expected_output = "test1@example.com, test2@example.com"
-        mock_get_emails.return_value = expected_output
+        mock_get_emails.return_value = ["test1@example.com", ", test2@example.com"]
 
         # Call main function
-        result = main()
+        main()
 
-        # Verify print was called with the output
-        mock_print.assert_called_once_with(expected_output)
-        assert result == expected_output
+        # Verify the chunks add up to the full output
+        assert capsys.readouterr().out == "test1@example.com, test2@example.com\n"
 
-    @patch('main.getSummary')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_with_empty_email(self, mock_parse_args, mock_get_summary):
+    def test_main_with_empty_email(self, mock_parse_args, mock_get_summary, capsys):
         """Test main function with empty email parameter."""
         # Setup mock arguments with empty email
         mock_args = MagicMock()
         mock_args.mode = "overview"
+        mock_args.format = "markdown"
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
+        mock_args.workers = None
         mock_args.searchterm = "covid"
         mock_args.sortby = "pub_date"
         mock_args.email = ""  # Empty email
         mock_args.searchnumber = 15
         mock_parse_args.return_value = mock_args
 
-        mock_get_summary.return_value = "empty email summary"
+        mock_get_summary.return_value = ["empty email summary"]
 
         # Call main function
-        result = main()
+        main()
 
         # Verify getSummary is called with empty email
         mock_get_summary.assert_called_once_with(
-            "covid", "pub_date", "", 15
+            "covid", "pub_date", "", 15, workers=None, outputFormat="markdown", session=None
         )
-        assert result == "empty email summary"
+        assert capsys.readouterr().out == "empty email summary" + "\n"
 
-    @patch('main.getEmails')
+    @patch('services.iterEmails')
     @patch('main.ParseArgs')
-    def test_main_different_sort_options(self, mock_parse_args, mock_get_emails):
+    def test_main_different_sort_options(self, mock_parse_args, mock_get_emails, capsys):
         """Test main function with different sort options."""
         sort_options = ["relevance", "pub_date", "Author", "JournalName"]
 
@@ -171,26 +220,31 @@ class TestMain:
             # Setup mock arguments
             mock_args = MagicMock()
             mock_args.mode = "emails"
+            mock_args.format = "markdown"
+            mock_args.profile = None
+            mock_args.input_file = None
+            mock_args.local = True
+            mock_args.serve = False
             mock_args.searchterm = "test"
             mock_args.sortby = sort_option
             mock_args.email = "test@example.com"
             mock_args.searchnumber = 10
             mock_parse_args.return_value = mock_args
 
-            mock_get_emails.return_value = f"emails for {sort_option}"
+            mock_get_emails.return_value = [f"emails for {sort_option}"]
 
             # Call main function
-            result = main()
+            main()
 
             # Verify correct sort option is passed
             mock_get_emails.assert_called_once_with(
-                "test", sort_option, "test@example.com", 10
+                "test", sort_option, "test@example.com", 10, outputFormat="markdown", session=None
             )
-            assert result == f"emails for {sort_option}"
+            assert capsys.readouterr().out == f"emails for {sort_option}" + "\n"
 
-    @patch('main.getSummary')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_complex_search_term(self, mock_parse_args, mock_get_summary):
+    def test_main_complex_search_term(self, mock_parse_args, mock_get_summary, capsys):
         """Test main function with complex search terms."""
         complex_terms = [
             "cancer AND therapy",
@@ -207,26 +261,33 @@ class TestMain:
             # Setup mock arguments
             mock_args = MagicMock()
             mock_args.mode = "overview"
+            mock_args.format = "markdown"
+            mock_args.profile = None
+            mock_args.input_file = None
+            mock_args.local = True
+            mock_args.serve = False
+            mock_args.workers = None
             mock_args.searchterm = term
             mock_args.sortby = "relevance"
             mock_args.email = "test@example.com"
             mock_args.searchnumber = 10
             mock_parse_args.return_value = mock_args
 
-            mock_get_summary.return_value = f"summary for {term}"
+            mock_get_summary.return_value = [f"summary for {term}"]
 
             # Call main function
-            result = main()
+            main()
 
             # Verify correct search term is passed
             mock_get_summary.assert_called_once_with(
-                term, "relevance", "test@example.com", 10
+                term, "relevance", "test@example.com", 10, workers=None,
+                outputFormat="markdown", session=None
             )
-            assert result == f"summary for {term}"
+            assert capsys.readouterr().out == f"summary for {term}" + "\n"
 
-    @patch('main.getSummary')
+    @patch('services.iterSummary')
     @patch('main.ParseArgs')
-    def test_main_different_search_numbers(self, mock_parse_args, mock_get_summary):
+    def test_main_different_search_numbers(self, mock_parse_args, mock_get_summary, capsys):
         """Test main function with different search numbers."""
         search_numbers = [1, 5, 10, 25, 100]
 
@@ -238,22 +299,163 @@ class TestMain:
             # Setup mock arguments
             mock_args = MagicMock()
             mock_args.mode = "overview"
+            mock_args.format = "markdown"
+            mock_args.profile = None
+            mock_args.input_file = None
+            mock_args.local = True
+            mock_args.serve = False
+            mock_args.workers = None
             mock_args.searchterm = "test"
             mock_args.sortby = "relevance"
             mock_args.email = "test@example.com"
             mock_args.searchnumber = num
             mock_parse_args.return_value = mock_args
 
-            mock_get_summary.return_value = f"summary for {num} results"
+            mock_get_summary.return_value = [f"summary for {num} results"]
 
             # Call main function
-            result = main()
+            main()
 
             # Verify correct search number is passed
             mock_get_summary.assert_called_once_with(
-                "test", "relevance", "test@example.com", num
+                "test", "relevance", "test@example.com", num, workers=None,
+                outputFormat="markdown", session=None
             )
-            assert result == f"summary for {num} results"
+            assert capsys.readouterr().out == f"summary for {num} results" + "\n"
+
+
+def _python(*args):
+    return subprocess.run(
+        [sys.executable, *args], cwd=CLI_DIR, capture_output=True, text=True, check=True
+    )
+
+
+class TestBatch:
+    """Test main in batch mode."""
+
+    @patch('services.iterBatch')
+    @patch('main.ParseArgs')
+    def test_input_file(self, mock_parse_args, mock_iter_batch, tmp_path, capsys):
+        """Test every term in the input file goes into one batch."""
+        path = tmp_path / "queries.txt"
+        path.write_text("cancer\n\n# skipped\n  heart failure  \n")
+        mock_args = MagicMock()
+        mock_args.mode = "emails"
+        mock_args.format = "csv"
+        mock_args.profile = None
+        mock_args.input_file = str(path)
+        mock_args.local = True
+        mock_args.serve = False
+        mock_args.searchterm = "diabetes"
+        mock_args.sortby = "relevance"
+        mock_args.email = ""
+        mock_args.searchnumber = 10
+        mock_args.jobs = 4
+        mock_args.workers = None
+        mock_parse_args.return_value = mock_args
+        mock_iter_batch.return_value = ["query,email\n"]
+
+        main()
+
+        mock_iter_batch.assert_called_once_with(
+            ["diabetes", "cancer", "heart failure"], "relevance", "", 10, mode="emails",
+            jobs=4, workers=None, outputFormat="csv", session=None,
+        )
+        assert capsys.readouterr().out == "query,email\n"
+
+
+class TestFormats:
+    """Test the output ends where the chosen format ends."""
+
+    @pytest.mark.parametrize("outputFormat,chunks", [
+        ("json", ["[", '{"pmid":"1"}', "]\n"]),
+        ("ndjson", ['{"pmid":"1"}\n', '{"pmid":"2"}\n']),
+        ("csv", ["pmid\n", "1\n"]),
+    ])
+    @patch('services.iterSummary')
+    @patch('main.ParseArgs')
+    def test_no_trailing_blank_line(self, mock_parse_args, mock_iter_summary, outputFormat,
+                                    chunks, capsys):
+        """Test only markdown gets a final newline added after the last chunk."""
+        mock_args = MagicMock()
+        mock_args.mode = "overview"
+        mock_args.format = outputFormat
+        mock_args.profile = None
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
+        mock_args.searchterm = "cancer"
+        mock_parse_args.return_value = mock_args
+        mock_iter_summary.return_value = iter(chunks)
+
+        main()
+
+        assert capsys.readouterr().out == "".join(chunks)
+
+
+class TestStartup:
+    """Test the CLI starts without loading the search stack."""
+
+    def test_help_skips_heavy_imports(self):
+        """Test --help exits before lxml, entrezpy or the services are imported."""
+        result = _python("-c", (
+            "import sys\n"
+            "sys.argv = ['main', '--help']\n"
+            "import main\n"
+            "try:\n"
+            "    main.main()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "heavy = ('lxml', 'entrezpy', 'services', 'pipeline', 'asyncio')\n"
+            "print(sorted(name for name in heavy if name in sys.modules))\n"
+        ))
+        assert "usage:" in result.stdout
+        assert result.stdout.strip().endswith("[]")
+
+    def test_services_skip_asyncio(self):
+        """Test the CLI search path does not import asyncio or the async client."""
+        result = _python("-c", (
+            "import sys, services\n"
+            "print(sorted(n for n in ('asyncio', 'eutils') if n in sys.modules))"
+        ))
+        assert result.stdout.strip() == "[]"
+
+    @pytest.mark.benchmark
+    def test_import_time_budget(self):
+        """Benchmark: importing main stays within the import-time budget."""
+        result = _python("-X", "importtime", "-c", "import main")
+        # Lines are "import time: self | cumulative | name", innermost first
+        line = [line for line in result.stderr.splitlines() if line.endswith("| main")][-1]
+        cumulative = int(line.split("|")[1])
+        assert cumulative < IMPORT_BUDGET
+
+
+class TestProfile:
+    """Test the --profile report."""
+
+    @patch('services.iterSummary')
+    @patch('main.ParseArgs')
+    def test_profile_report(self, mock_parse_args, mock_get_summary, tmp_path, capsys):
+        """Test stage timings and the cProfile table are written to the path."""
+        path = tmp_path / "profile.txt"
+        mock_args = MagicMock()
+        mock_args.mode = "overview"
+        mock_args.format = "markdown"
+        mock_args.profile = str(path)
+        mock_args.input_file = None
+        mock_args.local = True
+        mock_args.serve = False
+        mock_parse_args.return_value = mock_args
+        mock_get_summary.return_value = ["first", "second"]
+
+        main()
+
+        assert capsys.readouterr().out == "firstsecond\n"
+        report = path.read_text()
+        stages = report.split("\n\n")[0].splitlines()
+        assert stages[0] == "Stage timings (seconds)"
+        assert [line.split()[0] for line in stages[1:]] == ["import", "first", "output", "total"]
+        assert "cumulative" in report
 
 
 class TestMainEntryPoint:
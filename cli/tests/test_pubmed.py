@@ -1,8 +1,8 @@
 import pytest
 from unittest.mock import MagicMock, patch
-from pipeline import Pipeline
+from pipeline import Pipeline, WindowEfetcher
 from article import ArticleRecord, ArticleResult
-from analyzer import ArticleAnalyzer
+from analyzer import ArticleAnalyzer, EmailAnalyzer
 from researcher import Researcher
 from parsing import (
     parse_xml,
@@ -456,3 +456,474 @@ def test_researcher_full_initialization():
     assert r.initials == "AJ"
     assert r.affiliation == "MIT"
     assert r.email == "alice@mit.edu"
+
+# ---------- Streaming Parse Tests ----------
+
+def _streaming_request():
+    request = MagicMock()
+    request.eutil = "efetch"
+    request.query_id = "q1"
+    request.db = "pubmed"
+    request.retmode = "xml"
+    return request
+
+def _article_set(sample_article_xml, count):
+    articles = [
+        sample_article_xml.replace(b"<PMID>123</PMID>", f"<PMID>{i}</PMID>".encode())
+        for i in range(count)
+    ]
+    return b"<PubmedArticleSet>" + b"".join(articles) + b"</PubmedArticleSet>"
+
+def test_iter_articles_small_chunks(sample_article_xml):
+    """Articles split across many tiny chunks are still emitted whole and in order"""
+    from parsing import iter_articles, iter_chunks
+    import io
+
+    payload = _article_set(sample_article_xml, 5)
+    pmids = [
+        article.findtext(".//PMID")
+        for article in iter_articles(iter_chunks(io.BytesIO(payload), size=7))
+    ]
+    assert pmids == ["0", "1", "2", "3", "4"]
+
+def test_iter_articles_releases_processed_articles(sample_article_xml):
+    """Processed articles are removed from the tree so memory stays flat"""
+    from parsing import iter_articles, iter_chunks
+    import io
+
+    payload = _article_set(sample_article_xml, 50)
+    for article in iter_articles(iter_chunks(io.BytesIO(payload), size=256)):
+        assert article.getprevious() is None
+
+def test_analyzer_streaming_matches_full_parse(sample_article_xml):
+    import io
+
+    payload = _article_set(sample_article_xml, 3)
+
+    class DummyResponse:
+        def getvalue(self):
+            return payload
+
+    full = ArticleAnalyzer()
+    full.analyze_result(DummyResponse(), _streaming_request())
+
+    streaming = ArticleAnalyzer(streaming=True)
+    streaming.parse(io.BytesIO(payload), _streaming_request())
+
+    assert streaming.result.size() == 3
+    assert [repr(a) for a in streaming.result.articles] == [
+        repr(a) for a in full.result.articles
+    ]
+
+def test_analyzer_streaming_error_response():
+    import io
+
+    analyzer = ArticleAnalyzer(streaming=True)
+    request = _streaming_request()
+    request.dump.return_value = {"test": "data"}
+    analyzer.parse(io.BytesIO(b"<eFetchResult><ERROR>Bad ID</ERROR></eFetchResult>"), request)
+
+    assert analyzer.hasErrorResponse is True
+    assert analyzer.result.isEmpty() is True
+
+# ---------- Emails-only Analyzer Tests ----------
+
+def test_email_analyzer_matches_full_parse(sample_article_xml):
+    import io
+
+    payload = _article_set(sample_article_xml, 4)
+
+    full = ArticleAnalyzer(streaming=True)
+    full.parse(io.BytesIO(payload), _streaming_request())
+
+    emails_only = EmailAnalyzer(streaming=True)
+    emails_only.parse(io.BytesIO(payload), _streaming_request())
+
+    assert [(a.pmid, a.emails) for a in emails_only.result.articles] == [
+        (a.pmid, a.emails) for a in full.result.articles
+    ]
+    assert emails_only.result.articles[0].people == []
+
+def test_email_analyzer_small_chunks(sample_article_xml):
+    """Articles split across chunk boundaries are reassembled before parsing"""
+    from parsing import iter_chunks, iter_email_records
+    import io
+
+    payload = _article_set(sample_article_xml, 5)
+    records = list(iter_email_records(iter_chunks(io.BytesIO(payload), size=7)))
+    assert [pmid for _, (pmid, _) in records] == ["0", "1", "2", "3", "4"]
+    assert all(emails == {"test@example.com"} for _, (_, emails) in records)
+
+def test_email_analyzer_whole_response(sample_article_xml):
+    import io
+
+    payload = _article_set(sample_article_xml, 2)
+
+    analyzer = EmailAnalyzer()
+    # entrezpy's convert_response hands over the decoded body as a StringIO
+    analyzer.analyze_result(io.StringIO(payload.decode()), _streaming_request())
+    assert analyzer.result.size() == 2
+    assert all(a.emails == {"test@example.com"} for a in analyzer.result.articles)
+
+def test_email_analyzer_non_streaming_parse(sample_article_xml):
+    import io
+
+    payload = _article_set(sample_article_xml, 2)
+
+    analyzer = EmailAnalyzer()
+    analyzer.parse(io.BytesIO(payload), _streaming_request())
+    assert [a.pmid for a in analyzer.result.articles] == ["0", "1"]
+
+def test_email_analyzer_error_response():
+    import io
+
+    analyzer = EmailAnalyzer(streaming=True)
+    request = _streaming_request()
+    request.dump.return_value = {"test": "data"}
+    analyzer.parse(io.BytesIO(b"<eFetchResult><ERROR>Bad ID</ERROR></eFetchResult>"), request)
+
+    assert analyzer.hasErrorResponse is True
+    assert analyzer.result.isEmpty() is True
+
+# ---------- Parallel Parse Tests ----------
+
+def test_iter_article_shards(sample_article_xml):
+    from parsing import iter_article_shards
+
+    payload = _article_set(sample_article_xml, 5)
+    chunks = [payload[i:i + 50] for i in range(0, len(payload), 50)]
+    shards = [data for kind, data in iter_article_shards(chunks, size=2) if kind == "shard"]
+    assert [len(shard) for shard in shards] == [2, 2, 1]
+    assert all(article.startswith(b"<PubmedArticle>") for shard in shards for article in shard)
+
+def test_analyzer_parallel_matches_full_parse(sample_article_xml, monkeypatch):
+    import io
+    import parsing
+
+    monkeypatch.setattr(parsing, "SHARD_SIZE", 2)
+    payload = _article_set(sample_article_xml, 7)
+
+    # entrezpy's convert_response hands over the decoded body as a StringIO
+    full = ArticleAnalyzer()
+    full.analyze_result(io.StringIO(payload.decode()), _streaming_request())
+
+    parallel = ArticleAnalyzer(workers=2)
+    parallel.analyze_result(io.StringIO(payload.decode()), _streaming_request())
+
+    streaming = ArticleAnalyzer(streaming=True, workers=2)
+    streaming.parse(io.BytesIO(payload), _streaming_request())
+
+    expected = [repr(a) for a in full.result.articles]
+    assert [repr(a) for a in parallel.result.articles] == expected
+    assert [repr(a) for a in streaming.result.articles] == expected
+
+def test_analyzer_parallel_error_response():
+    import io
+
+    analyzer = ArticleAnalyzer(streaming=True, workers=2)
+    request = _streaming_request()
+    request.dump.return_value = {"test": "data"}
+    analyzer.parse(io.BytesIO(b"<eFetchResult><ERROR>Bad ID</ERROR></eFetchResult>"), request)
+
+    assert analyzer.hasErrorResponse is True
+    assert analyzer.result.isEmpty() is True
+
+def test_spawned_batches_share_one_pool_and_split_across_workers(sample_article_xml):
+    import io
+    import analyzer as analyzer_module
+
+    parent = ArticleAnalyzer(streaming=True, workers=2)
+    batches = [parent.spawn(batch_size=5), parent.spawn(batch_size=5)]
+    assert [batch.shard_size for batch in batches] == [3, 3]
+    assert parent.spawn().shard_size is None
+
+    pool = analyzer_module.get_parse_pool(2)
+    with patch.object(pool, "submit", wraps=pool.submit) as submit:
+        for batch in batches:
+            batch.parse(io.BytesIO(_article_set(sample_article_xml, 5)), _streaming_request())
+    assert [len(call.args[1]) for call in submit.call_args_list] == [3, 2, 3, 2]
+    assert analyzer_module.get_parse_pool(2) is pool
+    assert [a.pmid for a in batches[0].result.articles] == ["0", "1", "2", "3", "4"]
+
+# ---------- Lazy Record Tests ----------
+
+def test_lazy_record_matches_article_record(sample_article_xml):
+    from article import LazyArticleRecord
+
+    article = parse_xml(MagicMock(getvalue=lambda: sample_article_xml))
+    eager = ArticleAnalyzer().build_record(article)
+    for source in (article, sample_article_xml):
+        lazy = LazyArticleRecord(source)
+        assert [repr(getattr(lazy, f)) for f in LazyArticleRecord.fields] == [
+            repr(getattr(eager, f)) for f in LazyArticleRecord.fields
+        ]
+
+def test_lazy_record_parses_on_first_access(sample_article_xml):
+    from article import LazyArticleRecord
+
+    lazy = LazyArticleRecord(sample_article_xml)
+    assert not hasattr(lazy, "_element")
+    assert lazy.pmid == "123"
+    assert hasattr(lazy, "_element")
+    assert not hasattr(lazy, "_people")
+
+def test_lazy_record_shares_author_pass(sample_article_xml):
+    from article import LazyArticleRecord
+
+    lazy = LazyArticleRecord(sample_article_xml)
+    with patch("parsing.ArticleExtractor.authors_and_emails", autospec=True,
+               side_effect=lambda self, article: ({"x@y.org"}, [])) as authors:
+        assert lazy.emails == {"x@y.org"}
+        assert lazy.people == []
+    authors.assert_called_once()
+
+def test_lazy_record_new_fields(sample_article_xml):
+    from article import LazyArticleRecord
+
+    lazy = LazyArticleRecord(sample_article_xml)
+    assert lazy.abstract is None
+    assert lazy.mesh_terms == []
+    assert lazy.journal is None
+
+def test_analyzer_lazy_streaming(sample_article_xml):
+    import io
+    from article import LazyArticleRecord
+
+    payload = _article_set(sample_article_xml, 3)
+
+    eager = ArticleAnalyzer(streaming=True)
+    eager.parse(io.BytesIO(payload), _streaming_request())
+
+    lazy = ArticleAnalyzer(streaming=True, lazy=True)
+    lazy.parse(io.BytesIO(payload), _streaming_request())
+
+    assert all(isinstance(a, LazyArticleRecord) for a in lazy.result.articles)
+    assert [a.source for a in lazy.result.articles][0].startswith(b"<PubmedArticle>")
+    assert [(a.pmid, a.title, a.emails) for a in lazy.result.articles] == [
+        (a.pmid, a.title, a.emails) for a in eager.result.articles
+    ]
+
+def test_analyzer_lazy_whole_response(sample_article_xml):
+    from article import LazyArticleRecord
+
+    payload = _article_set(sample_article_xml, 2)
+
+    class DummyResponse:
+        def getvalue(self):
+            return payload
+
+    analyzer = ArticleAnalyzer(lazy=True, workers=2)
+    analyzer.analyze_result(DummyResponse(), _streaming_request())
+    assert all(isinstance(a, LazyArticleRecord) for a in analyzer.result.articles)
+    assert [a.pmid for a in analyzer.result.articles] == ["0", "1"]
+
+# ---------- Batched Fetch Tests ----------
+
+def _batched_pipeline(inquire):
+    with patch("pipeline.Conduit") as mock_conduit:
+        search = MagicMock(uids=[str(i) for i in range(10)])
+        mock_conduit.return_value.get_result.return_value = search
+        pl = Pipeline(email="test@example.com", rateLimiter=MagicMock())
+    pl.addSearch("cancer", "relevance", 10)
+    pl.addFetch(analyzer=ArticleAnalyzer(), batchSize=3)
+    with patch("pipeline.Efetcher") as efetcher:
+        efetcher.return_value.inquire.side_effect = inquire
+        return pl, pl.getResults()
+
+def _fill(parameter, analyzer):
+    analyzer.init_result(None, _streaming_request())
+    for pmid in parameter["id"]:
+        analyzer.result.add_article_record(ArticleRecord("T", "eng", "", set(), [], pmid))
+    return analyzer
+
+def test_pipeline_batched_fetch_keeps_order():
+    import time
+
+    def inquire(parameter, analyzer):
+        # Later batches finish first
+        time.sleep(0.01 * (10 - int(parameter["id"][0])) / 3)
+        return _fill(parameter, analyzer)
+
+    pl, result = _batched_pipeline(inquire)
+    assert [a.pmid for a in result.articles] == [str(i) for i in range(10)]
+    # One esearch and four efetch batches
+    assert pl.rateLimiter.wait.call_count == 5
+
+def test_pipeline_batched_fetch_retries_failed_batch():
+    attempts = []
+
+    def inquire(parameter, analyzer):
+        attempts.append(parameter["id"])
+        if parameter["id"] == ["3", "4", "5"] and attempts.count(["3", "4", "5"]) == 1:
+            return None
+        return _fill(parameter, analyzer)
+
+    _, result = _batched_pipeline(inquire)
+    assert [a.pmid for a in result.articles] == [str(i) for i in range(10)]
+    assert attempts.count(["3", "4", "5"]) == 2
+    assert attempts.count(["0", "1", "2"]) == 1
+
+def test_pipeline_batched_fetch_gives_up():
+    with pytest.raises(RuntimeError, match="efetch failed for 3 PMIDs"):
+        _batched_pipeline(lambda parameter, analyzer: None if parameter["id"][0] == "6" else _fill(parameter, analyzer))
+
+def test_pipeline_sends_callers_email_over_shared_conduit():
+    conduit = MagicMock(email="shared@example.com", tool="scholarseek", apikey=None)
+    pl = Pipeline(email="me@example.com", rateLimiter=MagicMock(), conduit=conduit)
+    with patch("pipeline.Conduit") as standalone:
+        standalone.return_value.get_result.return_value = MagicMock(uids=["1"])
+        assert pl.runSearch({"db": "pubmed", "term": "cancer"}) == ["1"]
+    standalone.assert_called_once_with("me@example.com")
+
+    fetcher = MagicMock()
+    fetcher.return_value.inquire.side_effect = _fill
+    pl.fetchBatch({"db": "pubmed", "id": ["1"]}, ArticleAnalyzer(), fetcherClass=fetcher)
+    fetcher.assert_called_once_with("scholarseek", "me@example.com", None)
+
+def test_fetch_backoff_grows_and_is_capped(monkeypatch):
+    from pipeline import _backoff, _transient
+    from eutils import EutilsError
+
+    monkeypatch.setattr("pipeline.FETCH_BACKOFF", 0.5)
+    with patch("pipeline.random.uniform", side_effect=lambda low, high: high):
+        assert [_backoff(attempt) for attempt in (1, 2, 3, 10)] == [0.5, 1.0, 2.0, 8]
+    assert 0 <= _backoff(3) <= 2.0
+    assert _transient(OSError("reset"))
+    assert _transient(EutilsError("efetch", 429, "slow down"))
+    assert _transient(EutilsError("efetch", 503, "busy"))
+    assert not _transient(EutilsError("efetch", 400, "bad query"))
+
+# ---------- History Server Tests ----------
+
+def _history_pipeline(inquire, count=10, retmax=20000, batchSize=4, useHistory=None):
+    with patch("pipeline.Conduit") as mock_conduit:
+        search = MagicMock(count=count)
+        search.get_link_parameter.return_value = {"WebEnv": "NCID_1", "query_key": "1", "retmax": count}
+        mock_conduit.return_value.get_result.return_value = search
+        pl = Pipeline(email="test@example.com", rateLimiter=MagicMock())
+    pl.addSearch("cancer", "relevance", retmax, useHistory=useHistory)
+    pl.addFetch(analyzer=ArticleAnalyzer(), batchSize=batchSize)
+    with patch("pipeline.WindowEfetcher") as efetcher:
+        efetcher.return_value.inquire.side_effect = inquire
+        return pl, pl.getResults()
+
+def _fill_window(parameter, analyzer):
+    analyzer.init_result(None, _streaming_request())
+    start = parameter["retstart"]
+    for pmid in range(start, start + parameter["retmax"]):
+        analyzer.result.add_article_record(ArticleRecord("T", "eng", "", set(), [], str(pmid)))
+    return analyzer
+
+def test_pipeline_history_search_for_large_retmax():
+    windows = []
+
+    def inquire(parameter, analyzer):
+        windows.append((parameter["retstart"], parameter["retmax"]))
+        assert parameter["WebEnv"] == "NCID_1" and parameter["query_key"] == "1"
+        return _fill_window(parameter, analyzer)
+
+    pl, result = _history_pipeline(inquire)
+    query = pl.pipeline.add_search.call_args[0][0]
+    assert query["usehistory"] is True and query["retmax"] == 0 and query["rettype"] is None
+    assert sorted(windows) == [(0, 4), (4, 4), (8, 2)]
+    assert [a.pmid for a in result.articles] == [str(i) for i in range(10)]
+
+def test_pipeline_history_stops_at_retmax():
+    _, result = _history_pipeline(_fill_window, count=50, retmax=6, useHistory=True)
+    assert [a.pmid for a in result.articles] == [str(i) for i in range(6)]
+
+def test_pipeline_history_retries_window():
+    attempts = []
+
+    def inquire(parameter, analyzer):
+        attempts.append(parameter["retstart"])
+        if parameter["retstart"] == 4 and attempts.count(4) == 1:
+            return None
+        return _fill_window(parameter, analyzer)
+
+    _, result = _history_pipeline(inquire)
+    assert attempts.count(4) == 2
+    assert len(result.articles) == 10
+
+def test_pipeline_history_empty_search():
+    _, result = _history_pipeline(_fill_window, count=0)
+    assert result is None
+
+def test_pipeline_small_retmax_skips_history():
+    with patch("pipeline.Conduit"):
+        pl = Pipeline(email="test@example.com")
+    pl.addSearch("cancer", "relevance", 100)
+    assert pl.useHistory is False
+    assert "usehistory" not in pl.pipeline.add_search.call_args[0][0]
+
+def test_window_efetcher_starts_at_retstart():
+    fetcher = WindowEfetcher("tool", "test@example.com")
+    with patch.object(fetcher, "add_request") as add_request, \
+            patch.object(fetcher, "request_pool"), \
+            patch.object(fetcher, "isGoodQuery", return_value=True):
+        analyzer = ArticleAnalyzer()
+        params = {"db": "pubmed", "WebEnv": "NCID_1", "query_key": "1",
+                  "retstart": 500, "retmax": 250, "retmode": "xml"}
+        assert fetcher.inquire(params, analyzer) is analyzer
+    request = add_request.call_args[0][0]
+    assert (request.start, request.retmax) == (500, 250)
+    assert request.get_post_parameter()["retstart"] == 500
+
+
+# ---------- Streaming Record Tests ----------
+
+def test_pipeline_iter_records_streams_batches(monkeypatch):
+    import threading
+
+    monkeypatch.setattr("pipeline.STREAM_FIRST_BATCH", 2)
+    release = threading.Event()
+    requested = []
+
+    def inquire(parameter, analyzer):
+        requested.append(parameter["id"])
+        # Only the first batch is done until the consumer has its records
+        if parameter["id"][0] != "0":
+            release.wait(5)
+        return _fill(parameter, analyzer)
+
+    with patch("pipeline.Conduit") as mock_conduit:
+        mock_conduit.return_value.get_result.return_value = MagicMock(uids=[str(i) for i in range(10)])
+        pl = Pipeline(email="test@example.com", rateLimiter=MagicMock())
+    pl.addSearch("cancer", "relevance", 10)
+    pl.addFetch(analyzer=ArticleAnalyzer(), batchSize=4)
+    with patch("pipeline.Efetcher") as efetcher:
+        efetcher.return_value.inquire.side_effect = inquire
+        records = pl.iterRecords()
+        assert [next(records).pmid, next(records).pmid] == ["0", "1"]
+        release.set()
+        assert [r.pmid for r in records] == [str(i) for i in range(2, 10)]
+    assert sorted(requested) == [["0", "1"], ["2", "3", "4", "5"], ["6", "7", "8", "9"]]
+
+def test_pipeline_iter_records_mixes_cache_in_order(tmp_path):
+    from cache import RecordCache
+
+    cache = RecordCache(str(tmp_path / "records.sqlite3"))
+    cache.put_many([ArticleRecord("T", "eng", "", set(), [], pmid) for pmid in ("1", "4")])
+    with patch("pipeline.Conduit") as mock_conduit:
+        mock_conduit.return_value.get_result.return_value = MagicMock(uids=[str(i) for i in range(6)])
+        pl = Pipeline(email="test@example.com", cache=cache, rateLimiter=MagicMock())
+    pl.addSearch("cancer", "relevance", 6)
+    pl.addFetch(analyzer=ArticleAnalyzer(), batchSize=2)
+    with patch("pipeline.Efetcher") as efetcher:
+        efetcher.return_value.inquire.side_effect = _fill
+        assert [r.pmid for r in pl.iterRecords()] == [str(i) for i in range(6)]
+    assert len(cache) == 6
+
+def test_pipeline_iter_records_skips_missing_articles():
+    def inquire(parameter, analyzer):
+        # PMID 3 no longer exists
+        return _fill(dict(parameter, id=[i for i in parameter["id"] if i != "3"]), analyzer)
+
+    with patch("pipeline.Conduit") as mock_conduit:
+        mock_conduit.return_value.get_result.return_value = MagicMock(uids=[str(i) for i in range(6)])
+        pl = Pipeline(email="test@example.com", rateLimiter=MagicMock())
+    pl.addSearch("cancer", "relevance", 6)
+    pl.addFetch(analyzer=ArticleAnalyzer(), batchSize=2)
+    with patch("pipeline.Efetcher") as efetcher:
+        efetcher.return_value.inquire.side_effect = inquire
+        assert [r.pmid for r in pl.iterRecords()] == ["0", "1", "2", "4", "5"]
@@ -0,0 +1,160 @@
+import multiprocessing
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ratelimit import (
+    NCBI_RATE,
+    NCBI_RATE_WITH_KEY,
+    RateLimiter,
+    SharedRateLimiter,
+    get_rate_limiter,
+    ncbi_rate,
+)
+
+
+class TestRateLimiter:
+    """Test the in-process NCBI rate limiter."""
+
+    def test_ncbi_rate(self, monkeypatch):
+        """Test the API key raises the allowed rate."""
+        monkeypatch.delenv("NCBI_API_KEY", raising=False)
+        assert ncbi_rate() == NCBI_RATE
+        monkeypatch.setenv("NCBI_API_KEY", "key")
+        assert ncbi_rate() == NCBI_RATE_WITH_KEY
+
+    def test_spaces_requests_across_threads(self):
+        """Test request starts from several threads are spaced 1/rate apart."""
+        # Compares the slots the limiter hands out rather than when threads
+        # wake from their sleep, which a loaded machine can bunch together
+        limiter = RateLimiter(rate=50)
+        clock, reading = time.monotonic, threading.local()
+        slots = []
+        lock = threading.Lock()
+
+        def now():
+            reading.value = clock()
+            return reading.value
+
+        def request():
+            delay = limiter.reserve()
+            with lock:
+                slots.append(reading.value + delay)
+            time.sleep(delay)
+
+        with patch("ratelimit.time.monotonic", side_effect=now):
+            threads = [threading.Thread(target=request) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        slots.sort()
+        gaps = [b - a for a, b in zip(slots, slots[1:])]
+        assert min(gaps) >= 1 / 50 - 1e-6
+
+    def test_reserve_returns_delay(self):
+        """Test reserve hands out increasing delays without sleeping."""
+        limiter = RateLimiter(rate=10)
+        start = time.monotonic()
+        delays = [limiter.reserve() for _ in range(3)]
+        assert time.monotonic() - start < 0.05
+        assert delays[0] <= 0
+        assert 0.09 < delays[1] <= 0.1 and 0.19 < delays[2] <= 0.2
+
+
+def _take_slots(path, count, slots):
+    # Puts the start time of each slot the limiter hands out: the clock it
+    # read when claiming plus the delay it returned. Unlike a timestamp taken
+    # after the wait, that does not move when this process is scheduled late.
+    limiter = SharedRateLimiter(path, rate=20)
+    clock, readings = time.time, []
+
+    def now():
+        readings.append(clock())
+        return readings[-1]
+
+    with patch("ratelimit.time.time", side_effect=now):
+        for _ in range(count):
+            delay = limiter.reserve()
+            slots.put(readings[-1] + delay)
+            time.sleep(delay)
+
+
+class TestSharedRateLimiter:
+    """Test the SQLite token bucket shared between processes."""
+
+    def test_first_request_is_free(self, tmp_path):
+        """Test a fresh bucket lets one request through at once."""
+        limiter = SharedRateLimiter(str(tmp_path / "limit.sqlite3"), rate=10)
+        assert limiter.reserve() == 0
+        assert 0.09 < limiter.reserve() <= 0.1
+
+    def test_instances_share_the_bucket(self, tmp_path):
+        """Test two limiters on one file draw from the same budget."""
+        path = str(tmp_path / "limit.sqlite3")
+        first, second = SharedRateLimiter(path, rate=10), SharedRateLimiter(path, rate=10)
+        first.reserve()
+        assert 0.09 < second.reserve() <= 0.1
+
+    def test_api_keys_have_their_own_bucket(self, tmp_path):
+        """Test an API key gets the higher rate and a separate bucket."""
+        path = str(tmp_path / "limit.sqlite3")
+        anonymous = SharedRateLimiter(path)
+        keyed = SharedRateLimiter(path, apikey="key")
+        assert keyed.interval == 1 / NCBI_RATE_WITH_KEY
+        anonymous.reserve()
+        assert keyed.reserve() == 0
+
+    def test_refills_up_to_burst(self, tmp_path):
+        """Test idle time refills tokens, but never beyond the burst size."""
+        limiter = SharedRateLimiter(str(tmp_path / "limit.sqlite3"), rate=10, burst=2)
+        now = time.time()
+        with patch("ratelimit.time.time", return_value=now - 60):
+            limiter.reserve()
+        assert [limiter.reserve() for _ in range(2)] == [0, 0]
+        assert 0.09 < limiter.reserve() <= 0.1
+
+    def test_queue_wait_stats(self, tmp_path):
+        """Test the time spent queued is reported."""
+        limiter = SharedRateLimiter(str(tmp_path / "limit.sqlite3"), rate=10)
+        # A frozen clock, so the waits do not shrink while the test runs
+        with patch("ratelimit.time.time", return_value=time.time()):
+            for _ in range(3):
+                limiter.reserve()
+        stats = limiter.stats()
+        assert stats["requests"] == 3
+        assert stats["waited"] == pytest.approx(0.3)
+        assert stats["max_wait"] == pytest.approx(0.2)
+
+    def test_spaces_requests_across_processes(self, tmp_path):
+        """Test three processes together stay within the rate."""
+        path = str(tmp_path / "limit.sqlite3")
+        context = multiprocessing.get_context("spawn")
+        slots = context.Queue()
+        processes = [
+            context.Process(target=_take_slots, args=(path, 4, slots)) for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        times = sorted(slots.get(timeout=30) for _ in range(12))
+        for process in processes:
+            process.join()
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert min(gaps) >= 1 / 20 - 1e-6
+        assert times[-1] - times[0] >= 11 / 20 - 1e-6
+
+    def test_get_rate_limiter_is_shared(self, tmp_path):
+        """Test one limiter instance per path and API key."""
+        path = str(tmp_path / "limit.sqlite3")
+        assert get_rate_limiter(path) is get_rate_limiter(path)
+        assert get_rate_limiter(path, apikey="key") is not get_rate_limiter(path)
+
+    def test_unwritable_path_falls_back_to_process_limiter(self, tmp_path):
+        """Test an unusable state file limits this process only, instead of failing."""
+        blocker = tmp_path / "file"
+        blocker.write_text("")
+        with pytest.warns(RuntimeWarning, match="not caching"):
+            limiter = get_rate_limiter(str(blocker / "limit.sqlite3"))
+        assert type(limiter) is RateLimiter
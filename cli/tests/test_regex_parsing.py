@@ -330,3 +330,106 @@ class TestTextProcessingPatterns:
                     assert isinstance(match.group(0), str)
             except Exception as e:
                 pytest.fail(f"Unicode handling failed for '{text}': {e}")
+
+
+class TestEmailScanner:
+    """Test the linear-time scanner that replaced the email regex in parsing.py"""
+
+    CASES = [
+        "Contact us at support@example.com for help",
+        "Send to john.doe@lab.org or jane@lab.org",
+        "Email: user@domain.com.",
+        "(contact: researcher@lab.org)",
+        "user@.domain.com",
+        "user@domain",
+        "@domain.com",
+        "a@b@c.com",
+        "x@a.b-c and y@d.e.",
+        "first@domain.com,second@example.org;third@x.co.uk",
+        "Dept. of Biology, Univ. X, 12-34 Road. prof@science.university.edu, Room 101",
+        "e-mail: .dot@lead.org",
+        "user@domain.com@other.org",
+        "José@Universität.de",
+    ]
+
+    def setup_method(self):
+        """Set up the pattern the scanner has to agree with"""
+        self.email_pattern = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+
+    def test_matches_regex(self):
+        """Test the scanner finds what the old regex found, lower-cased"""
+        from parsing import scan_emails
+
+        for text in self.CASES:
+            expected = [(m.start(), m.group(0).lower()) for m in self.email_pattern.finditer(text)]
+            assert list(scan_emails(text)) == expected, text
+
+    def test_all_emails_normalized(self):
+        """Test every distinct email is returned, lower-cased, in order"""
+        from parsing import extract_email, extract_emails
+
+        text = "Lab A, Jane.Doe@Uni.EDU; Lab B, bob@lab.org, jane.doe@uni.edu"
+        assert extract_emails(text) == ["jane.doe@uni.edu", "bob@lab.org"]
+        assert extract_email(text) == "jane.doe@uni.edu"
+        assert extract_emails(None) == [] and extract_email("") is None
+
+    def test_emails_by_text(self):
+        """Test one scan over several affiliations keeps emails apart"""
+        from parsing import emails_by_text
+
+        affiliations = ["Lab a@x.org", "", "No email", "b@y.org and c@z.org", "tail@x"]
+        assert emails_by_text(affiliations) == [["a@x.org"], [], [], ["b@y.org", "c@z.org"], []]
+
+    def test_emails_do_not_span_affiliations(self):
+        """Test the separator keeps one affiliation's text out of the next"""
+        from parsing import emails_by_text
+
+        assert emails_by_text(["ends with user", "@host.org starts"]) == [[], []]
+
+    @pytest.mark.parametrize("text, expected", [
+        ("a" * 20000, []),
+        ("a" * 20000 + "@", []),
+        ("a@" + "b" * 20000, []),
+        ("a@" + "b." * 10000, ["a@" + "b." * 9999 + "b"]),
+        (("x" * 50 + "@") * 400, []),
+        ("Department of Medicine " * 1000, []),
+    ])
+    def test_pathological_input(self, text, expected):
+        """Test long runs without a complete email give the regex's result"""
+        from parsing import extract_emails
+
+        assert extract_emails(text) == expected
+
+    @pytest.mark.benchmark
+    @pytest.mark.parametrize("text", [
+        "a" * 20000,
+        "a" * 20000 + "@",
+        "a@" + "b" * 20000,
+        "a@" + "b." * 10000,
+        ("x" * 50 + "@") * 400,
+        "Department of Medicine " * 1000,
+    ])
+    def test_benchmark_pathological_input(self, text):
+        """Benchmark: long runs without a complete email take linear time"""
+        import time
+        from parsing import scan_emails
+
+        start = time.perf_counter()
+        list(scan_emails(text))
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.05, f"{elapsed:.4f}s"
+
+    @pytest.mark.benchmark
+    def test_benchmark_faster_than_regex(self):
+        """Benchmark: the scanner beats the backtracking regex on long affiliations"""
+        import time
+        from parsing import extract_email
+
+        text = "Department of Molecular and Cellular Biology " * 200 + "x" * 5000
+        start = time.perf_counter()
+        self.email_pattern.search(text)
+        regex = time.perf_counter() - start
+        start = time.perf_counter()
+        extract_email(text)
+        scanner = time.perf_counter() - start
+        assert scanner * 10 < regex, f"regex {regex:.4f}s, scanner {scanner:.6f}s"
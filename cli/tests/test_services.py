@@ -1,5 +1,13 @@
-from unittest.mock import patch, MagicMock
-from services import getSummary, getEmails
+import json
+import pytest
+from unittest.mock import ANY, patch, MagicMock
+from services import getSummary, getEmails, iterBatch, iterEmails, iterSummary
+
+
+@pytest.fixture(autouse=True)
+def caches():
+    with patch('services.get_record_cache'), patch('services.get_search_cache'):
+        yield
 
 
 class TestGetSummary:
@@ -29,7 +37,7 @@ class TestGetSummary:
         result = getSummary("cancer", "relevance", "test@email.com", 10)
 
         # Verify calls
-        mock_pipeline_class.assert_called_once_with("test@email.com")
+        mock_pipeline_class.assert_called_once_with("test@email.com", cache=ANY, searchCache=ANY)
         mock_pipeline.addSearch.assert_called_once_with("cancer", retmax=10, sortBy="relevance")
         mock_analyzer_class.assert_called_once()
         mock_pipeline.addFetch.assert_called_once_with(analyzer=mock_analyzer)
@@ -60,7 +68,7 @@ class TestGetSummary:
         result = getSummary("diabetes", "pub_date", "researcher@university.edu", 25)
 
         # Verify calls with new parameters
-        mock_pipeline_class.assert_called_once_with("researcher@university.edu")
+        mock_pipeline_class.assert_called_once_with("researcher@university.edu", cache=ANY, searchCache=ANY)
         mock_pipeline.addSearch.assert_called_once_with("diabetes", retmax=25, sortBy="pub_date")
         mock_analyzer_class.assert_called_once()
         mock_pipeline.addFetch.assert_called_once_with(analyzer=mock_analyzer)
@@ -75,7 +83,7 @@ class TestGetEmails:
 
     @patch('services.emailFormat')
     @patch('services.Pipeline')
-    @patch('services.ArticleAnalyzer')
+    @patch('services.EmailAnalyzer')
     def test_get_emails_basic_flow(
         self, mock_analyzer_class, mock_pipeline_class, mock_email_format
     ):
@@ -107,7 +115,7 @@ class TestGetEmails:
         result = getEmails("cancer", "relevance", "test@email.com", 10)
 
         # Verify calls
-        mock_pipeline_class.assert_called_once_with("test@email.com")
+        mock_pipeline_class.assert_called_once_with("test@email.com", cache=ANY, searchCache=ANY)
         mock_pipeline.addSearch.assert_called_once_with("cancer", retmax=10, sortBy="relevance")
         mock_analyzer_class.assert_called_once()
         mock_pipeline.addFetch.assert_called_once_with(analyzer=mock_analyzer)
@@ -121,7 +129,7 @@ class TestGetEmails:
 
     @patch('services.emailFormat')
     @patch('services.Pipeline')
-    @patch('services.ArticleAnalyzer')
+    @patch('services.EmailAnalyzer')
     def test_get_emails_no_emails(
         self, mock_analyzer_class, mock_pipeline_class, mock_email_format
     ):
@@ -156,7 +164,7 @@ class TestGetEmails:
 
     @patch('services.emailFormat')
     @patch('services.Pipeline')
-    @patch('services.ArticleAnalyzer')
+    @patch('services.EmailAnalyzer')
     def test_get_emails_duplicate_emails(
         self, mock_analyzer_class, mock_pipeline_class, mock_email_format
     ):
@@ -192,7 +200,7 @@ class TestGetEmails:
 
     @patch('services.emailFormat')
     @patch('services.Pipeline')
-    @patch('services.ArticleAnalyzer')
+    @patch('services.EmailAnalyzer')
     def test_get_emails_empty_articles(
         self, mock_analyzer_class, mock_pipeline_class, mock_email_format
     ):
@@ -218,7 +226,7 @@ class TestGetEmails:
 
     @patch('services.emailFormat')
     @patch('services.Pipeline')
-    @patch('services.ArticleAnalyzer')
+    @patch('services.EmailAnalyzer')
     def test_get_emails_different_parameters(
         self, mock_analyzer_class, mock_pipeline_class, mock_email_format
     ):
@@ -248,8 +256,287 @@ class TestGetEmails:
         result = getEmails("heart disease", "Author", "doctor@hospital.org", 50)
 
         # Verify calls with new parameters
-        mock_pipeline_class.assert_called_once_with("doctor@hospital.org")
+        mock_pipeline_class.assert_called_once_with("doctor@hospital.org", cache=ANY, searchCache=ANY)
         mock_pipeline.addSearch.assert_called_once_with("heart disease", retmax=50, sortBy="Author")
         mock_email_format.assert_called_once_with(expected_emails)
 
         assert result == "authorA@university.edu, authorB@institute.org, authorC@hospital.net"
+
+
+
+def _article(pmid, emails=()):
+    article = MagicMock(title=f"Title {pmid}", language="eng", date="2023")
+    article.pmid = pmid
+    article.emails = set(emails)
+    article.people = []
+    return article
+
+
+class TestIterSummary:
+    """Test the streaming iterSummary service function."""
+
+    @patch('services.Pipeline')
+    def test_yields_one_chunk_per_article(self, mock_pipeline_class):
+        """Test each article is formatted as soon as the pipeline yields it."""
+        mock_pipeline = mock_pipeline_class.return_value
+        mock_pipeline.iterRecords.return_value = iter([_article("1"), _article("2")])
+
+        chunks = iterSummary("cancer", "relevance", "test@email.com", 10)
+        assert "pubmed.ncbi.nlm.nih.gov/1" in next(chunks)
+        assert "pubmed.ncbi.nlm.nih.gov/2" in next(chunks)
+        assert list(chunks) == []
+        mock_pipeline.addSearch.assert_called_once_with("cancer", retmax=10, sortBy="relevance")
+        mock_pipeline.getResults.assert_not_called()
+
+    @patch('services.Pipeline')
+    def test_no_results(self, mock_pipeline_class):
+        """Test the usual message when nothing is found."""
+        mock_pipeline_class.return_value.iterRecords.return_value = iter([])
+        assert list(iterSummary("x", "relevance", "", 10)) == ["No articles found for your search."]
+
+    @patch('services.Pipeline')
+    def test_output_format(self, mock_pipeline_class):
+        """Test articles in another format, and an empty but valid document."""
+        mock_pipeline_class.return_value.iterRecords.side_effect = [
+            iter([_article("1"), _article("2")]), iter([]),
+        ]
+        chunks = list(iterSummary("x", "relevance", "", 10, outputFormat="ndjson"))
+        assert [json.loads(chunk)["pmid"] for chunk in chunks] == ["1", "2"]
+        assert "".join(iterSummary("x", "relevance", "", 10, outputFormat="json")) == "[]\n"
+
+
+class TestIterEmails:
+    """Test the streaming iterEmails service function."""
+
+    @patch('services.Pipeline')
+    def test_yields_new_emails_only(self, mock_pipeline_class):
+        """Test each email is yielded once, joined like emailFormat."""
+        mock_pipeline_class.return_value.iterRecords.return_value = iter([
+            _article("1", ["a@x.org"]), _article("2", ["a@x.org", "b@x.org"]), _article("3"),
+        ])
+        assert list(iterEmails("x", "relevance", "", 10)) == ["a@x.org", ", b@x.org"]
+
+    @patch('services.Pipeline')
+    def test_no_results(self, mock_pipeline_class):
+        """Test the usual message when nothing is found."""
+        mock_pipeline_class.return_value.iterRecords.return_value = iter([])
+        assert list(iterEmails("x", "relevance", "", 10)) == [
+            "No articles found — no emails to display."
+        ]
+
+    @patch('services.Pipeline')
+    def test_output_format(self, mock_pipeline_class):
+        """Test emails in another format, and an empty but valid document."""
+        mock_pipeline_class.return_value.iterRecords.side_effect = [
+            iter([_article("1", ["a@x.org"]), _article("2", ["a@x.org", "b@x.org"])]), iter([]),
+        ]
+        chunks = iterEmails("x", "relevance", "", 10, outputFormat="ndjson")
+        assert "".join(chunks) == '"a@x.org"\n"b@x.org"\n'
+        assert "".join(iterEmails("x", "relevance", "", 10, outputFormat="json")) == "[]\n"
+
+class TestIterBatch:
+    """Test batch mode shares one fetch between all its searches."""
+
+    @pytest.fixture
+    def pipelines(self):
+        # Search pipelines answer from found; the one fetch pipeline returns
+        # an article for every PMID it is given
+        found = {"cancer": ["1", "2", "3"], "tumor": ["3", "4", "1"], "rare": []}
+        created = []
+
+        def new_pipeline(email, cache=None, searchCache=None):
+            pipeline = MagicMock()
+            pipeline.addSearch.side_effect = lambda term, **kwargs: setattr(
+                pipeline, "term", term
+            )
+            pipeline.getResults.side_effect = lambda: MagicMock(uids=found[pipeline.term])
+            pipeline.iterRecords.side_effect = lambda: iter(
+                _article(uid, [f"{uid}@x.org"]) for uid in pipeline.addIds.call_args[0][0]
+            )
+            created.append(pipeline)
+            return pipeline
+
+        with patch('services.Pipeline', side_effect=new_pipeline):
+            yield created
+
+    def test_fetches_each_pmid_once(self, pipelines):
+        """Test the union of PMIDs is fetched once, in first-seen order."""
+        chunks = iterBatch(["cancer", "tumor", "rare"], "relevance", "", 10, outputFormat="json")
+        data = json.loads("".join(chunks))
+
+        fetches = [p for p in pipelines if p.addIds.called]
+        assert len(fetches) == 1
+        fetches[0].addIds.assert_called_once_with(["1", "2", "3", "4"])
+        for pipeline in pipelines:
+            if not pipeline.addIds.called:
+                pipeline.addSearch.assert_called_once_with(
+                    ANY, retmax=10, sortBy="relevance", useHistory=False
+                )
+                pipeline.addFetch.assert_not_called()
+        assert [d["query"] for d in data] == ["cancer", "tumor", "rare"]
+        assert [[a["pmid"] for a in d["articles"]] for d in data] == [
+            ["1", "2", "3"], ["3", "4", "1"], []
+        ]
+
+    def test_emails_per_query(self, pipelines):
+        """Test emails mode keeps each query's emails apart."""
+        chunks = iterBatch(["cancer", "rare"], "relevance", "", 10, mode="emails")
+        assert "".join(chunks) == (
+            "# Query: cancer\n\n1@x.org, 2@x.org, 3@x.org\n\n"
+            "# Query: rare\n\nNo articles found — no emails to display.\n\n"
+        )
+
+    def test_nothing_found(self, pipelines):
+        """Test no fetch is made when no search finds anything."""
+        assert "".join(iterBatch(["rare"], "relevance", "", 10, outputFormat="ndjson")) == (
+            '{"query":"rare","articles":[]}\n'
+        )
+        assert not any(p.addIds.called for p in pipelines)
+
+
+class TestSearchSession:
+    """Test the long-lived SearchSession against a local stub server."""
+
+    @pytest.fixture
+    def session(self, eutils_stub, tmp_path):
+        from cache import RecordCache, SearchCache
+        from ratelimit import RateLimiter
+        from services import SearchSession
+
+        _, url = eutils_stub
+        session = SearchSession(
+            cache=RecordCache(str(tmp_path / "records.sqlite3")),
+            searchCache=SearchCache(str(tmp_path / "records.sqlite3")),
+            rateLimiter=RateLimiter(rate=1000),
+            url=url,
+        )
+        yield session
+        session.close()
+
+    def test_summary(self, session):
+        """Test a summary is formatted from the fetched articles."""
+        output = session.summary("cancer", "relevance", 3, email="a@b.org")
+        assert "Title 1" in output and "Title 3" in output
+
+    def test_emails(self, session):
+        """Test emails mode collects author emails."""
+        assert "author0.3@uni.edu" in session.emails("cancer", "relevance", 3)
+
+    def test_no_results(self, session, eutils_stub):
+        """Test the usual message when nothing is found."""
+        eutils_stub[0].uids = []
+        assert session.summary("nothing", "relevance", 3) == "No articles found for your search."
+
+    def test_user_email_is_sent(self, session, eutils_stub):
+        """Test each search is sent with its caller's email."""
+        session.summary("cancer", "relevance", 2, email="a@b.org")
+        assert {params["email"] for _, params, _ in eutils_stub[0].requests} == {"a@b.org"}
+
+    def test_connections_are_reused(self, session, eutils_stub):
+        """Test later searches reuse the first search's connection."""
+        for term in ("cancer", "diabetes", "asthma"):
+            session.summary(term, "relevance", 2)
+        assert eutils_stub[0].connections == 1
+
+    def test_shared_across_threads(self, session):
+        """Test concurrent searches from several threads all complete."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        terms = [f"term {i}" for i in range(8)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outputs = list(executor.map(lambda term: session.summary(term, "relevance", 2), terms))
+        assert all("Title 2" in output for output in outputs)
+
+    def test_async_searches_do_not_block_the_caller(self, session, eutils_stub):
+        """Test awaited searches overlap and leave the caller's loop free."""
+        import asyncio
+
+        stub = eutils_stub[0]
+        stub.delay = 0.1
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            task = asyncio.create_task(ticker())
+            outputs = await asyncio.gather(
+                *(session.summaryAsync(f"term {i}", "relevance", 2) for i in range(6)),
+                session.emailsAsync("emails", "relevance", 3),
+            )
+            task.cancel()
+            return outputs, ticks
+
+        outputs, ticks = asyncio.run(run())
+        assert all("Title 2" in output for output in outputs[:-1])
+        assert "author0.3@uni.edu" in outputs[-1]
+        assert stub.max_in_flight > 1
+        assert ticks > 10
+
+    def test_blocking_cache_does_not_stall_other_searches(self, session):
+        """Test a search stuck in its SQLite cache leaves the session loop to the others."""
+        import threading
+
+        from analyzer import ArticleAnalyzer
+
+        entered, release = threading.Event(), threading.Event()
+        get_many = session.cache.get_many
+
+        def slow_get_many(pmids):
+            if not entered.is_set():
+                entered.set()
+                release.wait(5)
+            return get_many(pmids)
+
+        with patch.object(session.cache, "get_many", side_effect=slow_get_many):
+            slow = session.submit("slow", "relevance", 2, ArticleAnalyzer(streaming=True))
+            assert entered.wait(5)
+            fast = session.submit("fast", "relevance", 2, ArticleAnalyzer(streaming=True))
+            assert len(fast.result(timeout=5).articles) == 2
+            assert not slow.done()
+            release.set()
+            assert len(slow.result(timeout=5).articles) == 2
+
+    def _pipeline(self, session, term="cancer", retmax=10, useHistory=None):
+        from analyzer import ArticleAnalyzer
+
+        pipeline = session.pipeline()
+        pipeline.addSearch(term, "relevance", retmax, useHistory=useHistory)
+        pipeline.addFetch(analyzer=ArticleAnalyzer(streaming=True), batchSize=3)
+        return pipeline
+
+    def test_iter_records(self, session, eutils_stub):
+        """Test records stream in search order, cached ones without a fetch."""
+        from article import ArticleRecord
+
+        session.cache.put_many([ArticleRecord("Cached", "eng", "2023", set(), [], "5")])
+        records = list(session.iterRecords(self._pipeline(session)))
+        assert [record.pmid for record in records] == [str(i) for i in range(1, 11)]
+        assert records[4].title == "Cached"
+        efetches = [params for eutil, params, _ in eutils_stub[0].requests if eutil == "efetch"]
+        assert sorted(len(params["id"].split(",")) for params in efetches) == [3, 3, 3]
+
+    def test_iter_records_from_history(self, session):
+        """Test History server windows stream in order too."""
+        records = session.iterRecords(self._pipeline(session, useHistory=True))
+        assert [record.pmid for record in records] == [str(i) for i in range(1, 11)]
+
+    def test_iter_records_stopped_early(self, session, eutils_stub):
+        """Test closing the iterator cancels its fetches and frees the session."""
+        eutils_stub[0].delay = 0.05
+        records = session.iterRecords(self._pipeline(session))
+        assert next(records).pmid == "1"
+        records.close()
+        assert "Title 2" in session.summary("diabetes", "relevance", 2)
+
+    def test_get_session_is_shared(self):
+        """Test get_session returns one session per process."""
+        import services
+
+        with patch.object(services, "_session", None), patch("services.SearchSession") as cls:
+            assert services.get_session() is services.get_session()
+            cls.assert_called_once_with()